@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppHabitsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_habits'
+
+    def ready(self):
+        # Обработчики сигналов реестра периодов
+        from app_habits import schedules  # noqa
@@ -0,0 +1,156 @@
+import heapq
+import logging
+import time
+
+from celery.beat import event_t
+from celery.utils.functional import is_numeric_value
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, InterfaceError, close_old_connections
+from django_celery_beat.models import PeriodicTasks
+from django_celery_beat.schedulers import DatabaseScheduler
+
+from app_habits.models import PeriodicTaskChange
+
+logger = logging.getLogger(__name__)
+
+
+class HabitScheduler(DatabaseScheduler):
+    """
+    Планировщик celery beat с применением изменений по журналу PeriodicTaskChange
+
+    DatabaseScheduler при каждом изменении отметки PeriodicTasks загружает все задачи заново
+    и перестраивает очередь запусков. Здесь все задачи загружаются только при запуске,
+    дальше раз в HABITS_BEAT_CHANGES_INTERVAL секунд перечитываются только задачи из записей журнала.
+    Очередь запусков (min-heap по времени следующего запуска) обновляется точечно:
+    запись измененной задачи добавляется заново, а устаревшая пропускается при извлечении.
+
+    С журналом (HABITS_BEAT_CHANGE_LOG) привычки записывают изменения своих задач только в журнал,
+    не обновляя отметку PeriodicTasks. Поэтому любое изменение отметки (включение и выключение задач
+    в админке, изменение периодов, изменения задач другим кодом) означает изменение без записи журнала,
+    и все задачи загружаются заново
+    """
+
+    def __init__(self, *args, **kwargs):
+        if not settings.HABITS_BEAT_CHANGE_LOG:
+            raise ImproperlyConfigured(
+                'HabitScheduler требует HABITS_BEAT_CHANGE_LOG=True: без журнала изменения привычек не применяются'
+            )
+        self._task_names = {}  # id периодической задачи -> имя записи расписания
+        self._last_marker = None  # Последняя прочитанная отметка PeriodicTasks
+        self._last_changes_check = 0
+        super().__init__(*args, **kwargs)
+
+    @property
+    def schedule(self):
+        if self._schedule is None:
+            self.load_schedule()
+        return self._schedule
+
+    def enabled_models_qs(self):
+        # Расписание целиком больше не перезагружается, поэтому загружаются все включенные задачи,
+        # без исключения задач crontab и clocked, запуск которых еще не скоро
+        return self.Model.objects.enabled()
+
+    def load_schedule(self):
+        """ Загрузка всех задач """
+
+        # Отметка и журнал читаются до загрузки задач: изменения во время загрузки применятся при следующей проверке
+        self._last_marker = PeriodicTasks.last_change()
+        change_ids = list(PeriodicTaskChange.objects.values_list('id', flat=True))
+        self._schedule, self._task_names, self._heap = {}, {}, None
+        for model in self.enabled_models_qs():
+            self.add_model(model)
+        self.delete_changes(change_ids)
+
+    def add_model(self, model):
+        try:
+            entry = self.Entry(model, app=self.app)
+        except ValueError:
+            return
+        self._schedule[entry.name] = entry
+        self._task_names[model.pk] = entry.name
+        if self._heap is not None:
+            self.push(entry)
+
+    def remove_model(self, task_id):
+        if name := self._task_names.pop(task_id, None):
+            self._schedule.pop(name, None)
+
+    def apply_changes(self):
+        """ Применение записей журнала: перечитываются только измененные задачи """
+
+        try:
+            close_old_connections()
+            if PeriodicTasks.last_change() != self._last_marker:
+                logger.info('HabitScheduler: расписание изменено без записи журнала, загрузка всех задач')
+                self.sync()
+                self.load_schedule()
+                return
+            # Журнал читается целиком, а не после последней прочитанной записи: id записи выдается
+            # при вставке, и транзакция с меньшим id может быть зафиксирована позже
+            changes = list(PeriodicTaskChange.objects.values_list('id', 'periodic_task_id'))
+            if not changes:
+                return
+            # Время последнего запуска измененных задач сохраняется до того, как они будут перечитаны
+            self.sync()
+            task_ids = {task_id for _, task_id in changes}
+            models = self.enabled_models_qs().in_bulk(task_ids)
+        except (DatabaseError, InterfaceError) as exc:
+            logger.warning('HabitScheduler: ошибка чтения журнала изменений: %r', exc)
+            return
+
+        for task_id in task_ids:
+            self.remove_model(task_id)
+            if model := models.get(task_id):
+                self.add_model(model)
+        # Время запуска удаленных задач сохранять некуда
+        self._dirty &= set(self._schedule)
+
+        self.delete_changes([change_id for change_id, _ in changes])
+
+    @staticmethod
+    def delete_changes(change_ids):
+        """ Удаление прочитанных записей журнала """
+
+        if not change_ids:
+            return
+        try:
+            PeriodicTaskChange.objects.filter(id__in=change_ids).delete()
+        except (DatabaseError, InterfaceError) as exc:
+            # Оставшиеся записи будут применены повторно, это ничего не портит
+            logger.warning('HabitScheduler: ошибка очистки журнала изменений: %r', exc)
+
+    def push(self, entry, next_time_to_run=None):
+        if next_time_to_run is None:
+            is_due, next_time_to_run = entry.is_due()
+            next_time_to_run = 0 if is_due else next_time_to_run
+        heapq.heappush(self._heap, event_t(self._when(entry, next_time_to_run) or 0, 5, entry))
+
+    def tick(self, *args, **kwargs):
+        if time.monotonic() - self._last_changes_check >= settings.HABITS_BEAT_CHANGES_INTERVAL:
+            self._last_changes_check = time.monotonic()
+            self.apply_changes()
+
+        if self._heap is None:
+            self.populate_heap()
+
+        # Записи удаленных и измененных задач, оставшиеся в очереди, пропускаются
+        heap = self._heap
+        while heap and self._schedule.get(heap[0].entry.name) is not heap[0].entry:
+            heapq.heappop(heap)
+        if not heap:
+            return self.max_interval
+
+        entry = heap[0].entry
+        is_due, next_time_to_run = self.is_due(entry)
+        if is_due:
+            heapq.heappop(heap)
+            next_entry = self._schedule[entry.name] = self.reserve(entry)
+            self.apply_entry(entry, producer=self.producer)
+            self.push(next_entry, next_time_to_run)
+            return 0
+
+        next_time_to_run = self.adjust(next_time_to_run)
+        return min(next_time_to_run if is_numeric_value(next_time_to_run) else self.max_interval, self.max_interval)
+
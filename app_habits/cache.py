@@ -0,0 +1,120 @@
+import hashlib
+import json
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.cache import get_conditional_response, quote_etag
+
+PUBLIC_VERSION_KEY = 'habits:public:version'
+PUBLIC_PAGE_KEY = 'habits:public:{version}:{digest}'
+LOCK_POLL_INTERVAL = 0.05  # Интервал проверки готовности страницы, построением которой занят другой запрос
+
+
+def get_public_version():
+    """ Текущая версия публичной ленты привычек, входит в ключ каждой закэшированной страницы """
+
+    version = cache.get(PUBLIC_VERSION_KEY)
+    if version is None:
+        # Начальная версия по времени, чтобы после вытеснения ключа не совпасть с прежними
+        cache.add(PUBLIC_VERSION_KEY, int(time.time()), timeout=None)
+        version = cache.get(PUBLIC_VERSION_KEY)
+    return version
+
+
+def bump_public_version():
+    """ Смена версии публичной ленты. Все закэшированные ранее страницы перестают использоваться """
+
+    cache.add(PUBLIC_VERSION_KEY, int(time.time()), timeout=None)
+    cache.incr(PUBLIC_VERSION_KEY)
+
+
+def bump_public_version_on_commit():
+    """
+    Смена версии публичной ленты после фиксации транзакции.
+    Иначе параллельный запрос может закэшировать страницу с еще не сохраненными данными под новой версией
+    """
+
+    transaction.on_commit(bump_public_version)
+
+
+def get_request_digest(request):
+    """ Хэш адреса запроса без учета порядка параметров """
+
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+def get_public_page(request, build):
+    """
+    Получение страницы публичной ленты из кэша либо построение ее функцией build.
+    При одновременных промахах страницу строит только один запрос,
+    остальные дожидаются ее появления в кэше.
+    Без общего кэша (HABITS_PUBLIC_CACHE) страница строится каждый раз: смену версии в памяти
+    одного процесса другие процессы не увидят
+    """
+
+    if not settings.HABITS_PUBLIC_CACHE:
+        return build()
+
+    key = PUBLIC_PAGE_KEY.format(version=get_public_version(), digest=get_request_digest(request))
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    lock_key = f'{key}:lock'
+    lock_timeout = settings.HABITS_PUBLIC_CACHE_LOCK_TIMEOUT
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key, 1, timeout=lock_timeout):
+        if time.monotonic() > deadline:
+            # Построивший страницу запрос не успел, строим без кэша
+            return build()
+        time.sleep(LOCK_POLL_INTERVAL)
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    try:
+        # Страницу мог положить запрос, который держал блокировку до нас
+        data = cache.get(key)
+        if data is None:
+            data = build()
+            cache.set(key, data, timeout=settings.HABITS_PUBLIC_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return data
+
+
+def make_etag(*parts):
+    """ Строгий ETag из значений, от которых зависит ответ """
+
+    return quote_etag(hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest())
+
+
+def etag_response(request, etag, build):
+    """
+    Ответ на условный запрос: 304 без тела, если ETag совпадает с If-None-Match,
+    иначе ответ функции build. ETag добавляется в оба ответа
+    """
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    return response
+
+
+def page_etag_response(request, build, *parts):
+    """
+    Ответ списка с ETag по содержимому страницы (записи и ссылки на соседние страницы) и значениям parts.
+    Страница ограничена размером, поэтому для ETag не нужны запросы по всему отобранному набору.
+    При совпадении с If-None-Match построенная страница не передается, ответ 304
+    """
+
+    response = build()
+    etag = make_etag(*parts, json.dumps(response.data, sort_keys=True, cls=DjangoJSONEncoder))
+    return etag_response(request, etag, lambda: response)
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from app_habits.services import render_message
+from app_habits.telegram import TokenBucket
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+def is_async_delivery():
+    """ Проверка, что напоминания отправляются сервисом доставки, а не задачами celery """
+
+    return settings.HABITS_DELIVERY_BACKEND == 'async'
+
+
+def render_reminder(**kwargs):
+    """ Подготовка напоминания для очереди сервиса доставки """
+
+    return {
+        'chat_id': kwargs.get('telegram_id'),
+        'text': render_message(**kwargs),
+    }
+
+
+_client = None
+_client_pid = None
+
+
+def get_queue_client():
+    """
+    Получение клиента Redis очереди напоминаний текущего процесса.
+    Клиент и его пул соединений используются повторно, после fork (prefork воркеры celery) создается новый
+    """
+
+    global _client, _client_pid
+
+    if _client is None or _client_pid != os.getpid():
+        _client = redis.Redis.from_url(settings.HABITS_DELIVERY_REDIS_URL)
+        _client_pid = os.getpid()
+    return _client
+
+
+def push_reminders(reminders):
+    """ Добавление подготовленных напоминаний в очередь Redis одной командой """
+
+    if not reminders:
+        return
+    get_queue_client().rpush(
+        settings.HABITS_DELIVERY_QUEUE,
+        *[json.dumps(reminder, ensure_ascii=False) for reminder in reminders]
+    )
+
+
+class RedisQueue:
+    """
+    Очередь подготовленных напоминаний в Redis
+
+    Забранные напоминания не удаляются, а переносятся (LMOVE) в список обрабатываемых
+    и удаляются из него после отправки (ack). Напоминания, оставшиеся в списке после сбоя сервиса,
+    возвращаются в начало очереди при его запуске (restore), поэтому сервис запускается в одном экземпляре
+    """
+
+    def __init__(self, url, key):
+        self.client = redis.asyncio.Redis.from_url(url)
+        self.key = key
+        self.processing_key = f'{key}:processing'
+
+    async def pop_batch(self, count, timeout=1):
+        """
+        Получение до count напоминаний парами (элемент очереди, напоминание).
+        Если очередь пуста, ожидание не дольше timeout секунд
+        """
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for _ in range(count):
+                pipe.lmove(self.key, self.processing_key, 'LEFT', 'RIGHT')
+            items = [item for item in await pipe.execute() if item is not None]
+        if not items:
+            item = await self.client.blmove(self.key, self.processing_key, timeout, 'LEFT', 'RIGHT')
+            items = [item] if item else []
+        return [(item, json.loads(item)) for item in items]
+
+    async def ack(self, item):
+        """ Удаление отправленного напоминания из списка обрабатываемых """
+
+        await self.client.lrem(self.processing_key, 1, item)
+
+    async def restore(self):
+        """ Возврат в начало очереди напоминаний, не отправленных до сбоя, с сохранением порядка """
+
+        restored = 0
+        while await self.client.lmove(self.processing_key, self.key, 'RIGHT', 'LEFT'):
+            restored += 1
+        return restored
+
+
+class MemoryQueue:
+    """ Очередь напоминаний в памяти процесса (для замеров производительности) """
+
+    def __init__(self, reminders):
+        self.reminders = list(reminders)
+
+    async def pop_batch(self, count, timeout=0):
+        batch, self.reminders = self.reminders[:count], self.reminders[count:]
+        return [(reminder, reminder) for reminder in batch]
+
+    async def ack(self, item):
+        pass
+
+    async def restore(self):
+        return 0
+
+
+class DeliveryService:
+    """
+    Сервис доставки напоминаний на asyncio
+
+    Забирает напоминания из очереди пачками и держит до concurrency
+    одновременных запросов к Telegram Bot API в одном процессе.
+    Соблюдает общий лимит отправки и лимит на один чат
+    """
+
+    def __init__(self, queue, base_url, token, concurrency=200, batch_size=500,
+                 rate_limit=30, chat_rate_limit=1, timeout=(3.05, 10), retries=3, max_chats=10000):
+        if aiohttp is None:
+            raise ImproperlyConfigured('Для работы сервиса доставки установите aiohttp (poetry install -E delivery)')
+
+        self.queue = queue
+        self.url = f'{base_url}{token}/sendMessage'
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.retries = retries
+        self.global_bucket = TokenBucket(rate_limit)
+        self.chat_rate_limit = chat_rate_limit
+        self.max_chats = max_chats
+        self.chat_buckets = OrderedDict()
+        self.sent = 0
+        self.failed = 0
+
+    def get_chat_bucket(self, chat_id):
+        """ Получение ограничителя для чата. Хранятся только последние max_chats чатов """
+
+        bucket = self.chat_buckets.pop(chat_id, None) or TokenBucket(self.chat_rate_limit)
+        self.chat_buckets[chat_id] = bucket
+        if len(self.chat_buckets) > self.max_chats:
+            self.chat_buckets.popitem(last=False)
+        return bucket
+
+    async def send(self, session, reminder):
+        """
+        Отправка одного напоминания с повтором при ошибках и превышении времени подключения и ответе 429.
+        Ответы 5xx, обрывы и превышение времени ответа после отправки запроса не повторяются:
+        сообщение могло быть уже отправлено
+        """
+
+        chat_bucket = self.get_chat_bucket(reminder['chat_id'])
+        for attempt in range(self.retries + 1):
+            await asyncio.sleep(chat_bucket.reserve())
+            await asyncio.sleep(self.global_bucket.reserve())
+            try:
+                async with session.post(self.url, data=reminder) as response:
+                    if response.status != 429:
+                        if response.status == 200:
+                            self.sent += 1
+                        else:
+                            self.failed += 1
+                            logger.warning('Telegram sendMessage failed: %s %s',
+                                           response.status, await response.text())
+                        return
+                    retry_after = await self.get_retry_after(response)
+            except (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError):
+                # Соединение не установлено, запрос не отправлен
+                retry_after = 0.3 * 2 ** attempt
+            except aiohttp.ClientConnectionError as exc:
+                self.failed += 1
+                logger.warning('Telegram sendMessage failed: %r', exc)
+                return
+            if attempt < self.retries:
+                await asyncio.sleep(min(retry_after, self.timeout[1]))
+
+        self.failed += 1
+        logger.warning('Telegram sendMessage failed after %s attempts', self.retries + 1)
+
+    @staticmethod
+    async def get_retry_after(response):
+        """ Время ожидания перед повтором (секунд), которое Telegram сообщает в ответе 429 """
+
+        try:
+            return float((await response.json(content_type=None))['parameters']['retry_after'])
+        except (ValueError, TypeError, KeyError):
+            # Ответ не от Bot API (например, страница прокси): ждем по заголовку Retry-After либо секунду
+            try:
+                return float(response.headers.get('Retry-After', 1))
+            except ValueError:
+                return 1
+
+    async def deliver(self, session, item, reminder):
+        """ Отправка напоминания и удаление его из очереди (в том числе если отправить не удалось) """
+
+        await self.send(session, reminder)
+        await self.queue.ack(item)
+
+    async def run(self, stop_when_empty=False):
+        """ Основной цикл. При stop_when_empty завершается, когда очередь опустеет """
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = set()
+
+        def done(task):
+            pending.discard(task)
+            semaphore.release()
+
+        if restored := await self.queue.restore():
+            logger.warning('Restored %s reminders not delivered before restart', restored)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            while True:
+                batch = await self.queue.pop_batch(self.batch_size)
+                if not batch:
+                    if stop_when_empty:
+                        break
+                    continue
+
+                for item, reminder in batch:
+                    # Не берем из очереди больше, чем можем отправить одновременно
+                    await semaphore.acquire()
+                    task = asyncio.create_task(self.deliver(session, item, reminder))
+                    pending.add(task)
+                    task.add_done_callback(done)
+
+            await asyncio.gather(*pending)
+
+
+def get_delivery_service(**kwargs):
+    """ Создание сервиса доставки по настройкам проекта """
+
+    options = {
+        'queue': RedisQueue(settings.HABITS_DELIVERY_REDIS_URL, settings.HABITS_DELIVERY_QUEUE),
+        'base_url': settings.TELEGRAM_API_URL,
+        'token': settings.TELEGRAM_BOT_TOKEN,
+        'concurrency': settings.HABITS_DELIVERY_CONCURRENCY,
+        'batch_size': settings.HABITS_DELIVERY_BATCH_SIZE,
+        'rate_limit': settings.TELEGRAM_RATE_LIMIT,
+        'chat_rate_limit': settings.TELEGRAM_CHAT_RATE_LIMIT,
+        'timeout': settings.TELEGRAM_TIMEOUT,
+    }
+    options.update(kwargs)
+    return DeliveryService(**options)
@@ -0,0 +1,60 @@
+from django.contrib.postgres.search import TrigramWordDistance
+from django.db import connection, transaction
+from rest_framework.filters import OrderingFilter
+
+from app_habits.models import SEARCH_TEXT
+
+
+class HabitSearchFilter(OrderingFilter):
+    """
+    Сортировка и поиск привычек по действию и месту (параметр search)
+
+    Поиск нечеткий, по триграммам (pg_trgm): находятся привычки, в действии или месте которых
+    есть слово, похожее на искомое. Без явной сортировки (ordering) результаты упорядочены
+    по возрастанию расстояния distance (1 - степень сходства), новые привычки выше при равном расстоянии.
+
+    Условие выполняется по GIN-индексу SEARCH_TEXT, и сортируются не более search_max_results
+    первых найденных привычек, поэтому время поиска не зависит от количества подходящих привычек.
+    Если подходящих привычек больше, в результат попадают не обязательно самые похожие из них
+    """
+
+    search_param = 'search'
+    search_max_length = 100
+    search_max_results = 200
+
+    def get_search_term(self, request):
+        return request.query_params.get(self.search_param, '').strip()[:self.search_max_length]
+
+    def filter_queryset(self, request, queryset, view):
+        if term := self.get_search_term(request):
+            # Без сортировки проверка строк по индексу прекращается после search_max_results найденных
+            found = queryset.alias(
+                search_text=SEARCH_TEXT
+            ).filter(
+                search_text__trigram_word_similar=term
+            ).order_by().values_list('pk', flat=True)[:self.search_max_results]
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Проверка %> одной строки в pg_trgm оценена планировщиком как простое сравнение,
+                # и при LIMIT он может выбрать полный просмотр таблицы, который в десятки раз дольше поиска по индексу.
+                # Настройка действует только до конца транзакции
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                found = list(found)
+            queryset = queryset.filter(pk__in=found).annotate(distance=TrigramWordDistance(term, SEARCH_TEXT))
+        return super().filter_queryset(request, queryset, view)
+
+    def get_ordering(self, request, queryset, view):
+        if self.get_search_term(request) and not request.query_params.get(self.ordering_param):
+            return ['distance', '-id']
+        return super().get_ordering(request, queryset, view)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *super().get_schema_operation_parameters(view),
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Поиск по действию и месту выполнения',
+                'schema': {'type': 'string'},
+            },
+        ]
@@ -0,0 +1,96 @@
+import json
+
+from django.conf import settings
+
+from app_habits.cache import bump_public_version_on_commit
+from app_habits.models import Habit
+from app_habits.schedules import schedule_registry
+from app_habits.serializers.habit import (
+    HabitGoodBulkCreateSerializer,
+    HabitNiceBulkCreateSerializer,
+    get_related_habits,
+)
+from app_habits.services import add_tasks
+
+
+def parse_lines(lines):
+    """
+    Разбор NDJSON по одной строке.
+    Возвращает номер строки, объект привычки либо ошибку разбора
+    """
+
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode()
+            except UnicodeDecodeError:
+                yield number, None, {'non_field_errors': ['Строка должна быть в кодировке UTF-8']}
+                continue
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield number, None, {'non_field_errors': ['Неверный JSON']}
+            continue
+        if not isinstance(item, dict):
+            yield number, None, {'non_field_errors': ['Ожидается объект привычки']}
+            continue
+        yield number, item, None
+
+
+def import_batch(items, owner):
+    """
+    Проверка и создание пачки привычек [(номер строки, объект)].
+    Связанные привычки загружаются одним запросом, привычки и напоминания создаются пачкой
+    """
+
+    context = {'related_habits': get_related_habits([item for _, item in items])}
+    habits, errors = [], []
+    for number, item in items:
+        is_nice = bool(item.get('is_nice'))
+        serializer_class = HabitNiceBulkCreateSerializer if is_nice else HabitGoodBulkCreateSerializer
+        serializer = serializer_class(data=item, context=context)
+        if serializer.is_valid():
+            habits.append(Habit(**serializer.validated_data, owner=owner, is_nice=is_nice))
+        else:
+            errors.append({'line': number, 'errors': serializer.errors})
+
+    if habits:
+        with schedule_registry.atomic():
+            habits = Habit.objects.bulk_create(habits)
+            add_tasks(habits)
+            if any(habit.is_public for habit in habits):
+                bump_public_version_on_commit()
+    return len(habits), errors
+
+
+def import_habits(lines, owner, batch_size=None):
+    """
+    Импорт привычек пользователя owner из строк NDJSON (по одной привычке в строке).
+    Строки читаются последовательно, корректные привычки сохраняются пачками по batch_size.
+    Ошибка в строке не прерывает импорт, а попадает в отчет с номером строки
+    """
+
+    batch_size = batch_size or settings.HABITS_IMPORT_BATCH_SIZE
+    report = {'created': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        created, errors = import_batch(batch, owner)
+        report['created'] += created
+        report['errors'] += errors
+        batch.clear()
+
+    for number, item, error in parse_lines(lines):
+        if error:
+            report['errors'].append({'line': number, 'errors': error})
+            continue
+        batch.append((number, item))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    report['errors'].sort(key=lambda error: error['line'])
+    return report
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+
+LATENESS_KEY = 'habits:reminders:lateness:{bucket}'
+
+
+def get_lateness_buckets():
+    """ Названия интервалов гистограммы опозданий: '<=0.1', '<=0.5', ..., '>60' """
+
+    bounds = settings.HABITS_REMINDER_LATENESS_BUCKETS
+    return [f'<={bound:g}' for bound in bounds] + [f'>{bounds[-1]:g}']
+
+
+def get_lateness_bucket(seconds):
+    """ Интервал гистограммы для опоздания seconds (отправка раньше срока попадает в первый интервал) """
+
+    for bound, bucket in zip(settings.HABITS_REMINDER_LATENESS_BUCKETS, get_lateness_buckets()):
+        if seconds <= bound:
+            return bucket
+    return get_lateness_buckets()[-1]
+
+
+def record_lateness(seconds):
+    """
+    Учет опоздания отправки напоминания относительно назначенного времени.
+    Счетчики хранятся в кэше, поэтому общая гистограмма всех воркеров собирается только в Redis (CACHE_REDIS_URL)
+    """
+
+    key = LATENESS_KEY.format(bucket=get_lateness_bucket(seconds))
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+def get_lateness_histogram():
+    """ Гистограмма опозданий {интервал: количество напоминаний} """
+
+    buckets = get_lateness_buckets()
+    counts = cache.get_many([LATENESS_KEY.format(bucket=bucket) for bucket in buckets])
+    return {bucket: counts.get(LATENESS_KEY.format(bucket=bucket), 0) for bucket in buckets}
+
+
+def reset_lateness_histogram():
+    cache.delete_many([LATENESS_KEY.format(bucket=bucket) for bucket in get_lateness_buckets()])
@@ -0,0 +1,108 @@
+import time
+from datetime import time as dt_time
+from unittest import mock
+
+from django.core.management import BaseCommand
+from django.test import override_settings
+from django_celery_beat.schedulers import DatabaseScheduler
+
+from app_habits.beat import HabitScheduler
+from app_habits.management.utils import rollback_transaction
+from app_habits.models import Habit
+from app_habits.services import create_periodic_tasks, update_periodic_tasks
+from app_users.models import User
+from config.celery import app
+
+
+class BenchSchedulerMixin:
+    """ Наступившие задачи не отправляются брокеру """
+
+    producer = None
+
+    def apply_entry(self, entry, producer=None):
+        pass
+
+
+class BenchDatabaseScheduler(BenchSchedulerMixin, DatabaseScheduler):
+    pass
+
+
+class BenchHabitScheduler(BenchSchedulerMixin, HabitScheduler):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Сравнение процессорного времени celery beat при постоянном потоке изменений привычек:
+    - DatabaseScheduler (-S django) перезагружает все задачи при каждом изменении
+    - HabitScheduler перечитывает только измененные задачи по журналу
+    Замеряется только время планировщиков, без времени изменения привычек.
+    Данные создаются во временной транзакции и после замера удаляются
+    """
+
+    help = 'Замер производительности планировщиков celery beat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--habits', type=int, default=20000, help='Количество привычек с напоминаниями')
+        parser.add_argument('-e', '--edits', type=int, default=20, help='Количество изменений привычек за проверку')
+        parser.add_argument('-r', '--rounds', type=int, default=20, help='Количество проверок изменений')
+
+    def handle(self, *args, **kwargs):
+        # close_old_connections закрыла бы соединение с открытой транзакцией
+        with rollback_transaction(), \
+                mock.patch('django_celery_beat.schedulers.close_old_connections'), \
+                mock.patch('app_habits.beat.close_old_connections'), \
+                override_settings(HABITS_BEAT_CHANGES_INTERVAL=0):
+            self.run(**kwargs)
+
+    def run(self, **kwargs):
+        user = User.objects.create(email='bench_beat@test.com', telegram_id='123456789', is_active=True)
+        habits = Habit.objects.bulk_create(
+            [
+                Habit(
+                    task=f'Test habit {i}',
+                    location='Test location',
+                    start_time=dt_time(i % 24, i % 60),
+                    periodicity=str(i % 7 + 1),
+                    owner=user,
+                )
+                for i in range(kwargs['habits'])
+            ],
+            batch_size=5000,
+        )
+        create_periodic_tasks(habits)
+
+        # Планировщики проверяются по очереди: изменения для DatabaseScheduler обновляют отметку
+        # PeriodicTasks, по которой HabitScheduler загрузил бы все задачи
+        schedulers = {
+            'DatabaseScheduler': (BenchDatabaseScheduler, False),
+            'HabitScheduler': (BenchHabitScheduler, True),
+        }
+        cpu_times = dict.fromkeys(schedulers, 0)
+        wall_times = dict.fromkeys(schedulers, 0)
+        edits = kwargs['edits']
+        for name, (scheduler_class, change_log) in schedulers.items():
+            with override_settings(HABITS_BEAT_CHANGE_LOG=change_log):
+                scheduler = scheduler_class(app=app)
+                scheduler.tick()
+                for number in range(kwargs['rounds']):
+                    # Изменение привычек (не замеряется)
+                    edited = habits[number * edits % len(habits):][:edits]
+                    for habit in edited:
+                        habit.task = f'{habit.task} *'
+                    update_periodic_tasks(edited)
+
+                    cpu_started, wall_started = time.process_time(), time.perf_counter()
+                    scheduler.tick()
+                    cpu_times[name] += time.process_time() - cpu_started
+                    wall_times[name] += time.perf_counter() - wall_started
+
+        self.stdout.write(
+            f'{kwargs["habits"]} задач, {kwargs["rounds"]} проверок по {edits} изменений'
+        )
+        self.stdout.write(f'{"планировщик":>20} {"CPU, мс/проверку":>18} {"время, мс/проверку":>20}')
+        for name in schedulers:
+            self.stdout.write(
+                f'{name:>20} {cpu_times[name] * 1000 / kwargs["rounds"]:>18.1f} '
+                f'{wall_times[name] * 1000 / kwargs["rounds"]:>20.1f}'
+            )
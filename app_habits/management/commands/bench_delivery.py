@@ -0,0 +1,77 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management import BaseCommand
+
+from app_habits.delivery import DeliveryService, MemoryQueue, render_reminder
+from app_habits.telegram import TelegramTransport
+
+# Транспорт процесса-воркера при замере пути "задача celery на сообщение"
+_transport = None
+
+
+def init_worker(url):
+    global _transport
+    _transport = TelegramTransport(url, 'token', rate_limit=100000, chat_rate_limit=100000)
+
+
+def send_reminder(reminder):
+    _transport.send_message(reminder['chat_id'], reminder['text'])
+
+
+class Command(BaseCommand):
+    """
+    Сравнение количества отправленных в секунду сообщений
+    на локальном сервере-заглушке Telegram Bot API:
+    - воркеры prefork, каждый отправляет одно сообщение за раз (как send_message_tg)
+    - сервис доставки на asyncio
+    """
+
+    help = 'Замер производительности сервиса доставки напоминаний'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--messages', type=int, default=2000, help='Количество сообщений')
+        parser.add_argument('-l', '--latency', type=float, default=50, help='Задержка ответа сервера (мс)')
+        parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                            help='Количество процессов воркера celery')
+        parser.add_argument('-c', '--concurrency', type=int, default=200,
+                            help='Количество одновременных запросов сервиса доставки')
+
+    def handle(self, *args, **kwargs):
+        # Сервер-заглушка нужен только для замера и загружается только при запуске команды
+        from app_habits.management.fake_bot_api import FakeBotAPIServer
+
+        reminders = [
+            render_reminder(
+                telegram_id=str(i),
+                start_time='08:00',
+                task='Test task',
+                location='Test location',
+                time_to_complete=60,
+            )
+            for i in range(kwargs['messages'])
+        ]
+
+        with FakeBotAPIServer(latency=kwargs['latency'] / 1000) as server:
+            started = time.perf_counter()
+            with ProcessPoolExecutor(kwargs['workers'], initializer=init_worker, initargs=(server.url, )) as pool:
+                list(pool.map(send_reminder, reminders, chunksize=1))
+            self.report(f'celery prefork ({kwargs["workers"]} процессов)', len(reminders), started)
+
+            service = DeliveryService(
+                queue=MemoryQueue(reminders),
+                base_url=server.url,
+                token='token',
+                concurrency=kwargs['concurrency'],
+                rate_limit=100000,
+                chat_rate_limit=100000,
+            )
+            started = time.perf_counter()
+            asyncio.run(service.run(stop_when_empty=True))
+            self.report(f'asyncio ({kwargs["concurrency"]} запросов)', service.sent, started)
+
+    def report(self, title, sent, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{title}: {sent} сообщений за {elapsed:.2f} с, {sent / elapsed:.0f} сообщ./с')
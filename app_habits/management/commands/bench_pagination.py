@@ -0,0 +1,84 @@
+import time
+
+from django.core.management import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_habits.management.utils import rollback_transaction
+from app_habits.models import Habit
+from app_habits.paginators.habit import HabitCursorPaginator, HabitPaginator
+from app_habits.views.habit import HabitListAPIView
+from app_users.models import User
+
+
+class HabitOffsetPaginator(HabitPaginator):
+    page_size_query_param = 'page_size'
+
+
+class Command(BaseCommand):
+    """
+    Сравнение времени получения страницы списка привычек
+    при постраничном выводе через OFFSET (номер страницы) и по ключу (курсор).
+    Данные создаются во временной транзакции и после замера удаляются
+    """
+
+    help = 'Замер производительности постраничного вывода списка привычек'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--habits', type=int, default=100000, help='Количество привычек')
+        parser.add_argument('-s', '--page-size', type=int, default=50, help='Размер страницы')
+        parser.add_argument('-p', '--pages', type=int, nargs='+', default=[1, 10, 100, 1000],
+                            help='Номера замеряемых страниц')
+        parser.add_argument('-o', '--ordering', default='task', help='Поле сортировки')
+
+    def handle(self, *args, **kwargs):
+        # Запросы к представлению выполняются без веб-сервера
+        with rollback_transaction(), override_settings(ALLOWED_HOSTS=['testserver']):
+            self.run(**kwargs)
+
+    def run(self, **kwargs):
+        user = User.objects.create(email='bench_pagination@test.com', is_staff=True, is_active=True)
+        Habit.objects.bulk_create(
+            [
+                Habit(
+                    task=f'Test habit {i % 1000}',
+                    location=f'Test location {i % 100}',
+                    periodicity=str(i % 7 + 1),
+                    is_nice=bool(i % 2),
+                    owner=user,
+                )
+                for i in range(kwargs['habits'])
+            ],
+            batch_size=5000,
+        )
+
+        params = {'ordering': kwargs['ordering'], 'page_size': kwargs['page_size']}
+        offset_view = HabitListAPIView.as_view(pagination_class=HabitOffsetPaginator)
+        cursor_view = HabitListAPIView.as_view(pagination_class=HabitCursorPaginator)
+
+        self.stdout.write(f'{kwargs["habits"]} привычек, {kwargs["page_size"]} на странице')
+        self.stdout.write(f'{"страница":>10} {"OFFSET, мс":>12} {"курсор, мс":>12}')
+
+        # Курсор страницы доступен только по ссылке next предыдущей страницы
+        url, number = None, 1
+        response = self.get(cursor_view, user, '/habit/list/', params)[0]
+        for page in sorted(kwargs['pages']):
+            while number < page and response.data['next']:
+                url = response.data['next']
+                response = self.get(cursor_view, user, url)[0]
+                number += 1
+            if number < page:
+                break
+
+            offset = self.get(offset_view, user, '/habit/list/', dict(params, page=page))[1]
+            cursor = self.get(cursor_view, user, url or '/habit/list/', None if url else params)[1]
+            self.stdout.write(f'{page:>10} {offset * 1000:>12.2f} {cursor * 1000:>12.2f}')
+
+    @staticmethod
+    def get(view, user, url, params=None):
+        request = APIRequestFactory().get(url, params)
+        force_authenticate(request, user=user)
+        started = time.perf_counter()
+        response = view(request)
+        response.render()
+        return response, time.perf_counter() - started
@@ -0,0 +1,163 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_habits.management.utils import rollback_transaction
+from app_habits.models import Habit
+from app_habits.views.habit import HabitListAPIView, HabitPublicListAPIView
+from app_users.models import User
+
+# Слоги для слов действий и мест: словарь из нескольких тысяч слов дает разнообразие триграмм,
+# близкое к тексту пользователей, в отличие от нескольких сотен повторяющихся строк
+SYLLABLES = [
+    'ба', 'бе', 'ви', 'во', 'га', 'ду', 'же', 'за', 'ки', 'ко', 'ла', 'ле', 'ми', 'мо', 'на', 'не',
+    'ни', 'по', 'ра', 'ре', 'ро', 'са', 'се', 'ст', 'та', 'те', 'то', 'ту', 'фа', 'ха', 'це', 'ча',
+    'ше', 'ще', 'ю', 'я', 'ан', 'ен', 'ин', 'ок', 'ул', 'ыр', 'ой', 'ай',
+]
+
+# Виды поисковых запросов: частые слова (1% словаря), любое слово словаря, редкое слово с опечаткой,
+# два слова и строка, которой нет в данных
+QUERY_KINDS = ['частое слово', 'слово словаря', 'редкое с опечаткой', 'два слова', 'нет в данных']
+
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    """
+    Замер времени поиска привычек (параметр search) в списках habit/list и habit/public_list
+    на большом наборе привычек с разнообразным текстом действия и места.
+    Время первой страницы ответа представления сравнивается с целевым 95-м процентилем (--target-ms).
+    Время выводится всего и по видам запросов QUERY_KINDS.
+    Данные создаются во временной транзакции и после замера удаляются
+    """
+
+    help = 'Замер времени поиска привычек'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--habits', type=int, default=1000000, help='Количество привычек')
+        parser.add_argument('-u', '--users', type=int, default=1000, help='Количество пользователей')
+        parser.add_argument('-p', '--public', type=int, default=10, help='Доля публичных привычек (%%)')
+        parser.add_argument('-w', '--words', type=int, default=5000, help='Количество слов в словаре')
+        parser.add_argument('-q', '--queries', type=int, default=50, help='Количество поисковых запросов')
+        parser.add_argument('-r', '--repeats', type=int, default=3, help='Количество повторов каждого запроса')
+        parser.add_argument('-t', '--target-ms', type=float, default=200, help='Целевой 95-й процентиль, мс')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **kwargs):
+        # Запросы к представлению выполняются без веб-сервера и без кэша публичной ленты
+        with rollback_transaction(), override_settings(ALLOWED_HOSTS=['testserver'], CACHES=NO_CACHE):
+            self.run(**kwargs)
+
+    def run(self, **kwargs):
+        rnd = random.Random(kwargs['seed'])
+        words = self.make_words(rnd, kwargs['words'])
+        # Частота слов убывает по закону Ципфа, как в естественном тексте.
+        # Накопленные веса вычисляются один раз, а не при каждом выборе слов
+        weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+        users = User.objects.bulk_create(
+            [User(email=f'bench_search_{i}@test.com', is_active=True) for i in range(kwargs['users'])]
+        )
+        started = time.perf_counter()
+        self.create_habits(rnd, words, weights, users, kwargs['habits'], kwargs['public'])
+        with connection.cursor() as cursor:
+            # Статистика для планировщика по новым данным
+            cursor.execute(f'ANALYZE {Habit._meta.db_table}')
+        self.stdout.write(f'{kwargs["habits"]} привычек созданы за {time.perf_counter() - started:.0f} с')
+
+        queries = self.make_queries(rnd, words, kwargs['queries'])
+        moderator = User(email='bench_search@test.com', is_staff=True)
+        endpoints = [
+            ('habit/list (модератор)', HabitListAPIView.as_view(), moderator),
+            ('habit/public_list', HabitPublicListAPIView.as_view(), users[0]),
+        ]
+
+        target = kwargs['target_ms']
+        self.stdout.write(f'{len(queries)} запросов по {kwargs["repeats"]} раза, цель: 95-й процентиль <= {target} мс')
+        self.stdout.write(f'{"список / запросы":>32} {"p50, мс":>10} {"p95, мс":>10} {"max, мс":>10}')
+        for title, view, user in endpoints:
+            # Первый запрос прогревает кэш страниц PostgreSQL и не учитывается
+            self.get(view, user, queries[0][1])
+            timings = {kind: [] for kind in QUERY_KINDS}
+            for kind, term in queries:
+                timings[kind] += [self.get(view, user, term) * 1000 for _ in range(kwargs['repeats'])]
+
+            total = sorted(timing for kind_timings in timings.values() for timing in kind_timings)
+            p95 = self.p95(total)
+            result = self.style.SUCCESS('OK') if p95 <= target else self.style.ERROR('превышено')
+            self.stdout.write(f'{title:>32} {statistics.median(total):>10.1f} {p95:>10.1f} {total[-1]:>10.1f} {result}')
+            for kind, kind_timings in timings.items():
+                self.stdout.write(
+                    f'{kind:>32} {statistics.median(kind_timings):>10.1f} '
+                    f'{self.p95(kind_timings):>10.1f} {max(kind_timings):>10.1f}'
+                )
+
+    @staticmethod
+    def p95(timings):
+        return statistics.quantiles(timings, n=20, method='inclusive')[-1]
+
+    @staticmethod
+    def make_words(rnd, count):
+        words = set()
+        while len(words) < count:
+            words.add(''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))))
+        # Порядок множества строк зависит от хэширования процесса, поэтому слова упорядочиваются до перемешивания
+        words = sorted(words)
+        rnd.shuffle(words)
+        return words
+
+    @staticmethod
+    def create_habits(rnd, words, weights, users, count, public):
+        batch_size = 10000
+        for start in range(0, count, batch_size):
+            Habit.objects.bulk_create(
+                [
+                    Habit(
+                        task=' '.join(rnd.choices(words, cum_weights=weights, k=rnd.randint(2, 5))),
+                        location=' '.join(rnd.choices(words, cum_weights=weights, k=rnd.randint(1, 3))),
+                        periodicity=str(i % 7 + 1),
+                        is_nice=bool(i % 2),
+                        is_public=rnd.randrange(100) < public,
+                        owner=users[i % len(users)],
+                    )
+                    for i in range(start, min(start + batch_size, count))
+                ],
+                batch_size=batch_size,
+            )
+
+    @staticmethod
+    def make_queries(rnd, words, count):
+        """ Поисковые запросы (вид, строка) поровну всех видов QUERY_KINDS """
+
+        frequent, rare = words[:len(words) // 100], words[len(words) // 10:]
+        queries = []
+        for number in range(count):
+            kind = QUERY_KINDS[number % len(QUERY_KINDS)]
+            if kind == 'частое слово':
+                term = rnd.choice(frequent)
+            elif kind == 'слово словаря':
+                term = rnd.choice(words)
+            elif kind == 'редкое с опечаткой':
+                word = rnd.choice(rare)
+                position = rnd.randrange(len(word))
+                term = word[:position] + rnd.choice('абвгд') + word[position + 1:]
+            elif kind == 'два слова':
+                term = f'{rnd.choice(words)} {rnd.choice(rare)}'
+            else:
+                term = ''.join(rnd.choices('qwxz', k=6))
+            queries.append((kind, term))
+        return queries
+
+    @staticmethod
+    def get(view, user, term):
+        request = APIRequestFactory().get('/habit/', {'search': term})
+        force_authenticate(request, user=user)
+        started = time.perf_counter()
+        view(request).render()
+        return time.perf_counter() - started
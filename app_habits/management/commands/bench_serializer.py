@@ -0,0 +1,53 @@
+import time
+from datetime import time as dt_time
+
+from django.core.management import BaseCommand
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from app_habits.management.utils import rollback_transaction
+from app_habits.models import Habit
+from app_habits.serializers.habit import HabitListAllSerializer
+from app_users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Сравнение количества строк в секунду при выводе списка привычек:
+    объекты модели и поля сериализатора либо словари values() (HabitValuesListSerializer).
+    Данные создаются во временной транзакции и после замера удаляются
+    """
+
+    help = 'Замер производительности сериализации списка привычек'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--habits', type=int, default=2000, help='Количество привычек')
+
+    def handle(self, *args, **kwargs):
+        with rollback_transaction():
+            self.run(**kwargs)
+
+    def run(self, **kwargs):
+        user = User.objects.create(email='bench_serializer@test.com', is_active=True)
+        Habit.objects.bulk_create(
+            [
+                Habit(task=f'Test habit {i}', location='Test location', start_time=dt_time(8), owner=user)
+                for i in range(kwargs['habits'])
+            ],
+            batch_size=5000,
+        )
+        queryset = Habit.objects.filter(owner=user).with_owner_email().order_by('id')
+
+        renders = {
+            'объекты модели': lambda: serializers.ListSerializer(queryset, child=HabitListAllSerializer()).data,
+            'values()': lambda: HabitListAllSerializer(
+                queryset.values(*HabitListAllSerializer.Meta.fields), many=True
+            ).data,
+        }
+
+        self.stdout.write(f'{kwargs["habits"]} привычек')
+        self.stdout.write(f'{"способ":>16} {"строк/с":>12}')
+        for name, render in renders.items():
+            started = time.perf_counter()
+            JSONRenderer().render(render())
+            self.stdout.write(f'{name:>16} {kwargs["habits"] / (time.perf_counter() - started):>12.0f}')
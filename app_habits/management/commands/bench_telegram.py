@@ -0,0 +1,78 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management import BaseCommand
+
+from app_habits.telegram import TelegramTransport
+
+
+class Command(BaseCommand):
+    """
+    Замер пропускной способности и задержки отправки сообщений
+    на локальном сервере-заглушке Telegram Bot API.
+
+    Сравнивается отправка через requests.post без сессии и через TelegramTransport
+    """
+
+    help = 'Замер производительности отправки сообщений в Telegram'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--messages', type=int, default=1000, help='Количество сообщений')
+        parser.add_argument('-t', '--threads', type=int, default=8, help='Количество потоков отправки')
+        parser.add_argument('-c', '--chats', type=int, default=1000, help='Количество различных чатов')
+        parser.add_argument('-l', '--latency', type=float, default=5, help='Задержка ответа сервера (мс)')
+        parser.add_argument('-r', '--rate', type=float, default=100000,
+                            help='Общий лимит отправки транспорта (сообщений в секунду)')
+
+    def handle(self, *args, **kwargs):
+        # Сервер-заглушка нужен только для замера и загружается только при запуске команды
+        from app_habits.management.fake_bot_api import FakeBotAPIServer
+
+        with FakeBotAPIServer(latency=kwargs['latency'] / 1000) as server:
+            def send_plain(chat_id):
+                requests.post(
+                    url=f'{server.url}token/sendMessage',
+                    data={'chat_id': chat_id, 'text': 'Benchmark'}
+                )
+
+            transport = TelegramTransport(
+                base_url=server.url,
+                token='token',
+                rate_limit=kwargs['rate'],
+                chat_rate_limit=kwargs['rate'],
+                pool_size=kwargs['threads'],
+            )
+
+            def send_transport(chat_id):
+                transport.send_message(chat_id, 'Benchmark')
+
+            for title, send in (('requests.post', send_plain), ('TelegramTransport', send_transport)):
+                connections = server.connections
+                result = self.run(send, **kwargs)
+                self.stdout.write(
+                    f'{title}: {result["rate"]:.0f} сообщ./с, '
+                    f'p50 {result["p50"]:.1f} мс, p99 {result["p99"]:.1f} мс, '
+                    f'соединений {server.connections - connections}'
+                )
+
+    @staticmethod
+    def run(send, messages, threads, chats, **kwargs):
+        """ Отправка сообщений в несколько потоков с замером задержки каждого """
+
+        def timed(i):
+            started = time.perf_counter()
+            send(str(i % chats))
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            latencies = sorted(executor.map(timed, range(messages)))
+        elapsed = time.perf_counter() - started
+
+        return {
+            'rate': messages / elapsed,
+            'p50': statistics.median(latencies),
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        }
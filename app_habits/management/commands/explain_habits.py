@@ -0,0 +1,106 @@
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_habits.management.utils import rollback_transaction
+from app_habits.models import Habit
+from app_habits.views.habit import HabitListAPIView, HabitPublicListAPIView
+from app_users.models import User
+
+# Проверяемые запросы: (название, представление, пользователь-модератор, параметры запроса)
+ENDPOINTS = [
+    ('habit/list', HabitListAPIView, False, {}),
+    ('habit/list', HabitListAPIView, False, {'is_nice': 'true'}),
+    ('habit/list', HabitListAPIView, False, {'ordering': 'start_time'}),
+    ('habit/list', HabitListAPIView, False, {'ordering': '-task'}),
+    ('habit/list', HabitListAPIView, False, {'ordering': 'location'}),
+    ('habit/list (модератор)', HabitListAPIView, True, {}),
+    ('habit/list (модератор)', HabitListAPIView, True, {'is_nice': 'false', 'ordering': 'task'}),
+    ('habit/list (модератор)', HabitListAPIView, True, {'search': '427'}),
+    ('habit/public_list', HabitPublicListAPIView, False, {}),
+    ('habit/public_list', HabitPublicListAPIView, False, {'is_nice': 'true'}),
+    ('habit/public_list', HabitPublicListAPIView, False, {'ordering': 'start_time'}),
+    ('habit/public_list', HabitPublicListAPIView, False, {'ordering': '-task'}),
+    ('habit/public_list', HabitPublicListAPIView, False, {'ordering': 'location'}),
+    ('habit/public_list', HabitPublicListAPIView, False, {'ordering': 'owner_email'}),
+    ('habit/public_list', HabitPublicListAPIView, False, {'search': '427'}),
+    ('habit/public_list', HabitPublicListAPIView, False, {'search': 'location 42'}),
+]
+
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    """
+    Вывод плана выполнения (EXPLAIN ANALYZE) SQL-запросов списков привычек.
+    Запросы перехватываются при вызове представлений для первой и следующей страницы,
+    поэтому проверяется именно тот SQL, который выполняется в работе.
+    Данные создаются во временной транзакции и после проверки удаляются
+    """
+
+    help = 'План выполнения запросов списков привычек'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--habits', type=int, default=100000, help='Количество привычек')
+        parser.add_argument('-u', '--users', type=int, default=1000, help='Количество пользователей')
+        parser.add_argument('-p', '--public', type=int, default=10, help='Доля публичных привычек (%%)')
+
+    def handle(self, *args, **kwargs):
+        # Запросы к представлению выполняются без веб-сервера и без кэша публичной ленты
+        with rollback_transaction(), override_settings(ALLOWED_HOSTS=['testserver'], CACHES=NO_CACHE):
+            self.run(**kwargs)
+
+    def run(self, **kwargs):
+        users = User.objects.bulk_create(
+            [User(email=f'explain_habits_{i}@test.com', is_active=True) for i in range(kwargs['users'])]
+        )
+        Habit.objects.bulk_create(
+            [
+                Habit(
+                    task=f'Test habit {i % 1000}',
+                    location=f'Test location {i % 100}',
+                    periodicity=str(i % 7 + 1),
+                    is_nice=bool(i % 2),
+                    is_public=i % 100 < kwargs['public'],
+                    owner=users[i % len(users)],
+                )
+                for i in range(kwargs['habits'])
+            ],
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            # Статистика для планировщика по новым данным
+            cursor.execute(f'ANALYZE {Habit._meta.db_table}')
+
+        user, moderator = users[0], User(email='explain_habits@test.com', is_staff=True)
+        for title, view_class, is_staff, params in ENDPOINTS:
+            view = view_class.as_view()
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{title} {params}'))
+
+            response, queries = self.get(view, moderator if is_staff else user, '/habit/', params)
+            if response.data['next']:
+                queries += self.get(view, moderator if is_staff else user, response.data['next'])[1]
+
+            for sql in queries:
+                self.stdout.write(sql)
+                self.stdout.write('\n'.join(self.explain(sql)) + '\n')
+
+    @staticmethod
+    def get(view, user, url, params=None):
+        """ Ответ представления и выполненные запросы к таблице привычек """
+
+        request = APIRequestFactory().get(url, params)
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as context:
+            response = view(request)
+            response.render()
+        queries = [query['sql'] for query in context.captured_queries if Habit._meta.db_table in query['sql']]
+        return response, queries
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN ANALYZE {sql}')
+            return [row[0] for row in cursor.fetchall()]
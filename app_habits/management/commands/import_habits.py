@@ -0,0 +1,37 @@
+import json
+import sys
+
+from django.core.management import BaseCommand, CommandError
+
+from app_habits.importer import import_habits
+from app_users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Импорт привычек пользователя из файла NDJSON (по одной привычке в строке).
+    Файл читается построчно, ошибки выводятся с номерами строк
+    """
+
+    help = 'Импорт привычек из NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу NDJSON ("-" для стандартного ввода)')
+        parser.add_argument('-e', '--email', required=True, help='Email пользователя - владельца привычек')
+        parser.add_argument('-b', '--batch-size', type=int, help='Количество привычек в пачке')
+
+    def handle(self, *args, **kwargs):
+        try:
+            owner = User.objects.get(email=kwargs['email'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {kwargs["email"]} не найден')
+
+        if kwargs['path'] == '-':
+            report = import_habits(sys.stdin.buffer, owner, kwargs['batch_size'])
+        else:
+            with open(kwargs['path'], 'rb') as file:
+                report = import_habits(file, owner, kwargs['batch_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f'Строка {error["line"]}: {json.dumps(error["errors"], ensure_ascii=False)}')
+        self.stdout.write(f'Создано привычек: {report["created"]}, ошибок: {len(report["errors"])}')
@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from app_habits.lateness import get_lateness_histogram, reset_lateness_histogram
+
+BAR_WIDTH = 50
+
+
+class Command(BaseCommand):
+    """
+    Вывод гистограммы опозданий напоминаний, заранее поставленных в очередь с ETA
+    (HABITS_REMINDER_PREENQUEUE_MINUTES). Опоздание - время от назначенного момента до отправки
+    """
+
+    help = 'Гистограмма опозданий отправки напоминаний'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить гистограмму после вывода')
+
+    def handle(self, *args, **kwargs):
+        histogram = get_lateness_histogram()
+        total = sum(histogram.values())
+
+        self.stdout.write(f'{"опоздание, с":>12} {"напоминаний":>12}')
+        for bucket, count in histogram.items():
+            bar = '#' * round(BAR_WIDTH * count / total) if total else ''
+            self.stdout.write(f'{bucket:>12} {count:>12} {bar}'.rstrip())
+        self.stdout.write(f'{"всего":>12} {total:>12}')
+
+        if kwargs['reset']:
+            reset_lateness_histogram()
@@ -0,0 +1,54 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from app_habits.models import Habit
+from app_habits.services import REMINDER_LEAD_TIME, get_smoothing_offset
+
+BAR_WIDTH = 50
+MINUTES_PER_DAY = 24 * 60
+
+
+class Command(BaseCommand):
+    """
+    Гистограмма количества напоминаний в минуту по текущим полезным привычкам.
+    Минута - время отправки напоминания (за 5 минут до начала действия) с учетом сглаживания нагрузки.
+    Считается худший день, когда напоминание приходит по всем привычкам независимо от периодичности
+    """
+
+    help = 'Количество напоминаний в минуту для расчета количества воркеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-t', '--top', type=int, default=20, help='Количество самых загруженных минут')
+        parser.add_argument('-s', '--smoothing', type=int,
+                            default=int(settings.HABITS_REMINDER_SMOOTHING_WINDOW.total_seconds()),
+                            help='Окно сглаживания нагрузки (секунд), по умолчанию из настроек')
+
+    def handle(self, *args, **kwargs):
+        window = timedelta(seconds=kwargs['smoothing'])
+        lead_seconds = int(REMINDER_LEAD_TIME.total_seconds())
+
+        minutes = Counter()
+        habits = Habit.objects.filter(is_nice=False, start_time__isnull=False).values_list('id', 'start_time')
+        for habit_id, start_time in habits.iterator(chunk_size=settings.HABITS_EXPORT_CHUNK_SIZE):
+            seconds = start_time.hour * 3600 + start_time.minute * 60 + start_time.second
+            seconds -= lead_seconds + int(get_smoothing_offset(habit_id, window).total_seconds())
+            minutes[seconds // 60 % MINUTES_PER_DAY] += 1
+
+        total = sum(minutes.values())
+        self.stdout.write(f'Окно сглаживания: {kwargs["smoothing"]} с')
+        self.stdout.write(f'Напоминаний: {total}, минут с напоминаниями: {len(minutes)}')
+        if not total:
+            return
+
+        busiest = minutes.most_common(kwargs['top'])
+        peak = busiest[0][1]
+        self.stdout.write(
+            f'Пик: {peak} в минуту ({peak / 60:.1f} в секунду), в среднем: {total / MINUTES_PER_DAY:.1f} в минуту'
+        )
+        self.stdout.write(f'{"минута":>8} {"напоминаний":>12}')
+        for minute, count in busiest:
+            bar = '#' * max(1, round(BAR_WIDTH * count / peak))
+            self.stdout.write(f'{minute // 60:02d}:{minute % 60:02d}'.rjust(8) + f' {count:>12} {bar}')
@@ -0,0 +1,20 @@
+import asyncio
+
+from django.core.management import BaseCommand
+
+from app_habits.delivery import get_delivery_service
+
+
+class Command(BaseCommand):
+    """ Запуск сервиса доставки напоминаний из очереди Redis """
+
+    help = 'Запуск сервиса доставки напоминаний'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--concurrency', type=int, help='Количество одновременных запросов')
+
+    def handle(self, *args, **kwargs):
+        options = {'concurrency': kwargs['concurrency']} if kwargs.get('concurrency') else {}
+        service = get_delivery_service(**options)
+        self.stdout.write(f'Сервис доставки запущен, одновременных запросов: {service.concurrency}')
+        asyncio.run(service.run())
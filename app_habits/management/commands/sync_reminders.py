@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from app_habits.models import Habit
+from app_habits.schedules import schedule_registry
+from app_habits.services import create_periodic_tasks, delete_periodic_tasks, get_next_fire_at
+
+
+class Command(BaseCommand):
+    """
+    Приведение напоминаний существующих привычек к способу планирования HABITS_REMINDER_BACKEND:
+    - dispatcher: периодические задачи привычек удаляются, заполняется время следующего напоминания next_fire_at
+    - periodic_task: создаются отсутствующие периодические задачи, next_fire_at очищается
+    Выполняется после смены способа (в docker-compose - при каждом запуске),
+    повторный запуск ничего не меняет. Привычки обрабатываются пачками по HABITS_REMINDER_BATCH_SIZE
+    """
+
+    help = 'Перевод напоминаний существующих привычек на текущий способ планирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--backend', choices=('periodic_task', 'dispatcher'),
+                            default=settings.HABITS_REMINDER_BACKEND,
+                            help='Способ планирования, по умолчанию из настроек')
+
+    def handle(self, *args, **kwargs):
+        batch_size = settings.HABITS_REMINDER_BATCH_SIZE
+        reminded = Habit.objects.filter(is_nice=False, start_time__isnull=False)
+        changed = 0
+
+        if kwargs['backend'] == 'dispatcher':
+            # Иначе привычка получала бы напоминание и от своей задачи, и от диспетчера
+            while task_ids := list(
+                Habit.objects.filter(periodic_task__isnull=False).values_list('periodic_task_id', flat=True)[:batch_size]
+            ):
+                with transaction.atomic():
+                    delete_periodic_tasks(task_ids)
+            # Без next_fire_at диспетчер никогда не выберет привычку
+            while habits := list(reminded.filter(next_fire_at__isnull=True).only('id', 'start_time')[:batch_size]):
+                for habit in habits:
+                    habit.next_fire_at = get_next_fire_at(habit)
+                Habit.objects.bulk_update(habits, ['next_fire_at'])
+                changed += len(habits)
+        else:
+            while habits := list(
+                reminded.filter(periodic_task__isnull=True).select_related('owner', 'related_habit')[:batch_size]
+            ):
+                with schedule_registry.atomic():
+                    create_periodic_tasks(habits)
+                changed += len(habits)
+            Habit.objects.filter(next_fire_at__isnull=False).update(next_fire_at=None)
+
+        self.stdout.write(f'{kwargs["backend"]}: обновлено напоминаний привычек: {changed}')
@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBotAPIHandler(BaseHTTPRequestHandler):
+    """ Обработчик, имитирующий метод sendMessage Telegram Bot API """
+
+    protocol_version = 'HTTP/1.1'  # Поддержка keep-alive соединений
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        with self.server.lock:
+            self.server.requests += 1
+            status = self.server.errors.pop(0) if self.server.errors else 200
+
+        if status == 200:
+            body = json.dumps({'ok': True, 'result': {'message_id': self.server.requests}}).encode()
+            content_type = 'application/json'
+        else:
+            # Ошибка не в формате Bot API, как у промежуточного прокси
+            body = b'Error'
+            content_type = 'text/plain'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeBotAPIServer(ThreadingHTTPServer):
+    """
+    Локальный сервер-заглушка Telegram Bot API для тестов и замеров производительности
+
+    Считает количество запросов и открытых соединений, может имитировать задержку ответа
+    и отвечать на первые запросы кодами ошибок из errors.
+    Используется как контекстный менеджер, url подставляется в TELEGRAM_API_URL
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0, errors=()):
+        super().__init__(('127.0.0.1', 0), FakeBotAPIHandler)
+        self.latency = latency
+        self.errors = list(errors)
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Клиенты закрывают keep-alive соединения при завершении, это не ошибка
+        pass
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/bot'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,15 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def rollback_transaction():
+    """
+    Временная транзакция для замеров и проверок на тестовых данных.
+    Все изменения внутри блока отменяются после его выполнения
+    """
+
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
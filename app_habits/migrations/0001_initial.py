@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Habit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.TextField(verbose_name='Выполняемое действие')),
+                ('start_time', models.TimeField(blank=True, null=True, verbose_name='Время начала выполнения')),
+                ('location', models.CharField(max_length=50, verbose_name='Место выполнения действия')),
+                ('is_nice', models.BooleanField(default=False, verbose_name='Признак приятной привычки')),
+                ('periodicity', models.CharField(blank=True, choices=[('1', '1 День'), ('2', '2 Дня'), ('3', '3 Дня'), ('4', '4 Дня'), ('5', '5 Дней'), ('6', '6 Дней'), ('7', '7 Дней')], default='1', max_length=2, null=True, verbose_name='Периодичность дней')),
+                ('reward', models.CharField(blank=True, max_length=50, null=True, verbose_name='Вознаграждение')),
+                ('time_to_complete', models.PositiveIntegerField(default=60, verbose_name='Время на выполнение (секунд)')),
+                ('is_public', models.BooleanField(default=False, verbose_name='Признак публичности')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Создатель привычки')),
+                ('related_habit', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app_habits.habit', verbose_name='Привязка приятной привычки')),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+        ('app_habits', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='periodic_task',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='habit', to='django_celery_beat.periodictask', verbose_name='Периодическая задача напоминания'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def link_periodic_tasks(apps, schema_editor):
+    """
+    Привязка существующих периодических задач к привычкам.
+
+    Имя задачи имеет вид "<id привычки>: <действие>", после изменения действия
+    текст в имени устаревает, поэтому привычка определяется только по id.
+    Лишние задачи одной привычки и задачи удаленных привычек удаляются
+    """
+
+    Habit = apps.get_model('app_habits', 'Habit')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTasks = apps.get_model('django_celery_beat', 'PeriodicTasks')
+
+    habit_ids = set(Habit.objects.values_list('id', flat=True))
+    linked = {}
+    orphans = []
+
+    tasks = PeriodicTask.objects.filter(task='app_habits.tasks.send_message_tg').order_by('-id')
+    for task_id, name in tasks.values_list('id', 'name').iterator():
+        habit_id, _, _ = name.partition(':')
+        habit_id = int(habit_id) if habit_id.isdigit() else None
+        if habit_id in habit_ids and habit_id not in linked:
+            # Самая новая задача привычки
+            linked[habit_id] = task_id
+        else:
+            orphans.append(task_id)
+
+    habits = list(Habit.objects.filter(id__in=linked))
+    for habit in habits:
+        habit.periodic_task_id = linked[habit.id]
+    Habit.objects.bulk_update(habits, ['periodic_task'], batch_size=1000)
+
+    if orphans:
+        PeriodicTask.objects.filter(id__in=orphans).delete()
+        # Сообщаем celery beat об изменении расписания
+        PeriodicTasks.objects.update_or_create(ident=1, defaults={'last_update': timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_habits', '0002_habit_periodic_task'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_periodic_tasks, migrations.RunPython.noop),
+    ]
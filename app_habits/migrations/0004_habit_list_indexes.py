@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:28
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Индексы создаются без блокировки записи в таблицу (CREATE INDEX CONCURRENTLY вне транзакции)
+    atomic = False
+
+    dependencies = [
+        ('app_habits', '0003_backfill_habit_periodic_task'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(fields=['owner', 'is_nice', 'id'], name='habit_owner_nice_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(fields=['owner', 'start_time', 'id'], name='habit_owner_start_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(fields=['owner', 'task', 'id'], name='habit_owner_task_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(fields=['owner', 'location', 'id'], name='habit_owner_location_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['id'], name='habit_public_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['is_nice', 'id'], name='habit_public_nice_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['start_time', 'id'], name='habit_public_start_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['task', 'id'], name='habit_public_task_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['location', 'id'], name='habit_public_location_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app_habits', '0004_habit_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedHabit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('habit_id', models.PositiveBigIntegerField(verbose_name='id удаленной привычки')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Время удаления')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Время изменения'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['owner', 'updated_at', 'id'], name='habit_owner_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='deletedhabit',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Создатель привычки'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedhabit',
+            index=models.Index(fields=['owner', 'deleted_at'], name='deleted_habit_owner_idx'),
+        ),
+    ]
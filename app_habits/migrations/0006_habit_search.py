@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:46
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    # Индексы создаются без блокировки записи в таблицу (CREATE INDEX CONCURRENTLY вне транзакции)
+    atomic = False
+
+    dependencies = [
+        ('app_habits', '0005_habit_sync'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.expressions.Func(django.db.models.expressions.F('task'), django.db.models.expressions.F('location'), arg_joiner=" || ' ' || ", output_field=models.TextField(), template='(%(expressions)s)'), name='gin_trgm_ops'), name='habit_search_trgm_idx'),
+        ),
+    ]
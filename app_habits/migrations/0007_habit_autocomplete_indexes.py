@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:49
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    # Индексы создаются без блокировки записи в таблицу (CREATE INDEX CONCURRENTLY вне транзакции)
+    atomic = False
+
+    dependencies = [
+        ('app_habits', '0006_habit_search'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(models.F('owner'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('task'), name='text_pattern_ops'), condition=models.Q(('is_nice', True)), name='habit_owner_nice_prefix_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='habit',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('task'), name='text_pattern_ops'), condition=models.Q(('is_nice', True), ('is_public', True)), name='habit_public_nice_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_habits', '0007_habit_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('habit_id', models.PositiveBigIntegerField(verbose_name='id привычки')),
+                ('periodic_task_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='id периодической задачи привычки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время создания')),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+    ]
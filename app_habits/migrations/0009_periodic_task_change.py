@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_habits', '0008_schedule_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodicTaskChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodic_task_id', models.PositiveIntegerField(verbose_name='id периодической задачи')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время изменения')),
+            ],
+        ),
+    ]
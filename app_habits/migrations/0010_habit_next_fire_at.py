@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_habits', '0009_periodic_task_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='next_fire_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Время следующего напоминания'),
+        ),
+    ]
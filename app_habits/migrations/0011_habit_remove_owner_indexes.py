@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:41
+
+from django.conf import settings
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    # Индексы удаляются без блокировки записи в таблицу (DROP INDEX CONCURRENTLY вне транзакции)
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app_habits', '0010_habit_next_fire_at'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='habit',
+            name='habit_owner_start_time_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='habit',
+            name='habit_owner_task_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='habit',
+            name='habit_owner_location_idx',
+        ),
+        # AlterField пересоздал бы внешний ключ с проверкой всей таблицы, поэтому удаляется только индекс
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='habit',
+                    name='owner',
+                    field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Создатель привычки'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX CONCURRENTLY IF EXISTS "app_habits_habit_owner_id_f0044846"',
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "app_habits_habit_owner_id_f0044846" '
+                    'ON "app_habits_habit" ("owner_id")',
+                ),
+            ],
+        ),
+    ]
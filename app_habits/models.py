@@ -1,7 +1,22 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models import DEFERRED, BooleanField, ExpressionWrapper, F, Func, Q, Value
+from django.db.models.functions import Upper
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask
 
+from app_habits.cache import bump_public_version_on_commit
 from app_users.models import NULLABLE
-from config import settings
+
+
+# Текст поиска привычки: действие и место одной строкой.
+# Оператор || в отличие от функции CONCAT неизменяем (IMMUTABLE) и допустим в выражении индекса
+SEARCH_TEXT = Func(
+    F('task'), F('location'), template='(%(expressions)s)', arg_joiner=" || ' ' || ", output_field=models.TextField()
+)
 
 
 class Periodicity(models.TextChoices):
@@ -16,6 +31,87 @@ class Periodicity(models.TextChoices):
     DAY_7 = 7, '7 Дней'
 
 
+class HabitQuerySet(models.QuerySet):
+
+    def with_owner_email(self):
+        """ Добавление email создателя привычки в тот же запрос, по нему также доступна сортировка """
+
+        return self.annotate(owner_email=F('owner__email'))
+
+    @staticmethod
+    def get_visibility_condition(user):
+        """ Условие просмотра привычки пользователем: свои и публичные привычки, модератору - все (None) """
+
+        if user.is_staff:
+            return None
+        return Q(is_public=True) | Q(owner=user)
+
+    @staticmethod
+    def get_edit_condition(user):
+        """ Условие изменения привычки пользователем: свои привычки, модератору - все (None) """
+
+        if user.is_staff:
+            return None
+        return Q(owner=user)
+
+    @staticmethod
+    def get_list_condition(user):
+        """ Условие списка и синхронизации привычек пользователя: свои привычки, модератору - все (None) """
+
+        if user.is_staff:
+            return None
+        return Q(owner=user)
+
+    @staticmethod
+    def get_delete_condition(user):
+        """ Условие удаления привычки пользователем: только свои привычки, в том числе для модератора """
+
+        return Q(owner=user)
+
+    def _filter_condition(self, condition):
+        return self.all() if condition is None else self.filter(condition)
+
+    def visible_to(self, user):
+        """ Привычки, которые пользователь может просматривать """
+
+        return self._filter_condition(self.get_visibility_condition(user))
+
+    def editable_by(self, user):
+        """ Привычки, которые пользователь может изменять """
+
+        return self._filter_condition(self.get_edit_condition(user))
+
+    def listed_for(self, user):
+        """ Привычки в списке и синхронизации пользователя """
+
+        return self._filter_condition(self.get_list_condition(user))
+
+    def deletable_by(self, user):
+        """ Привычки, которые пользователь может удалять """
+
+        return self._filter_condition(self.get_delete_condition(user))
+
+    def with_access(self, condition, name='has_access'):
+        """
+        Добавление признака доступа name по условию condition (None - доступ есть всегда).
+        Позволяет одним запросом отличить отсутствующую привычку от недоступной
+        """
+
+        if condition is None:
+            return self.annotate(**{name: Value(True)})
+        return self.annotate(**{name: ExpressionWrapper(condition, output_field=BooleanField())})
+
+    def with_visibility(self, user):
+        """ Добавление признака is_visible - может ли пользователь просматривать привычку """
+
+        return self.with_access(self.get_visibility_condition(user), 'is_visible')
+
+    def delete(self):
+        # Отметки об удалении создаются до удаления привычек
+        mark_deleted(self.values_list('id', 'owner_id', 'is_nice'))
+        return super().delete()
+
+
 class Habit(models.Model):
     """
     Модель "привычка".
@@ -23,9 +119,11 @@ class Habit(models.Model):
     На ее основе создается как полезная, так и приятная привычка
     """
     #
+    # Отдельный индекс не нужен: поиск по создателю идет по индексам Meta.indexes, начинающимся с owner
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Создатель привычки',
         **NULLABLE
     )
@@ -79,3 +177,238 @@ class Habit(models.Model):
         default=False,
         verbose_name="Признак публичности"
     )
+    # ДЛЯ ПОЛЕЗНОЙ привычки. Периодическая задача напоминания
+    periodic_task = models.OneToOneField(
+        PeriodicTask,
+        on_delete=models.SET_NULL,
+        related_name='habit',
+        verbose_name='Периодическая задача напоминания',
+        **NULLABLE
+    )
+    # ДЛЯ ПОЛЕЗНОЙ привычки. Заполняется при работе диспетчера напоминаний
+    next_fire_at = models.DateTimeField(
+        db_index=True,
+        verbose_name="Время следующего напоминания",
+        **NULLABLE
+    )
+    # Время создания либо последнего изменения, по нему клиенты получают изменения привычек
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name="Время изменения"
+    )
+
+    objects = HabitQuerySet.as_manager()
+
+    class Meta:
+        # Индексы под фильтры и сортировки списков привычек.
+        # id в конце индекса - для постраничного вывода по ключу (сортировка + id).
+        # Каждый индекс по всей таблице обновляется при изменении next_fire_at диспетчером напоминаний,
+        # поэтому свои привычки пользователя (их немного) сортируются без отдельных индексов по полям
+        indexes = [
+            # Свои привычки пользователя
+            models.Index(fields=['owner', 'is_nice', 'id'], name='habit_owner_nice_idx'),
+            models.Index(fields=['owner', 'updated_at', 'id'], name='habit_owner_updated_idx'),
+            # Публичные привычки (небольшая часть таблицы)
+            models.Index(fields=['id'], name='habit_public_idx', condition=Q(is_public=True)),
+            models.Index(fields=['is_nice', 'id'], name='habit_public_nice_idx', condition=Q(is_public=True)),
+            models.Index(fields=['start_time', 'id'], name='habit_public_start_time_idx', condition=Q(is_public=True)),
+            models.Index(fields=['task', 'id'], name='habit_public_task_idx', condition=Q(is_public=True)),
+            models.Index(fields=['location', 'id'], name='habit_public_location_idx', condition=Q(is_public=True)),
+            # Подбор приятной привычки по началу действия (LIKE 'префикс%' без учета регистра)
+            models.Index(
+                F('owner'), OpClass(Upper('task'), name='text_pattern_ops'),
+                name='habit_owner_nice_prefix_idx', condition=Q(is_nice=True)
+            ),
+            models.Index(
+                OpClass(Upper('task'), name='text_pattern_ops'),
+                name='habit_public_nice_prefix_idx', condition=Q(is_nice=True, is_public=True)
+            ),
+            # Поиск по триграммам (расширение pg_trgm)
+            GinIndex(OpClass(SEARCH_TEXT, name='gin_trgm_ops'), name='habit_search_trgm_idx'),
+        ]
+
+    # Поля, изменение которых требует перепланирования напоминания
+    SCHEDULE_FIELDS = frozenset(
+        ('start_time', 'periodicity', 'task', 'location', 'reward', 'related_habit', 'time_to_complete')
+    )
+    # Поля приятной привычки, которые попадают в напоминание о связанной полезной привычке
+    RELATED_SCHEDULE_FIELDS = frozenset(('task', 'location', 'time_to_complete'))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженные значения для отслеживания изменений
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not DEFERRED
+        }
+        return instance
+
+    def get_changed_fields(self):
+        """
+        Получение названий полей, измененных с момента загрузки из базы данных.
+        Для нового объекта считаются измененными все поля
+        """
+
+        loaded_values = getattr(self, '_loaded_values', None)
+        changed_fields = set()
+        for field in self._meta.concrete_fields:
+            if loaded_values is None:
+                changed_fields.add(field.name)
+            elif field.attname in loaded_values and getattr(self, field.attname) != loaded_values[field.attname]:
+                changed_fields.add(field.name)
+        return changed_fields
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        changed_fields = self.get_changed_fields()
+        if update_fields is not None:
+            changed_fields &= set(update_fields)
+        # Сохраняем список измененных полей, он доступен после сохранения
+        self.saved_changes = changed_fields
+        affects_public_feed = self.affects_public_feed(changed_fields)
+
+        super().save(*args, **kwargs)
+
+        if affects_public_feed:
+            bump_public_version_on_commit()
+
+        if getattr(self, '_loaded_values', None) is None:
+            self._loaded_values = {}
+        for field in self._meta.concrete_fields:
+            if update_fields is None or field.name in update_fields:
+                self._loaded_values[field.attname] = getattr(self, field.attname)
+
+    def delete(self, *args, **kwargs):
+        mark_deleted([(self.id, self.owner_id, self.is_nice)])
+        result = super().delete(*args, **kwargs)
+        if self.is_public:
+            bump_public_version_on_commit()
+        return result
+
+    def affects_public_feed(self, changed_fields):
+        """ Изменение привычки видно в публичной ленте (привычка публичная либо была публичной) """
+
+        was_public = (getattr(self, '_loaded_values', None) or {}).get('is_public', False)
+        return bool(changed_fields) and (self.is_public or was_public)
+
+    @property
+    def schedule_changed(self):
+        """ Признак того, что при последнем сохранении изменились поля напоминания """
+
+        return bool(getattr(self, 'saved_changes', set()) & self.SCHEDULE_FIELDS)
+
+
+class DeletedHabit(models.Model):
+    """
+    Отметка об удалении привычки.
+    По отметкам клиенты при синхронизации узнают об удаленных привычках.
+    Отметки хранятся HABITS_SYNC_HORIZON (см. prune_deleted_habits)
+    """
+
+    habit_id = models.PositiveBigIntegerField(
+        verbose_name='id удаленной привычки'
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Создатель привычки',
+        **NULLABLE
+    )
+    deleted_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Время удаления'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'deleted_at'], name='deleted_habit_owner_idx'),
+        ]
+
+
+def mark_deleted(habits):
+    """
+    Создание отметок об удалении привычек [(id, id создателя, признак приятной привычки)].
+    Связанные полезные привычки теряют ссылку на удаляемую приятную привычку (SET_NULL),
+    поэтому время их изменения также обновляется
+    """
+
+    habits = list(habits)
+    if not habits:
+        return
+    DeletedHabit.objects.bulk_create(
+        [DeletedHabit(habit_id=habit_id, owner_id=owner_id) for habit_id, owner_id, _ in habits]
+    )
+    if nice_ids := [habit_id for habit_id, _, is_nice in habits if is_nice]:
+        Habit.objects.filter(related_habit__in=nice_ids).exclude(id__in=nice_ids).update(updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def touch_owner_habits(sender, instance, update_fields=None, **kwargs):
+    """
+    Email создателя выводится в списках привычек (owner_email), поэтому при его изменении
+    обновляется время изменения привычек (ETag списков, синхронизация) и версия публичной ленты
+    """
+
+    if instance.pk is None or (update_fields is not None and 'email' not in update_fields):
+        return
+    email = sender.objects.filter(pk=instance.pk).values_list('email', flat=True).first()
+    if email is not None and email != instance.email:
+        if Habit.objects.filter(owner_id=instance.pk).update(updated_at=timezone.now()):
+            bump_public_version_on_commit()
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def bump_public_version_on_owner_delete(**kwargs):
+    # Привычки удаляются каскадом без Habit.delete()
+    bump_public_version_on_commit()
+
+
+class ScheduleOutbox(models.Model):
+    """
+    Запись об изменении напоминания привычки (transactional outbox).
+
+    Создается в одной транзакции с изменением привычки, напоминание по ней
+    приводится в соответствие с привычкой задачей relay_schedule_outbox.
+    Привычка к моменту обработки может быть удалена, поэтому вместо внешнего ключа
+    хранятся ее id и id ее периодической задачи на момент изменения
+    """
+
+    habit_id = models.PositiveBigIntegerField(
+        verbose_name='id привычки'
+    )
+    # Первичный ключ PeriodicTask в django_celery_beat - AutoField
+    periodic_task_id = models.PositiveIntegerField(
+        verbose_name='id периодической задачи привычки',
+        **NULLABLE
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время создания'
+    )
+
+    class Meta:
+        ordering = ('id', )
+
+
+class PeriodicTaskChange(models.Model):
+    """
+    Запись журнала изменений периодических задач.
+    По журналу планировщик HabitScheduler перечитывает только измененные задачи,
+    а не все расписание целиком. Обработанные записи планировщик удаляет
+    """
+
+    periodic_task_id = models.PositiveIntegerField(
+        verbose_name='id периодической задачи'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время изменения'
+    )
+
+
+def log_periodic_task_changes(task_ids):
+    """ Запись в журнал изменений созданных, измененных или удаленных периодических задач """
+
+    PeriodicTaskChange.objects.bulk_create([PeriodicTaskChange(periodic_task_id=task_id) for task_id in task_ids])
@@ -1,5 +1,180 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from datetime import time
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class HabitPaginator(PageNumberPagination):
     page_size = 5
+
+
+class HabitCursorPaginator(BasePagination):
+    """
+    Постраничный вывод по ключу (keyset pagination)
+
+    Вместо OFFSET и COUNT(*) следующая страница выбирается условием
+    "после последней записи" по полям сортировки с добавлением id,
+    поэтому время получения страницы не зависит от ее номера.
+    Поддерживается сортировка по любому полю из ordering_fields представления,
+    пустые значения (NULL) считаются наибольшими
+    """
+
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_keys(request, queryset, view)
+        self.base_url = request.build_absolute_uri()
+
+        values, reverse = self.decode_cursor(request)
+        keys = [(field, not desc) for field, desc in self.keys] if reverse else self.keys
+
+        # Строки values() уже содержат поля сортировки (HabitFieldsMixin.get_selected_fields)
+        queryset = queryset.order_by(*[
+            F(field).desc(nulls_first=True) if desc else F(field).asc(nulls_last=True)
+            for field, desc in keys
+        ])
+        if values is not None:
+            not_null = {field.name for field in queryset.model._meta.concrete_fields if not field.null}
+            try:
+                # Значения курсора приводятся к типам полей при построении условия
+                queryset = queryset.filter(self.get_after_condition(keys, values, not_null))
+            except (ValueError, TypeError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.first, self.last = (results[0], results[-1]) if results else (None, None)
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    @staticmethod
+    def get_keys(request, queryset, view):
+        """ Поля сортировки в виде [(поле, по убыванию)] с id последним для однозначности """
+
+        ordering = None
+        for backend in getattr(view, 'filter_backends', ()):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+        keys = []
+        for term in ordering or ():
+            keys.append((term.lstrip('-'), term.startswith('-')))
+            if keys[-1][0] == 'id':
+                # id уникален, следующие поля не влияют на порядок
+                return keys
+        keys.append(('id', keys[-1][1] if keys else False))
+        return keys
+
+    @staticmethod
+    def get_after_condition(keys, values, not_null=()):
+        """
+        Условие "строго после записи со значениями values" при сортировке keys:
+        (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...
+        Для полей из not_null проверка на NULL не добавляется, чтобы не мешать использованию индекса
+        """
+
+        condition = Q()
+        equal = Q()
+        for (field, desc), value in zip(keys, values):
+            if value is None:
+                # NULL наибольшее: после него при убывании идут все непустые, при возрастании - ничего
+                after = Q(**{f'{field}__isnull': False}) if desc else None
+                same = Q(**{f'{field}__isnull': True})
+            else:
+                after = Q(**{f'{field}__{"lt" if desc else "gt"}': value})
+                if not desc and field not in not_null:
+                    after |= Q(**{f'{field}__isnull': True})
+                same = Q(**{field: value})
+            if after is not None:
+                condition |= equal & after
+            equal &= same
+        return condition
+
+    def get_values(self, item):
+        values = []
+        for field, _ in self.keys:
+            value = item[field] if isinstance(item, dict) else getattr(item, field)
+            values.append(value.isoformat() if isinstance(value, time) else value)
+        return values
+
+    def encode_cursor(self, item, reverse):
+        data = {
+            'o': [f'{"-" if desc else ""}{field}' for field, desc in self.keys],
+            'v': self.get_values(item),
+            'r': reverse,
+        }
+        cursor = base64.urlsafe_b64encode(json.dumps(data, ensure_ascii=False).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """ Значения полей сортировки записи-курсора и направление """
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            ordering = [f'{"-" if desc else ""}{field}' for field, desc in self.keys]
+            if data['o'] != ordering or len(data['v']) != len(self.keys):
+                raise ValueError
+            if not all(value is None or isinstance(value, (str, int, float)) for value in data['v']):
+                raise ValueError
+            return data['v'], bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first, reverse=True)
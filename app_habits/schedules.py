@@ -0,0 +1,125 @@
+import threading
+from contextlib import contextmanager
+
+from celery.signals import worker_init
+from django.db import IntegrityError, connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django_celery_beat.models import IntervalSchedule
+
+
+class ScheduleRegistry:
+    """
+    Периоды (IntervalSchedule) в памяти процесса.
+
+    Полезные привычки используют всего несколько периодов (1-7 дней), поэтому при первом
+    обращении (в веб-процессе - при первом запросе, в celery - при запуске) загружаются сразу
+    все периоды в днях, а дальше берутся из памяти без запросов. Изменение периода в этом процессе
+    сбрасывает реестр сигналом. Период, удаленный другим процессом, обнаруживается по нарушению
+    внешнего ключа при фиксации транзакции (см. atomic), после чего периоды загружаются заново.
+    Отсутствующий период создается. Ограничения уникальности (every, period) у таблицы нет,
+    поэтому при одновременном создании несколькими процессами используется период с наименьшим id.
+    Периоды, загруженные или созданные внутри транзакции, запоминаются после ее фиксации,
+    чтобы не запомнить период из отмененной транзакции
+    """
+
+    def __init__(self):
+        self._schedules = {}
+        self._lock = threading.Lock()
+        # Увеличивается при сбросе, чтобы не запомнить периоды, загруженные до сброса
+        self._generation = 0
+
+    def get(self, every, period=IntervalSchedule.DAYS):
+        """ Период выполнения задачи (every, period) """
+
+        return self.get_many([every], period)[every]
+
+    def get_many(self, everys, period=IntervalSchedule.DAYS):
+        """ Периоды {every: период} для нескольких значений every, не более одного запроса на загрузку """
+
+        schedules = {every: self._schedules.get((every, period)) for every in everys}
+        if None not in schedules.values():
+            return schedules
+
+        loaded = self.load(period)
+        for every in schedules:
+            schedules[every] = loaded.get((every, period)) or self.create(every, period)
+            loaded[(every, period)] = schedules[every]
+        self.remember(loaded)
+        return schedules
+
+    def warm(self, period=IntervalSchedule.DAYS):
+        """ Загрузка всех периодов, например при запуске процесса """
+
+        self.remember(self.load(period))
+
+    def clear(self):
+        with self._lock:
+            self._schedules.clear()
+            self._generation += 1
+
+    @contextmanager
+    def atomic(self):
+        """
+        Транзакция, использующая периоды из памяти процесса.
+        Внешние ключи проверяются при фиксации, поэтому ссылка на период, удаленный другим процессом,
+        приводит к IntegrityError: реестр сбрасывается, и повторный запрос загрузит периоды заново
+        """
+
+        try:
+            with transaction.atomic():
+                yield
+        except IntegrityError:
+            self.clear()
+            raise
+
+    @staticmethod
+    def load(period):
+        """ Все периоды в единицах period одним запросом, для повторяющихся - с наименьшим id """
+
+        schedules = {}
+        for schedule in IntervalSchedule.objects.filter(period=period).order_by('-id'):
+            schedules[(schedule.every, schedule.period)] = schedule
+        return schedules
+
+    @staticmethod
+    def create(every, period):
+        try:
+            with transaction.atomic():
+                IntervalSchedule.objects.create(every=every, period=period)
+        except IntegrityError:
+            # Период уже создан другим процессом (если на таблице есть ограничение уникальности)
+            pass
+        # Все процессы выбирают один и тот же период
+        return IntervalSchedule.objects.filter(every=every, period=period).order_by('id').first()
+
+    def remember(self, schedules):
+        generation = self._generation
+
+        def update():
+            with self._lock:
+                if generation == self._generation:
+                    self._schedules.update(schedules)
+
+        if connection.in_atomic_block:
+            transaction.on_commit(update)
+        else:
+            update()
+
+
+schedule_registry = ScheduleRegistry()
+
+
+@receiver(post_save, sender=IntervalSchedule)
+@receiver(post_delete, sender=IntervalSchedule)
+def clear_schedule_registry(**kwargs):
+    # Период изменен или удален (например, в админке): загружаем периоды заново
+    schedule_registry.clear()
+
+
+@worker_init.connect
+def warm_schedule_registry(**kwargs):
+    # Загрузка в основном процессе celery до запуска дочерних процессов, они получат периоды готовыми.
+    # Соединение с базой данных закрывается, чтобы дочерние процессы его не разделяли
+    schedule_registry.warm()
+    connection.close()
@@ -1,4 +1,9 @@
-from rest_framework import serializers
+from datetime import time
+
+from django.conf import settings
+from django.db import models
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 
 from app_habits.models import Habit
 from validators.general_validators import FillingNotOutTwoFieldsValidator
@@ -7,17 +12,30 @@ from app_habits.validators.habit import (
     RelatedHabitOnlyNiceValidator,
 )
 
+# Служебные поля планирования напоминаний и синхронизации, не отдаются и не принимаются через API
+SERVICE_FIELDS = ('periodic_task', 'next_fire_at', 'updated_at')
+
+
+class SparseFieldsMixin:
+    """ Сериализатор выводит только поля из fields (если переданы), остальные поля удаляются """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
-class HabitSerializer(serializers.ModelSerializer):
+
+class HabitSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Habit
-        fields = "__all__"
+        exclude = SERVICE_FIELDS
 
 
 class HabitNiceCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Habit
-        exclude = ('start_time', 'periodicity', 'related_habit', 'reward')
+        exclude = ('start_time', 'periodicity', 'related_habit', 'reward', *SERVICE_FIELDS)
         read_only_fields = ('owner', 'is_nice')
         validators = [
             # Проверяем что время выполнения не превышает 120 секунд
@@ -31,7 +49,7 @@ class HabitGoodCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Habit
-        fields = "__all__"
+        exclude = SERVICE_FIELDS
         read_only_fields = ('owner', 'is_nice')
         validators = [
             # Проверяем что одновременно не указаны связанная привычка и вознаграждение
@@ -47,7 +65,7 @@ class HabitGoodUpdateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Habit
-        fields = "__all__"
+        exclude = SERVICE_FIELDS
         read_only_fields = ('owner', 'is_nice')
         validators = [
             # Проверяем что одновременно не указаны связанная привычка и вознаграждение
@@ -58,7 +76,8 @@ class HabitGoodUpdateSerializer(serializers.ModelSerializer):
             RelatedHabitOnlyNiceValidator('related_habit'),
         ]
 
-    def update(self, instance, validated_data):
+    @staticmethod
+    def clean_exclusive_fields(instance, validated_data):
         """
         При обновлении обеспечивается наличия значения
         только в одном из полей related_habit или reward.
@@ -68,27 +87,162 @@ class HabitGoodUpdateSerializer(serializers.ModelSerializer):
         if validated_data.get("related_habit") and instance.reward:
             # Сброс поля reward в None если пользователь ввел related_habit
             validated_data['reward'] = None
-        elif validated_data.get("reward") and instance.related_habit:
+        elif validated_data.get("reward") and instance.related_habit_id:
             # Сброс поля related_habit в None если пользователь ввел reward
             validated_data['related_habit'] = None
+        return validated_data
+
+    def update(self, instance, validated_data):
+        validated_data = self.clean_exclusive_fields(instance, validated_data)
         instance = super().update(instance, validated_data)
         return instance
 
 
-class HabitListSerializer(serializers.ModelSerializer):
+def get_related_habits(items):
+    """ Загрузка одним запросом всех связанных привычек, указанных в списке объектов """
+
+    ids = set()
+    for item in items:
+        if isinstance(item, dict) and str(item.get('related_habit', '')).isdigit():
+            ids.add(int(item['related_habit']))
+    return Habit.objects.in_bulk(ids)
+
+
+class RelatedHabitCachedField(serializers.PrimaryKeyRelatedField):
+    """
+    Связанная привычка для пакетных операций.
+    Берется из загруженных заранее одним запросом (context['related_habits'])
+    """
+
+    def to_internal_value(self, data):
+        related_habits = self.context.get('related_habits')
+        if related_habits is None:
+            return super().to_internal_value(data)
+        try:
+            return related_habits[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class HabitBulkListSerializer(serializers.ListSerializer):
+    """ Пакетное создание привычек одним запросом к базе данных """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.context['related_habits'] = get_related_habits(data)
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        return Habit.objects.bulk_create([Habit(**attrs) for attrs in validated_data])
+
+
+class HabitBulkUpdateMixin:
+    """ Присвоение проверенных значений без сохранения. Объекты сохраняются пачкой """
+
+    @staticmethod
+    def clean_exclusive_fields(instance, validated_data):
+        return validated_data
+
+    def assign(self):
+        validated_data = self.clean_exclusive_fields(self.instance, dict(self.validated_data))
+        for attr, value in validated_data.items():
+            setattr(self.instance, attr, value)
+        return self.instance
+
+
+class HabitNiceBulkCreateSerializer(HabitNiceCreateSerializer):
+    class Meta(HabitNiceCreateSerializer.Meta):
+        list_serializer_class = HabitBulkListSerializer
+
+
+class HabitGoodBulkCreateSerializer(HabitGoodCreateSerializer):
+    related_habit = RelatedHabitCachedField(queryset=Habit.objects.all(), allow_null=True, required=False)
+
+    class Meta(HabitGoodCreateSerializer.Meta):
+        list_serializer_class = HabitBulkListSerializer
+
+
+class HabitNiceBulkUpdateSerializer(HabitNiceCreateSerializer, HabitBulkUpdateMixin):
+    pass
+
+
+class HabitGoodBulkUpdateSerializer(HabitGoodUpdateSerializer, HabitBulkUpdateMixin):
+    related_habit = RelatedHabitCachedField(queryset=Habit.objects.all(), allow_null=True, required=False)
+
+
+class HabitAutocompleteSerializer(serializers.ModelSerializer):
+    """ Приятная привычка для выбора связанной привычки: только id и действие """
+
     class Meta:
         model = Habit
-        fields = ('id', 'task', 'start_time', 'location', 'periodicity', 'is_nice')
+        fields = ('id', 'task')
 
 
-class HabitListAllSerializer(serializers.ModelSerializer):
-    owner_email = serializers.SerializerMethodField()
+class HabitIdsSerializer(serializers.Serializer):
+    """ Список идентификаторов привычек """
 
-    @staticmethod
-    def get_owner_email(instance):
-        owner_email = instance.owner.email
-        return owner_email
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.HABITS_BULK_MAX_ITEMS,
+    )
+
+
+def get_time_formatter(field):
+    """ Функция форматирования времени как в TimeField.to_representation с уже выбранным форматом """
+
+    output_format = getattr(field, 'format', api_settings.TIME_FORMAT)
+    if output_format is None:
+        return lambda value: value
+    if output_format.lower() == ISO_8601:
+        return time.isoformat
+    return lambda value: value.strftime(output_format)
+
+
+class HabitValuesListSerializer(serializers.ListSerializer):
+    """
+    Быстрое представление списка привычек, выбранных через values().
+    Объекты модели не создаются, а строки формируются за один проход
+    без вызова to_representation каждого поля. Результат совпадает с представлением полей сериализатора
+    """
+
+    def to_representation(self, data):
+        rows = data.all() if isinstance(data, models.manager.BaseManager) else data
+        rows = list(rows)
+        if rows and not isinstance(rows[0], dict):
+            # Объекты модели представляются полями сериализатора
+            return super().to_representation(rows)
+        return list(self.iter_representation(rows))
+
+    def iter_representation(self, rows):
+        """ Представление строк values() по одной, без накопления списка """
+
+        fields = list(self.child.fields)
+        if 'start_time' in self.child.fields:
+            format_time = get_time_formatter(self.child.fields['start_time'])
+        for row in rows:
+            item = {field: row[field] for field in fields}
+            if item.get('start_time') is not None:
+                item['start_time'] = format_time(item['start_time'])
+            if item.get('periodicity') is not None:
+                item['periodicity'] = str(item['periodicity'])
+            yield item
+
+
+class HabitListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Habit
+        fields = ('id', 'task', 'start_time', 'location', 'periodicity', 'is_nice')
+        list_serializer_class = HabitValuesListSerializer
+
+
+class HabitListAllSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Заполняется в запросе списка аннотацией owner_email (см. HabitQuerySet.with_owner_email)
+    owner_email = serializers.EmailField(read_only=True)
 
     class Meta:
         model = Habit
         fields = ('id', 'task', 'start_time', 'location', 'periodicity', 'is_nice', 'owner_email', )
+        list_serializer_class = HabitValuesListSerializer
@@ -1,116 +1,406 @@
 import json
 from datetime import datetime, date, time, timedelta
 
-import requests
-from django_celery_beat.models import IntervalSchedule, PeriodicTask
+from django.conf import settings
+from django.db.models.deletion import Collector
+from django.utils import timezone
+from django_celery_beat.models import IntervalSchedule, PeriodicTask, PeriodicTasks
 
-from app_habits.models import Habit
-from config import settings
+from app_habits.models import Habit, ScheduleOutbox, log_periodic_task_changes
+from app_habits.schedules import schedule_registry
+from app_habits.telegram import get_transport
 
 
 class TgBot:
-    URL = "https://api.telegram.org/bot"
-    TOKEN = settings.TELEGRAM_BOT_TOKEN
 
     def __init__(self, chat_id):
         self.chat_id = chat_id
 
     def send_message(self, text):
-        requests.post(
-            url=f'{self.URL}{self.TOKEN}/sendMessage',
-            data={
-                'chat_id': self.chat_id,
-                'text': text
-            }
-        )
+        # Транспорт процесса переиспользует соединения и соблюдает лимиты Telegram
+        get_transport().send_message(self.chat_id, text)
 
 
 def get_schedule(habit: Habit):
-    """ Получение периода выполнения задачи """
+    """ Получение периода выполнения задачи (из памяти процесса, см. ScheduleRegistry) """
+
+    return schedule_registry.get(
+        int(habit.periodicity),
+        # IntervalSchedule.MINUTES,  Для проверки работоспособности
+        IntervalSchedule.DAYS,
+    )
+
+
+def get_schedules(habits):
+    """ Получение периодов выполнения задач {периодичность: период} для списка привычек """
+
+    return schedule_registry.get_many({int(habit.periodicity) for habit in habits}, IntervalSchedule.DAYS)
+
+
+# Напоминание отправляется за 5 минут до начала действия
+REMINDER_LEAD_TIME = timedelta(minutes=5)
+
+
+def is_dispatcher_backend():
+    """ Проверка, что напоминания планируются диспетчером, а не отдельными PeriodicTask """
+
+    return settings.HABITS_REMINDER_BACKEND == 'dispatcher'
+
+
+def is_outbox_enabled():
+    """ Проверка, что периодические задачи изменяются задачей relay_schedule_outbox, а не в запросе """
+
+    return settings.HABITS_SCHEDULE_OUTBOX and not is_dispatcher_backend()
+
+
+def record_schedule_changes(habits):
+    """
+    Запись изменений напоминаний привычек в ScheduleOutbox.
+    Вызывается в транзакции изменения привычек, поэтому запись фиксируется только вместе с ними
+    """
+
+    ScheduleOutbox.objects.bulk_create(
+        [ScheduleOutbox(habit_id=habit.id, periodic_task_id=habit.periodic_task_id) for habit in habits]
+    )
+
+
+def get_task_kwargs(habit: Habit):
+    """ Формирование именованных аргументов задачи отправки напоминания """
+
+    return {
+        'telegram_id': habit.owner.telegram_id,
+        'start_time': time.strftime(habit.start_time, '%H:%M'),
+        'task': habit.task,
+        'location': habit.location,
+        'time_to_complete': habit.time_to_complete,
+        'reward': habit.reward,
+        'related_habit': {
+            'task': habit.related_habit.task,
+            'location': habit.related_habit.location,
+            'time_to_complete': habit.related_habit.time_to_complete,
+        } if habit.related_habit else None,
+    }
+
+
+def get_task_name(habit: Habit):
+    """ Название периодической задачи (уникально и не длиннее 200 символов) """
+
+    return f'{habit.id}: {habit.task}'[:200]
+
+
+def get_periodic_task_fields(habit: Habit, schedule):
+    """ Значения полей периодической задачи привычки """
 
-    schedule, created = IntervalSchedule.objects.get_or_create(
-        every=int(habit.periodicity),
-        # period=IntervalSchedule.MINUTES,  Для проверки работоспособности
-        period=IntervalSchedule.DAYS,
+    return {
+        'name': get_task_name(habit),
+        'interval': schedule,
+        'kwargs': json.dumps(get_task_kwargs(habit), ensure_ascii=False),
+        # Отправляем напоминание за 5 минут до начала действия
+        'start_time': datetime.combine(date.today(), habit.start_time) - REMINDER_LEAD_TIME,
+    }
+
+
+def get_next_fire_at(habit: Habit, now=None):
+    """
+    Получение времени ближайшего напоминания о полезной привычке.
+    Если сегодняшнее напоминание уже прошло, первое напоминание будет завтра
+    """
+
+    now = now or timezone.now()
+    fire_at = timezone.make_aware(
+        datetime.combine(timezone.localdate(now), habit.start_time) - REMINDER_LEAD_TIME
     )
-    return schedule
+    if fire_at <= now:
+        fire_at = timezone.make_aware(timezone.make_naive(fire_at) + timedelta(days=1))
+    return fire_at
+
+
+def get_following_fire_at(fire_at, periodicity, now=None):
+    """
+    Получение времени напоминания, следующего за fire_at с учетом периодичности.
+    Пропущенные напоминания (например, при простое диспетчера) не повторяются
+    """
+
+    now = now or timezone.now()
+    step = timedelta(days=int(periodicity))
+    local_fire_at = timezone.make_naive(fire_at) + step
+    local_now = timezone.make_naive(now)
+    if local_fire_at <= local_now:
+        local_fire_at += step * ((local_now - local_fire_at) // step + 1)
+    return timezone.make_aware(local_fire_at)
+
+
+def get_smoothing_offset(habit_id, window=None):
+    """
+    Сдвиг отправки напоминания раньше назначенного времени при сглаживании нагрузки.
+    Сдвиг постоянен для привычки и равномерно распределен по окну HABITS_REMINDER_SMOOTHING_WINDOW
+    (фибоначчиево хэширование id: доли окна соседних id расходятся по золотому сечению),
+    поэтому напоминания одной минуты расходятся по окну
+    """
+
+    seconds = int((settings.HABITS_REMINDER_SMOOTHING_WINDOW if window is None else window).total_seconds())
+    if seconds <= 0:
+        return timedelta(0)
+    return timedelta(seconds=(habit_id * 0x9E3779B1 & 0xFFFFFFFF) * seconds >> 32)
+
+
+def get_dispatch_at(habit: Habit):
+    """ Время отправки напоминания с учетом сглаживания нагрузки, не позже назначенного времени """
+
+    return habit.next_fire_at - get_smoothing_offset(habit.id)
+
+
+def get_rescheduled_fire_at(habit: Habit):
+    """
+    Время ближайшего напоминания после изменения привычки.
+    Если время напоминания не изменилось, а ближайшее уже поставлено в очередь заранее
+    (next_fire_at привычки - следующее за ним), повторно оно не планируется:
+    поставленное напоминание перечитает привычку при отправке
+    """
+
+    fire_at = get_next_fire_at(habit)
+    if habit.next_fire_at and habit.next_fire_at == get_following_fire_at(fire_at, habit.periodicity):
+        return habit.next_fire_at
+    return fire_at
+
+
+def get_preenqueued_task_kwargs(habit_id, fire_at):
+    """
+    Именованные аргументы отправки напоминания, заранее поставленного в очередь на время fire_at,
+    по текущему состоянию привычки. None, если привычка удалена, напоминание ей больше не нужно
+    или перепланировано после изменения привычки (диспетчер поставит его в очередь заново)
+    """
+
+    habit = Habit.objects.select_related('owner', 'related_habit').filter(pk=habit_id).first()
+    if habit is None or habit.is_nice or not habit.start_time or not habit.next_fire_at:
+        return None
+    if habit.next_fire_at <= fire_at or (timezone.localtime(fire_at) + REMINDER_LEAD_TIME).time() != habit.start_time:
+        return None
+    return get_task_kwargs(habit)
+
+
+def schedule_reminder(habit: Habit):
+    """ Планирование напоминания диспетчером """
+
+    habit.next_fire_at = get_rescheduled_fire_at(habit) if habit.start_time else None
+    Habit.objects.filter(pk=habit.pk).update(next_fire_at=habit.next_fire_at)
 
 
 def add_task(habit: Habit):
     """ Создание периодической задачи для напоминания о полезной привычке """
 
+    if is_dispatcher_backend():
+        schedule_reminder(habit)
+        return
+
+    if is_outbox_enabled():
+        record_schedule_changes([habit])
+        return
+
     # Создание или получение имеющегося периода
     schedule = get_schedule(habit)
 
-    # Создание задачи
-    PeriodicTask.objects.create(
-        name=f'{habit.id}: {habit.task}',
+    # Создание задачи. Отметка изменения расписания обновляется mark_tasks_changed, а не сигналом
+    habit.periodic_task = PeriodicTask(
         task='app_habits.tasks.send_message_tg',
-        interval=schedule,
-        kwargs=json.dumps(
-            {
-                'telegram_id': habit.owner.telegram_id,
-                'start_time': time.strftime(habit.start_time, '%H:%M'),
-                'task': habit.task,
-                'location': habit.location,
-                'time_to_complete': habit.time_to_complete,
-                'reward': habit.reward,
-                'related_habit': {
-                    'task': habit.related_habit.task,
-                    'location': habit.related_habit.location,
-                    'time_to_complete': habit.related_habit.time_to_complete,
-                } if habit.related_habit else None,
-            }, ensure_ascii=False
-        ),
-        # Отправляем напоминание за 5 минут до начала действия
-        start_time=datetime.combine(date.today(), habit.start_time) - timedelta(minutes=5),
+        **get_periodic_task_fields(habit, schedule)
     )
+    habit.periodic_task.no_changes = True
+    habit.periodic_task.save()
+    habit.save(update_fields=['periodic_task'])
+    mark_tasks_changed([habit.periodic_task.id])
 
 
 def update_task(habit: Habit):
     """ Обновление периодической задачи """
 
-    # Ищем периодическую задачу и если она существует, изменяем ее
-    if task_qs := PeriodicTask.objects.filter(name=f'{habit.id}: {habit.task}'):
-        task = task_qs[0]
+    if is_dispatcher_backend():
+        # Текст напоминания формируется при постановке в очередь, а заранее поставленные
+        # напоминания перечитывают привычку при отправке, поэтому пересчитываем только время
+        if habit.start_time:
+            schedule_reminder(habit)
+        return
+
+    if is_outbox_enabled():
+        record_schedule_changes([habit])
+        return
+
+    # Если у привычки есть периодическая задача, изменяем ее
+    if task := habit.periodic_task:
         # Создание или получение имеющегося периода
         schedule = get_schedule(habit)
 
         # Изменение задачи
-        task.name = f'{habit.id}: {habit.task}'
-        task.interval = schedule
-        task.kwargs = json.dumps(
-            {
-                'telegram_id': habit.owner.telegram_id,
-                'start_time': time.strftime(habit.start_time, '%H:%M'),
-                'task': habit.task,
-                'location': habit.location,
-                'time_to_complete': habit.time_to_complete,
-                'reward': habit.reward,
-                'related_habit': {
-                    'task': habit.related_habit.task,
-                    'location': habit.related_habit.location,
-                    'time_to_complete': habit.related_habit.time_to_complete,
-                } if habit.related_habit else None,
-            }, ensure_ascii=False
-        )
-        task.start_time = datetime.combine(date.today(), habit.start_time) - timedelta(minutes=5)
+        for field, value in get_periodic_task_fields(habit, schedule).items():
+            setattr(task, field, value)
+        task.no_changes = True
         task.save()
+        mark_tasks_changed([task.id])
 
 
 def delete_task(habit: Habit):
-    """ Обновление периодической задачи """
+    """ Удаление периодической задачи """
 
-    # Ищем периодическую задачу и если она существует, удалим ее
-    if task_qs := PeriodicTask.objects.filter(name=f'{habit.id}: {habit.task}'):
-        task = task_qs[0]
-        task.delete()
+    # Напоминание диспетчера удаляется вместе с привычкой
+    if is_dispatcher_backend():
+        return
 
+    # Если у привычки есть периодическая задача, удалим ее
+    delete_tasks([habit])
 
-def send_message_to_telegram(**kwargs):
-    """ Отправка сообщения """
 
-    chat_id = kwargs.get('telegram_id')
+def get_rescheduled_habits(habits):
+    """
+    Получение полезных привычек, напоминания которых нужно обновить
+    после сохранения habits (используется список измененных полей saved_changes)
+    """
+
+    rescheduled = [habit for habit in habits if not habit.is_nice and habit.schedule_changed]
+    # Приятная привычка входит в текст напоминаний связанных с ней полезных привычек
+    nice_ids = [
+        habit.id for habit in habits
+        if habit.is_nice and getattr(habit, 'saved_changes', set()) & Habit.RELATED_SCHEDULE_FIELDS
+    ]
+    if nice_ids:
+        rescheduled += list(
+            Habit.objects
+            .filter(related_habit__in=nice_ids)
+            .exclude(id__in=[habit.id for habit in rescheduled])
+            .select_related('owner', 'related_habit', 'periodic_task')
+        )
+    return rescheduled
+
+
+def add_tasks(habits):
+    """
+    Создание напоминаний для списка привычек пачкой.
+    Периоды загружаются не более чем одним запросом на всю пачку
+    """
+
+    habits = [habit for habit in habits if not habit.is_nice and habit.start_time]
+    if not habits:
+        return
+
+    if is_dispatcher_backend():
+        for habit in habits:
+            habit.next_fire_at = get_rescheduled_fire_at(habit)
+        Habit.objects.bulk_update(habits, ['next_fire_at'])
+        return
+
+    if is_outbox_enabled():
+        record_schedule_changes(habits)
+        return
+
+    create_periodic_tasks(habits)
+
+
+def create_periodic_tasks(habits):
+    """ Создание периодических задач для списка полезных привычек пачкой """
+
+    schedules = get_schedules(habits)
+    tasks = [
+        PeriodicTask(
+            task='app_habits.tasks.send_message_tg',
+            **get_periodic_task_fields(habit, schedules[int(habit.periodicity)])
+        )
+        for habit in habits
+    ]
+
+    for habit, task in zip(habits, PeriodicTask.objects.bulk_create(tasks)):
+        habit.periodic_task = task
+    Habit.objects.bulk_update(habits, ['periodic_task'])
+    # bulk_create не обновляет отметку изменения расписания celery beat
+    mark_tasks_changed([task.id for task in tasks])
+
+
+def update_tasks(habits):
+    """ Обновление напоминаний для списка привычек пачкой """
+
+    habits = [habit for habit in habits if not habit.is_nice and habit.start_time]
+    if not habits:
+        return
+
+    if is_dispatcher_backend():
+        for habit in habits:
+            habit.next_fire_at = get_rescheduled_fire_at(habit)
+        Habit.objects.bulk_update(habits, ['next_fire_at'])
+        return
+
+    if is_outbox_enabled():
+        record_schedule_changes(habits)
+        return
+
+    update_periodic_tasks(habits)
+
+
+def update_periodic_tasks(habits):
+    """ Обновление имеющихся периодических задач для списка полезных привычек пачкой """
+
+    tasks = PeriodicTask.objects.in_bulk([habit.periodic_task_id for habit in habits if habit.periodic_task_id])
+    if not tasks:
+        return
+
+    schedules = get_schedules(habits)
+    for habit in habits:
+        if task := tasks.get(habit.periodic_task_id):
+            for field, value in get_periodic_task_fields(habit, schedules[int(habit.periodicity)]).items():
+                setattr(task, field, value)
+
+    PeriodicTask.objects.bulk_update(tasks.values(), ['name', 'interval', 'kwargs', 'start_time'])
+    mark_tasks_changed(list(tasks))
+
+
+def delete_tasks(habits):
+    """ Удаление напоминаний для списка привычек пачкой """
+
+    if is_dispatcher_backend():
+        return
+
+    if is_outbox_enabled():
+        # Задачу привычки могла только что создать relay_schedule_outbox,
+        # поэтому id задач перечитываются с блокировкой привычек
+        record_schedule_changes(
+            Habit.objects.select_for_update().filter(pk__in=[habit.pk for habit in habits]).only('periodic_task')
+        )
+        return
+
+    delete_periodic_tasks([habit.periodic_task_id for habit in habits if habit.periodic_task_id])
+
+
+def delete_periodic_tasks(task_ids):
+    """ Удаление периодических задач по списку id """
+
+    if task_ids:
+        # Сигналы удаления обновляют отметку изменения расписания celery beat на каждую задачу отдельно.
+        # Для задач с no_changes они ничего не делают, а изменение отмечается один раз на всю пачку
+        tasks = list(PeriodicTask.objects.filter(pk__in=task_ids))
+        for task in tasks:
+            task.no_changes = True
+        # Тот же порядок удаления, что и у Model.delete(), но одним запросом на всю пачку
+        collector = Collector(using=PeriodicTask.objects.db)
+        collector.collect(tasks)
+        collector.delete()
+        mark_tasks_changed(task_ids)
+
+
+def mark_tasks_changed(task_ids):
+    """
+    Отметка изменения периодических задач привычек для celery beat
+    (сигналы PeriodicTask, обновляющие отметку, для задач привычек не вызываются).
+    С журналом изменений (HABITS_BEAT_CHANGE_LOG) изменения только записываются в журнал:
+    HabitScheduler перечитает эти задачи, а по отметке PeriodicTasks он загружает все задачи.
+    Без журнала обновляется отметка, по которой DatabaseScheduler загружает все задачи
+    """
+
+    if settings.HABITS_BEAT_CHANGE_LOG:
+        log_periodic_task_changes(task_ids)
+    else:
+        PeriodicTasks.update_changed()
+
+
+def render_message(**kwargs):
+    """ Формирование текста напоминания """
+
     start_time = kwargs.get("start_time")
     task = kwargs.get("task")
     location = kwargs.get("location")
@@ -129,9 +419,17 @@ def send_message_to_telegram(**kwargs):
     related_habit = (f'\nПосле этого я {related_habit.get("task")}'
                      f' {related_habit.get("location")} '
                      f'в течении {related_habit.get("time_to_complete")} секунд.') if related_habit else ''
+    return text + reward + related_habit
+
+
+def send_message_to_telegram(**kwargs):
+    """ Отправка сообщения """
+
+    chat_id = kwargs.get('telegram_id')
+    message = render_message(**kwargs)
+
     # Отправка сообщения
     tg_bot = TgBot(chat_id)
-    message = text + reward + related_habit
     tg_bot.send_message(message)
 
     # Для тестирования добавляем возврат сформированного сообщения
@@ -0,0 +1,63 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+
+def encode_cursor(updated_at, habit_id=0):
+    """ Курсор синхронизации: время изменения и id последней полученной привычки """
+
+    data = {'t': updated_at.isoformat(), 'id': habit_id}
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """ Время изменения и id привычки из курсора, ValueError если курсор неверный """
+
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        updated_at, habit_id = datetime.fromisoformat(data['t']), int(data['id'])
+    except (TypeError, ValueError, KeyError):
+        raise ValueError('Неверный курсор')
+    if timezone.is_naive(updated_at):
+        raise ValueError('Неверный курсор')
+    return updated_at, habit_id
+
+
+def get_changes(habits, deleted, cursor=None, limit=None):
+    """
+    Изменения привычек после курсора.
+    habits - доступные привычки, deleted - отметки об удалении доступных привычек.
+    Привычки выбираются по индексу (updated_at, id) не более limit за раз.
+    Возвращает (измененные привычки, id удаленных привычек, новый курсор, есть ли еще изменения)
+    """
+
+    limit = limit or settings.HABITS_SYNC_PAGE_SIZE
+    # Время начала выборки берется до запроса, изменения после него попадут в следующую синхронизацию
+    started = timezone.now()
+
+    if cursor is None:
+        # Первая синхронизация: все привычки, об удалениях клиенту знать не нужно
+        deleted_ids = []
+    else:
+        updated_at, habit_id = decode_cursor(cursor)
+        if updated_at < started - settings.HABITS_SYNC_HORIZON:
+            # Отметки об удалении за это время могли быть уже удалены
+            raise ValueError('Курсор устарел, синхронизируйте привычки заново без курсора')
+        habits = habits.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=habit_id))
+        deleted_ids = list(deleted.filter(deleted_at__gt=updated_at).values_list('habit_id', flat=True))
+
+    changed = list(habits.order_by('updated_at', 'id')[:limit + 1])
+    has_more = len(changed) > limit
+    if has_more:
+        changed = changed[:limit]
+        next_cursor = encode_cursor(changed[-1].updated_at, changed[-1].id)
+    else:
+        # Время изменения назначается при сохранении, а видна запись после фиксации транзакции.
+        # Курсор сдвигается назад на HABITS_SYNC_OVERLAP, чтобы не пропустить такие записи,
+        # повторно полученные привычки клиент просто перезаписывает
+        next_cursor = encode_cursor(started - settings.HABITS_SYNC_OVERLAP)
+    return changed, deleted_ids, next_cursor, has_more
@@ -1,6 +1,24 @@
-from celery import shared_task
+from datetime import datetime
 
-from app_habits.services import send_message_to_telegram
+from celery import shared_task, current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from app_habits.delivery import is_async_delivery, push_reminders, render_reminder
+from app_habits.lateness import record_lateness
+from app_habits.models import DeletedHabit, Habit, ScheduleOutbox
+from app_habits.schedules import schedule_registry
+from app_habits.services import (
+    send_message_to_telegram,
+    get_task_kwargs,
+    get_preenqueued_task_kwargs,
+    get_following_fire_at,
+    get_dispatch_at,
+    create_periodic_tasks,
+    update_periodic_tasks,
+    delete_periodic_tasks,
+)
 
 
 @shared_task
@@ -8,6 +26,155 @@ def print_task():
     pass
 
 
+@shared_task(bind=True)
+def send_message_tg(self, habit_id=None, fire_at=None, **kwargs):
+    if habit_id is not None:
+        # Напоминание поставлено в очередь заранее: привычку могли изменить или удалить
+        kwargs = get_preenqueued_task_kwargs(habit_id, datetime.fromisoformat(fire_at))
+        if kwargs is None:
+            return
+
+    if self.request.eta:
+        # Напоминание поставлено в очередь заранее, учитываем опоздание начала обработки
+        # относительно назначенного времени (без времени самой отправки)
+        record_lateness((timezone.now() - datetime.fromisoformat(self.request.eta)).total_seconds())
+
+    if is_async_delivery():
+        # Отправкой займется сервис доставки
+        push_reminders([render_reminder(**kwargs)])
+    else:
+        send_message_to_telegram(**kwargs)
+
+
 @shared_task
-def send_message_tg(**kwargs):
-    send_message_to_telegram(**kwargs)
+def dispatch_reminders():
+    """
+    Постановка в очередь наступивших напоминаний о полезных привычках
+
+    Запускается celery beat раз в минуту. Привычки выбираются по индексу next_fire_at
+    пачками, после постановки в очередь время следующего напоминания
+    сдвигается на период привычки.
+    При заданном окне HABITS_REMINDER_PREENQUEUE_WINDOW напоминания ставятся в очередь заранее,
+    задачами с ETA на время напоминания; текст таких напоминаний формируется при отправке.
+    При сглаживании нагрузки (HABITS_REMINDER_SMOOTHING_WINDOW) время отправки сдвигается
+    раньше назначенного в пределах окна сглаживания
+    """
+
+    now = timezone.now()
+    # Напоминания с ETA выбираются с запасом на окно сглаживания и до следующего запуска диспетчера,
+    # иначе сдвинутое сглаживанием время отправки может пройти раньше, чем напоминание будет выбрано
+    window = settings.HABITS_REMINDER_PREENQUEUE_WINDOW + settings.HABITS_REMINDER_SMOOTHING_WINDOW
+    if window:
+        window += settings.HABITS_REMINDER_DISPATCH_INTERVAL
+    batch_size = settings.HABITS_REMINDER_BATCH_SIZE
+    dispatched = 0
+
+    while True:
+        with transaction.atomic():
+            # Заблокированные другим диспетчером строки пропускаем
+            habits = list(
+                Habit.objects
+                .select_related('owner', 'related_habit')
+                .select_for_update(skip_locked=True, of=('self', ))
+                .filter(next_fire_at__lte=now + window)
+                .order_by('next_fire_at')[:batch_size]
+            )
+            if not habits:
+                break
+
+            # Напоминания формируются до сдвига времени следующего напоминания
+            if window:
+                messages = [
+                    ({'habit_id': habit.id, 'fire_at': habit.next_fire_at.isoformat()}, get_dispatch_at(habit))
+                    for habit in habits
+                ]
+            else:
+                messages = [(get_task_kwargs(habit), None) for habit in habits]
+
+            for habit in habits:
+                habit.next_fire_at = get_following_fire_at(habit.next_fire_at, habit.periodicity, now)
+
+            Habit.objects.bulk_update(habits, ['next_fire_at'], batch_size=batch_size)
+
+        # Пачка ставится в очередь после фиксации нового next_fire_at: заранее поставленное напоминание
+        # с наступившим ETA иначе могло бы выполниться раньше и не увидеть сдвиг (см. get_preenqueued_task_kwargs)
+        publish_reminders(messages)
+        dispatched += len(habits)
+        if len(habits) < batch_size:
+            break
+
+    return dispatched
+
+
+def publish_reminders(messages):
+    """ Постановка в очередь напоминаний [(именованные аргументы send_message_tg, ETA или None)] """
+
+    if is_async_delivery() and all(eta is None for _, eta in messages):
+        # Вся пачка уходит в очередь сервиса доставки одной командой
+        push_reminders([render_reminder(**kwargs) for kwargs, _ in messages])
+        return
+
+    # Одно подключение к брокеру на всю пачку
+    with current_app.producer_or_acquire() as producer:
+        for kwargs, eta in messages:
+            send_message_tg.apply_async(kwargs=kwargs, producer=producer, eta=eta)
+
+
+@shared_task
+def relay_schedule_outbox():
+    """
+    Применение изменений напоминаний, записанных вместе с изменениями привычек (ScheduleOutbox)
+
+    Запускается celery beat каждые HABITS_SCHEDULE_OUTBOX_INTERVAL секунд. Записи выбираются пачками,
+    периодические задачи пачки создаются, изменяются и удаляются несколькими запросами.
+    Задача привычки приводится к текущему состоянию привычки, поэтому повторная обработка записи
+    (например, после сбоя до удаления записей) ничего не портит
+    """
+
+    batch_size = settings.HABITS_SCHEDULE_OUTBOX_BATCH_SIZE
+    relayed = 0
+
+    while True:
+        with schedule_registry.atomic():
+            # Заблокированные другим обработчиком записи пропускаем
+            records = list(ScheduleOutbox.objects.select_for_update(skip_locked=True)[:batch_size])
+            if not records:
+                break
+
+            # Блокировка привычек не дает двум обработчикам создать задачу одной привычки дважды
+            habits = (
+                Habit.objects
+                .select_related('owner', 'related_habit')
+                .select_for_update(of=('self', ))
+                .in_bulk({record.habit_id for record in records})
+            )
+            reminded = [habit for habit in habits.values() if not habit.is_nice and habit.start_time]
+
+            # Задачи удаленных привычек и привычек, которым напоминание больше не нужно
+            task_ids = {record.periodic_task_id for record in records if record.habit_id not in habits}
+            task_ids |= {habit.periodic_task_id for habit in habits.values() if habit.is_nice or not habit.start_time}
+            task_ids.discard(None)
+
+            delete_periodic_tasks(list(task_ids))
+            update_periodic_tasks([habit for habit in reminded if habit.periodic_task_id])
+            if new_habits := [habit for habit in reminded if not habit.periodic_task_id]:
+                create_periodic_tasks(new_habits)
+
+            ScheduleOutbox.objects.filter(id__in=[record.id for record in records]).delete()
+
+        relayed += len(records)
+        if len(records) < batch_size:
+            break
+
+    return relayed
+
+
+@shared_task
+def prune_deleted_habits():
+    """
+    Удаление отметок об удалении привычек старше HABITS_SYNC_HORIZON.
+    Курсоры синхронизации старше этого срока не принимаются, поэтому такие отметки больше не нужны
+    """
+
+    deleted, _ = DeletedHabit.objects.filter(deleted_at__lt=timezone.now() - settings.HABITS_SYNC_HORIZON).delete()
+    return deleted
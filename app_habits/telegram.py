@@ -0,0 +1,196 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты "корзина токенов"
+
+    Токены пополняются со скоростью rate в секунду, но не более capacity.
+    Потокобезопасен
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self):
+        """ Резервирование токена. Возвращает время ожидания до его появления (секунд) """
+
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        """ Получение токена с ожиданием """
+
+        if delay := self.reserve():
+            time.sleep(delay)
+
+
+class RedisTokenBucket(TokenBucket):
+    """
+    Корзина токенов в Redis, общая для всех процессов (воркеров celery).
+
+    Хранится только время, к которому будут израсходованы зарезервированные токены (алгоритм GCRA),
+    резервирование выполняется одним Lua-скриптом по часам сервера Redis.
+    Если Redis недоступен, используется корзина процесса
+    """
+
+    SCRIPT = """
+        local now = redis.call('TIME')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local interval = tonumber(ARGV[1])
+        local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now) + interval
+        redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000) + 1000)
+        return tostring(math.max(tat - now - tonumber(ARGV[2]) * interval, 0))
+    """
+
+    def __init__(self, client, key, rate, capacity=None):
+        super().__init__(rate, capacity)
+        self.key = key
+        self.script = client.register_script(self.SCRIPT)
+
+    def reserve(self):
+        try:
+            return float(self.script(keys=[self.key], args=[1 / self.rate, self.capacity]))
+        except redis.RedisError as exc:
+            logger.warning('Redis rate limit unavailable, using process limit: %r', exc)
+            return super().reserve()
+
+
+class TelegramTransport:
+    """
+    Транспорт для Telegram Bot API
+
+    - переиспользует keep-alive соединения (requests.Session с пулом)
+    - соблюдает общий лимит отправки и лимит на один чат (token bucket)
+    - ограничивает время подключения и ожидания ответа
+    - повторяет запрос при ошибках подключения и ответе 429. Ответы 5xx и ошибки чтения ответа
+      не повторяются: сообщение могло быть уже отправлено, повтор его продублирует
+
+    Общий лимит при заданном redis_url действует для всех процессов (RedisTokenBucket),
+    иначе - в пределах процесса. Лимит на один чат действует в пределах процесса
+    """
+
+    def __init__(self, base_url, token, rate_limit=30, chat_rate_limit=1,
+                 timeout=(3.05, 10), retries=3, pool_size=10, max_chats=10000, redis_url=None):
+        self.url = f'{base_url}{token}'
+        self.timeout = timeout
+        self.retries = retries
+        if redis_url:
+            self.global_bucket = RedisTokenBucket(redis.Redis.from_url(redis_url), 'telegram:rate', rate_limit)
+        else:
+            self.global_bucket = TokenBucket(rate_limit)
+        self.chat_rate_limit = chat_rate_limit
+        self.max_chats = max_chats
+        self.chat_buckets = OrderedDict()
+        self.chat_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            # Повторяются только запросы, не дошедшие до Telegram. Ответ 429 повторяется в send_message
+            max_retries=Retry(
+                total=retries,
+                connect=retries,
+                read=0,
+                status=0,
+                other=0,
+                backoff_factor=0.3,
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_chat_bucket(self, chat_id):
+        """ Получение ограничителя для чата. Хранятся только последние max_chats чатов """
+
+        with self.chat_lock:
+            bucket = self.chat_buckets.pop(chat_id, None) or TokenBucket(self.chat_rate_limit)
+            self.chat_buckets[chat_id] = bucket
+            if len(self.chat_buckets) > self.max_chats:
+                self.chat_buckets.popitem(last=False)
+            return bucket
+
+    @staticmethod
+    def get_retry_after(response):
+        """ Время ожидания перед повтором (секунд), которое Telegram сообщает в ответе 429 """
+
+        try:
+            return float(response.json()['parameters']['retry_after'])
+        except (ValueError, TypeError, KeyError):
+            # Ответ не от Bot API (например, страница прокси): ждем по заголовку Retry-After либо секунду
+            try:
+                return float(response.headers.get('Retry-After', 1))
+            except ValueError:
+                return 1
+
+    def send_message(self, chat_id, text):
+        """ Отправка сообщения в чат с соблюдением лимитов """
+
+        chat_bucket = self.get_chat_bucket(chat_id)
+        for attempt in range(self.retries + 1):
+            chat_bucket.acquire()
+            self.global_bucket.acquire()
+            response = self.session.post(
+                url=f'{self.url}/sendMessage',
+                data={
+                    'chat_id': chat_id,
+                    'text': text
+                },
+                timeout=self.timeout,
+            )
+            if response.status_code != 429 or attempt == self.retries:
+                break
+            time.sleep(min(self.get_retry_after(response), self.timeout[1]))
+
+        if not response.ok:
+            logger.warning('Telegram sendMessage failed: %s %s', response.status_code, response.text)
+        return response
+
+
+_transport = None
+_transport_pid = None
+
+
+def get_transport():
+    """
+    Получение транспорта текущего процесса.
+    После fork (prefork воркеры celery) создается новый, чтобы не делить сокеты
+    """
+
+    global _transport, _transport_pid
+
+    if _transport is None or _transport_pid != os.getpid():
+        _transport = TelegramTransport(
+            base_url=settings.TELEGRAM_API_URL,
+            token=settings.TELEGRAM_BOT_TOKEN,
+            rate_limit=settings.TELEGRAM_RATE_LIMIT,
+            chat_rate_limit=settings.TELEGRAM_CHAT_RATE_LIMIT,
+            timeout=settings.TELEGRAM_TIMEOUT,
+            redis_url=settings.TELEGRAM_RATE_LIMIT_REDIS_URL,
+        )
+        _transport_pid = os.getpid()
+    return _transport
@@ -5,10 +5,19 @@ from app_habits.views.habit import (
     HabitNiceCreateAPIView,
     HabitGoodCreateAPIView,
     HabitListAPIView,
+    HabitExportAPIView,
+    HabitSyncAPIView,
     HabitPublicListAPIView,
     HabitUpdateAPIView,
     HabitDestroyAPIView,
     HabitRetrieveAPIView,
+    HabitBatchRetrieveAPIView,
+    HabitAutocompleteAPIView,
+    HabitNiceBulkCreateAPIView,
+    HabitGoodBulkCreateAPIView,
+    HabitBulkUpdateAPIView,
+    HabitImportAPIView,
+    HabitBulkDestroyAPIView,
 )
 
 app_name = AppHabitsConfig.name
@@ -17,8 +26,17 @@ urlpatterns = [
     path('habit/create/nice/', HabitNiceCreateAPIView.as_view(), name="habit_nice_create"),
     path('habit/create/good/', HabitGoodCreateAPIView.as_view(), name="habit_good_create"),
     path('habit/list/', HabitListAPIView.as_view(), name="habit_list"),
+    path('habit/export/', HabitExportAPIView.as_view(), name="habit_export"),
+    path('habit/sync/', HabitSyncAPIView.as_view(), name="habit_sync"),
     path('habit/public_list/', HabitPublicListAPIView.as_view(), name="habit_public_list"),
+    path('habit/autocomplete/', HabitAutocompleteAPIView.as_view(), name="habit_autocomplete"),
+    path('habit/batch/', HabitBatchRetrieveAPIView.as_view(), name="habit_batch"),
     path('habit/<int:pk>/', HabitRetrieveAPIView.as_view(), name="habit_retrieve"),
     path('habit/<int:pk>/update/', HabitUpdateAPIView.as_view(), name="habit_update"),
-    path('habit/<int:pk>/destroy/', HabitDestroyAPIView.as_view(), name="habit_destroy")
+    path('habit/<int:pk>/destroy/', HabitDestroyAPIView.as_view(), name="habit_destroy"),
+    path('habit/bulk/create/nice/', HabitNiceBulkCreateAPIView.as_view(), name="habit_bulk_nice_create"),
+    path('habit/bulk/create/good/', HabitGoodBulkCreateAPIView.as_view(), name="habit_bulk_good_create"),
+    path('habit/import/', HabitImportAPIView.as_view(), name="habit_import"),
+    path('habit/bulk/update/', HabitBulkUpdateAPIView.as_view(), name="habit_bulk_update"),
+    path('habit/bulk/destroy/', HabitBulkDestroyAPIView.as_view(), name="habit_bulk_destroy"),
 ]
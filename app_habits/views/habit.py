@@ -1,26 +1,66 @@
-from django.db.models import QuerySet
+import csv
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Upper
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import OrderingFilter
 from rest_framework.generics import (
     CreateAPIView,
     ListAPIView,
     UpdateAPIView,
     DestroyAPIView,
-    RetrieveAPIView
+    RetrieveAPIView,
+    GenericAPIView,
 )
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
-
-from app_habits.models import Habit
-from app_habits.paginators.habit import HabitPaginator
+from rest_framework.response import Response
+
+from app_habits.cache import (
+    get_public_page,
+    get_public_version,
+    get_request_digest,
+    bump_public_version_on_commit,
+    make_etag,
+    etag_response,
+    page_etag_response,
+)
+from app_habits.filters.habit import HabitSearchFilter
+from app_habits.importer import import_habits
+from app_habits.models import DeletedHabit, Habit
+from app_habits.paginators.habit import HabitCursorPaginator
+from app_habits.schedules import schedule_registry
 from app_habits.serializers.habit import (
     HabitGoodCreateSerializer,
     HabitNiceCreateSerializer,
     HabitListSerializer,
     HabitListAllSerializer,
     HabitSerializer, HabitGoodUpdateSerializer,
+    HabitNiceBulkCreateSerializer,
+    HabitGoodBulkCreateSerializer,
+    HabitNiceBulkUpdateSerializer,
+    HabitGoodBulkUpdateSerializer,
+    HabitIdsSerializer,
+    HabitAutocompleteSerializer,
+    get_related_habits,
 )
-from app_habits.services import add_task, update_task, delete_task
-from app_users.permissions import IsModerator, IsOwner, IsPublic
+from app_habits.services import (
+    add_task,
+    update_task,
+    delete_task,
+    get_rescheduled_habits,
+    add_tasks,
+    update_tasks,
+    delete_tasks,
+)
+from app_habits.sync import get_changes
+from app_users.permissions import IsModerator
 
 
 class HabitNiceCreateAPIView(CreateAPIView):
@@ -54,44 +94,100 @@ class HabitGoodCreateAPIView(CreateAPIView):
     permission_classes = [IsAuthenticated, ~IsModerator]
 
     def perform_create(self, serializer):
-        new_habit = serializer.save()
+        # Привычка и ее напоминание (либо запись о нем в ScheduleOutbox) сохраняются в одной транзакции
+        with schedule_registry.atomic():
+            new_habit = serializer.save()
 
-        new_habit.owner = self.request.user  # Добавляем пользователя
+            new_habit.owner = self.request.user  # Добавляем пользователя
 
-        new_habit.save()
+            new_habit.save()
+
+            add_task(new_habit)  # Создаем периодическую задачу
+
+
+class HabitFieldsMixin:
+    """
+    Выбор выводимых полей привычки параметром fields (через запятую).
+    Из базы данных выбираются только эти поля, неизвестные поля - ошибка 400
+    """
+
+    fields_query_param = 'fields'
+
+    def get_requested_fields(self):
+        """ Запрошенные поля в порядке полей сериализатора либо None, если параметр не передан """
+
+        param = self.request.query_params.get(self.fields_query_param)
+        if param is None:
+            return None
+        requested = {name.strip() for name in param.split(',') if name.strip()}
+        available = list(self.get_serializer_class()().fields)
+        if not requested or requested - set(available):
+            raise ValidationError(
+                {self.fields_query_param: [f'Допустимые поля: {", ".join(available)}']}
+            )
+        return tuple(name for name in available if name in requested)
 
-        add_task(new_habit)  # Создаем периодическую задачу
+    def get_selected_fields(self):
+        """
+        Поля строк values() списка: запрошенные либо все поля сериализатора.
+        Добавляются id и поля сортировки: по их значениям курсор строит ссылки на соседние страницы
+        """
 
+        fields = self.get_requested_fields() or self.get_serializer_class().Meta.fields
+        keys = ['id', *self.get_ordering_keys()]
+        return (*fields, *[key for key in dict.fromkeys(keys) if key not in fields])
 
-class HabitListAPIView(ListAPIView):
+    def get_ordering_keys(self):
+        """ Поля сортировки из параметра ordering (расстояние поиска добавляется фильтром позже) """
+
+        ordering = None
+        for backend in self.filter_backends:
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(self.request, Habit.objects.none(), self)
+        return [term.lstrip('-') for term in ordering or () if term.lstrip('-') in (self.ordering_fields or ())]
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class HabitListAPIView(HabitFieldsMixin, ListAPIView):
     """
     Получение списка привычек
 
     - Доступна фильтрация по признаку приятной привычки
       is_nice (true, false)
+    - Поиск по действию и месту выполнения search
+      (без сортировки результаты упорядочены по сходству)
     - Сортировка по любому доступному полю
       (для админа, дополнительно owner_email)
+    - Выбор выводимых полей fields (через запятую)
 
     Просматривать пользователь может только свои привычки
     Модератор просматривает все привычки с указанием создателя
+
+    Поддерживается условный запрос (If-None-Match): если привычки не изменились, возвращается 304
     """
 
-    filter_backends = [OrderingFilter, DjangoFilterBackend]
+    filter_backends = [HabitSearchFilter, DjangoFilterBackend]
     ordering_fields = None
     filterset_fields = ('is_nice', )
-    pagination_class = HabitPaginator
+    pagination_class = HabitCursorPaginator
 
     def get_queryset(self):
+        queryset = Habit.objects.listed_for(self.request.user)
         if self.request.user.is_staff:
-            queryset = Habit.objects.all()
-        else:
-            queryset = Habit.objects.filter(owner=self.request.user)
+            queryset = queryset.with_owner_email()
 
-        if isinstance(queryset, QuerySet):
-            # Ensure queryset is re-evaluated on each request.
-            queryset = queryset.all()
+        # Выбираются только поля списка, строки формирует HabitValuesListSerializer
+        return queryset.values(*self.get_selected_fields())
 
-        return queryset
+    def list(self, request, *args, **kwargs):
+        # ETag по содержимому выдаваемой страницы, без подсчета всех отобранных привычек
+        return page_etag_response(
+            request, lambda: super(HabitListAPIView, self).list(request, *args, **kwargs),
+            request.user.id, get_request_digest(request)
+        )
 
     def get_serializer_class(self):
         if self.request.user.is_staff:
@@ -104,71 +200,438 @@ class HabitListAPIView(ListAPIView):
         return serializer_class
 
 
-class HabitRetrieveAPIView(RetrieveAPIView):
+class Echo:
+    """ Буфер для csv.writer, который сразу возвращает записанную строку """
+
+    def write(self, value):
+        return value
+
+
+class HabitExportAPIView(HabitListAPIView):
+    """
+    Выгрузка списка привычек целиком
+
+    - Формат задается параметром type: ndjson (по умолчанию) либо csv
+    - Доступны те же фильтрация, сортировка и выбор полей, что и у списка привычек
+
+    Пользователь выгружает только свои привычки, модератор - все привычки с указанием создателя.
+    Строки читаются из базы данных частями и сразу отправляются клиенту,
+    поэтому расход памяти не зависит от количества привычек
+    """
+
+    pagination_class = None
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv; charset=utf-8',
+    }
+
+    def get(self, request, *args, **kwargs):
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in self.content_types:
+            raise ValidationError({'type': [f'Допустимые значения: {", ".join(self.content_types)}']})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(many=True)
+        # Строки выбираются курсором на стороне сервера частями по chunk_size
+        rows = serializer.iter_representation(queryset.iterator(chunk_size=settings.HABITS_EXPORT_CHUNK_SIZE))
+        lines = self.iter_csv(rows, list(serializer.child.fields)) if export_type == 'csv' else self.iter_ndjson(rows)
+
+        response = StreamingHttpResponse(lines, content_type=self.content_types[export_type])
+        response['Content-Disposition'] = f'attachment; filename="habits.{export_type}"'
+        return response
+
+    @staticmethod
+    def iter_ndjson(rows):
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    @staticmethod
+    def iter_csv(rows, fields):
+        writer = csv.DictWriter(Echo(), fieldnames=fields)
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class HabitSyncAPIView(GenericAPIView):
+    """
+    Синхронизация привычек
+
+    Возвращает привычки, созданные либо измененные после курсора cursor,
+    и id удаленных после курсора привычек.
+    Без курсора возвращаются все привычки.
+    Если has_more, изменения запрашиваются повторно с полученным курсором
+
+    Пользователь получает свои привычки, модератор - все привычки
+    """
+
+    serializer_class = HabitSerializer
+
+    def get_queryset(self):
+        return Habit.objects.listed_for(self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        deleted = DeletedHabit.objects.all()
+        if not request.user.is_staff:
+            deleted = deleted.filter(owner=request.user)
+
+        try:
+            habits, deleted_ids, cursor, has_more = get_changes(
+                self.get_queryset(), deleted, request.query_params.get('cursor')
+            )
+        except ValueError as error:
+            raise ValidationError({'cursor': [str(error)]})
+
+        return Response(
+            {
+                'cursor': cursor,
+                'has_more': has_more,
+                'habits': self.get_serializer(habits, many=True).data,
+                'deleted': deleted_ids,
+            }
+        )
+
+
+class HabitObjectMixin:
+    """
+    Загрузка привычки одним запросом: право доступа проверяется условием в том же запросе
+    (см. HabitQuerySet.with_access), а не классами разрешений по загруженному объекту.
+    Привычка не найдена - 404, доступ запрещен - 403.
+    Привычка загружается один раз за запрос
+    """
+
+    queryset = Habit.objects.all()
+    # Метод HabitQuerySet, возвращающий условие доступа пользователя к привычке
+    access_condition = 'get_visibility_condition'
+
+    def get_object(self):
+        if getattr(self, '_habit', None) is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            queryset = queryset.with_access(getattr(Habit.objects, self.access_condition)(self.request.user))
+            habit = get_object_or_404(queryset, pk=self.kwargs['pk'])
+            if not habit.has_access:
+                self.permission_denied(self.request)
+            self._habit = habit
+        return self._habit
+
+
+class HabitRetrieveAPIView(HabitObjectMixin, HabitFieldsMixin, RetrieveAPIView):
     """
     Подробный просмотр привычки
 
+    Просматривать разрешено создателю, модератору либо любому пользователю если привычка публичная
+
+    Поддерживается условный запрос (If-None-Match): если привычка не изменилась, возвращается 304.
+    Выбор выводимых полей fields (через запятую)
+    """
+
+    serializer_class = HabitSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if fields := self.get_requested_fields():
+            # Время изменения нужно для ETag
+            queryset = queryset.only(*fields, 'updated_at')
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = make_etag(instance.pk, instance.updated_at.isoformat(), self.get_requested_fields())
+        return etag_response(request, etag, lambda: Response(self.get_serializer(instance).data))
+
+
+class HabitBatchRetrieveAPIView(GenericAPIView):
+    """
+    Просмотр нескольких привычек по списку id
+
+    Привычки выбираются одним запросом, право просмотра проверяется в том же запросе.
+    Возвращаются доступные привычки (в порядке id запроса), а отдельно -
+    id привычек, просматривать которые запрещено, и id ненайденных привычек
+
     Просматривать разрешено создателю, модератору либо любому пользователю если привычка публичная
     """
 
     queryset = Habit.objects.all()
     serializer_class = HabitSerializer
-    permission_classes = [IsPublic | IsOwner | IsModerator]
+
+    def post(self, request, *args, **kwargs):
+        ids_serializer = HabitIdsSerializer(data=request.data)
+        ids_serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(ids_serializer.validated_data['ids']))
+
+        habits = self.get_queryset().with_visibility(request.user).in_bulk(ids)
+        found = [habits[habit_id] for habit_id in ids if habit_id in habits and habits[habit_id].is_visible]
+
+        return Response(
+            {
+                'habits': self.get_serializer(found, many=True).data,
+                'forbidden': [habit_id for habit_id in ids if habit_id in habits and not habits[habit_id].is_visible],
+                'not_found': [habit_id for habit_id in ids if habit_id not in habits],
+            }
+        )
 
 
-class HabitPublicListAPIView(ListAPIView):
+class HabitPublicListAPIView(HabitFieldsMixin, ListAPIView):
     """
     Получение списка публичных привычек
 
     - Доступна фильтрация по признаку приятной привычки
       is_nice (true, false)
+    - Поиск по действию и месту выполнения search
+      (без сортировки результаты упорядочены по сходству)
     - Сортировка по любому доступному полю.
+    - Выбор выводимых полей fields (через запятую)
 
-    Просматривать может любой авторизованный пользователь
+    Просматривать может любой авторизованный пользователь.
+    Лента одинакова для всех пользователей, поэтому страницы кэшируются
+    до изменения любой публичной привычки.
+    Поддерживается условный запрос (If-None-Match): если публичные привычки не изменились, возвращается 304
     """
 
-    queryset = Habit.objects.filter(is_public=True)
+    queryset = Habit.objects.filter(is_public=True).with_owner_email()
     serializer_class = HabitListAllSerializer
-    filter_backends = [OrderingFilter, DjangoFilterBackend]
+    filter_backends = [HabitSearchFilter, DjangoFilterBackend]
     ordering_fields = ('id', 'task', 'start_time', 'location', 'periodicity', 'is_nice', 'owner_email', )
     filterset_fields = ('is_nice', )
-    pagination_class = HabitPaginator
+    pagination_class = HabitCursorPaginator
 
+    def get_queryset(self):
+        # Выбираются только поля списка, строки формирует HabitValuesListSerializer
+        return super().get_queryset().values(*self.get_selected_fields())
+
+    def list(self, request, *args, **kwargs):
+        if not settings.HABITS_PUBLIC_CACHE:
+            # ETag по содержимому выдаваемой страницы, как у списка своих привычек
+            return page_etag_response(
+                request, lambda: Response(self.build_page(request, *args, **kwargs)), get_request_digest(request)
+            )
+
+        # Страницы закэшированы под версией ленты, поэтому ETag по версии, без запросов к базе данных
+        etag = make_etag(get_public_version(), get_request_digest(request))
+        return etag_response(
+            request, etag, lambda: Response(get_public_page(request, lambda: self.build_page(request, *args, **kwargs)))
+        )
+
+    def build_page(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+
+class HabitAutocompleteAPIView(ListAPIView):
+    """
+    Подсказки при выборе связанной приятной привычки
+
+    Возвращает свои и публичные приятные привычки, действие которых начинается
+    с prefix (без учета регистра). Выдается не более HABITS_AUTOCOMPLETE_LIMIT привычек
 
-class HabitUpdateAPIView(UpdateAPIView):
+    Доступно любому авторизованному пользователю не являющемуся модератором
+    """
+
+    serializer_class = HabitAutocompleteSerializer
+    permission_classes = [IsAuthenticated, ~IsModerator]
+    pagination_class = None
+
+    def get_queryset(self):
+        prefix = self.request.query_params.get('prefix', '').strip()
+        # Условия совпадают с частичными индексами habit_owner_nice_prefix_idx и habit_public_nice_prefix_idx
+        queryset = Habit.objects.visible_to(self.request.user).filter(is_nice=True, task__istartswith=prefix)
+        return queryset.order_by(Upper('task'), 'id').values('id', 'task')[:settings.HABITS_AUTOCOMPLETE_LIMIT]
+
+
+class HabitUpdateAPIView(HabitObjectMixin, UpdateAPIView):
     """
     Изменение привычки
 
     Изменять разрешено владельцу либо модератору
     """
 
-    queryset = Habit.objects.all()
-    permission_classes = [IsOwner | IsModerator]
+    # Создатель нужен для напоминания при перепланировании
+    queryset = Habit.objects.select_related('owner')
+    access_condition = 'get_edit_condition'
 
     def get_serializer_class(self):
+        # Привычка уже загружена в update(), повторного запроса нет
         if self.get_object().is_nice:
             return HabitNiceCreateSerializer
         return HabitGoodUpdateSerializer
 
     def perform_update(self, serializer):
-        obj = serializer.save()
-        # Изменяем периодическую задачу если она существует
-        update_task(obj)
+        with schedule_registry.atomic():
+            obj = serializer.save()
+            # Изменяем периодические задачи только если изменились поля напоминания
+            for habit in get_rescheduled_habits([obj]):
+                update_task(habit)
 
 
-class HabitDestroyAPIView(DestroyAPIView):
+class HabitDestroyAPIView(HabitObjectMixin, DestroyAPIView):
     """
     Удаление привычки
 
     Удалять может только создатель
     """
 
-    queryset = Habit.objects.all()
     serializer_class = HabitSerializer
-    permission_classes = [IsOwner]
+    access_condition = 'get_delete_condition'
 
     def perform_destroy(self, instance):
-        # Удаляем периодическую задачу если она существует
-        delete_task(instance)
-        # Удаляем привычку
-        instance.delete()
+        with transaction.atomic():
+            # Удаляем периодическую задачу если она существует
+            delete_task(instance)
+            # Удаляем привычку
+            instance.delete()
+
+
+class HabitBulkCreateMixin:
+    """ Пакетное создание привычек со списком объектов в теле запроса """
+
+    is_nice = False
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs['many'] = True
+        kwargs['max_length'] = settings.HABITS_BULK_MAX_ITEMS
+        return super().get_serializer(*args, **kwargs)
+
+    def perform_create(self, serializer):
+        # Привычки и их напоминания создаются пачками в одной транзакции
+        with schedule_registry.atomic():
+            habits = serializer.save(owner=self.request.user, is_nice=self.is_nice)
+            add_tasks(habits)
+            if any(habit.is_public for habit in habits):
+                bump_public_version_on_commit()
+
+
+class HabitNiceBulkCreateAPIView(HabitBulkCreateMixin, CreateAPIView):
+    """
+    Пакетное создание приятных привычек
+
+    Принимает список привычек. Создавать может любой авторизованный пользователь не являющийся модератором
+    """
+
+    queryset = Habit.objects.all()
+    serializer_class = HabitNiceBulkCreateSerializer
+    permission_classes = [IsAuthenticated, ~IsModerator]
+    is_nice = True
+
+
+class HabitGoodBulkCreateAPIView(HabitBulkCreateMixin, CreateAPIView):
+    """
+    Пакетное создание полезных привычек
+
+    Принимает список привычек. Связанные привычки проверяются одним запросом,
+    привычки и напоминания создаются пачками.
+    Создавать может любой авторизованный пользователь не являющийся модератором
+    """
+
+    queryset = Habit.objects.all()
+    serializer_class = HabitGoodBulkCreateSerializer
+    permission_classes = [IsAuthenticated, ~IsModerator]
+
+
+class HabitImportAPIView(GenericAPIView):
+    """
+    Импорт привычек из NDJSON (по одной привычке в строке, приятная привычка - с "is_nice": true)
+
+    Тело запроса читается по строкам, корректные привычки создаются пачками вместе с напоминаниями.
+    Ошибки возвращаются по номерам строк и не прерывают импорт.
+    Импортировать может любой авторизованный пользователь не являющийся модератором
+    """
+
+    queryset = Habit.objects.all()
+    serializer_class = HabitGoodBulkCreateSerializer
+    permission_classes = [IsAuthenticated, ~IsModerator]
+
+    def post(self, request, *args, **kwargs):
+        report = import_habits(request.stream or (), owner=request.user)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST)
+
+
+class HabitBulkUpdateAPIView(GenericAPIView):
+    """
+    Пакетное изменение привычек
+
+    Принимает список привычек с указанием id. Изменения сохраняются,
+    только если все привычки прошли проверку.
+    Изменять разрешено владельцу либо модератору
+    """
+
+    queryset = Habit.objects.all()
+    serializer_class = HabitGoodBulkUpdateSerializer
+
+    def patch(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or len(items) > settings.HABITS_BULK_MAX_ITEMS:
+            return Response(
+                {'detail': f'Ожидается список не более чем из {settings.HABITS_BULK_MAX_ITEMS} привычек'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Все привычки и связанные с ними привычки загружаются двумя запросами
+        queryset = self.get_queryset().editable_by(request.user).select_related('owner', 'related_habit')
+        ids = [item.get('id') for item in items if isinstance(item, dict) and isinstance(item.get('id'), int)]
+        habits = queryset.in_bulk(ids)
+        context = self.get_serializer_context()
+        context['related_habits'] = get_related_habits(items)
+
+        item_serializers, errors = [], []
+        for item in items:
+            habit = habits.get(item.get('id')) if isinstance(item, dict) else None
+            if habit is None:
+                errors.append({'id': ['Привычка не найдена']})
+                continue
+            serializer_class = HabitNiceBulkUpdateSerializer if habit.is_nice else HabitGoodBulkUpdateSerializer
+            serializer = serializer_class(habit, data=item, partial=True, context=context)
+            errors.append({} if serializer.is_valid() else serializer.errors)
+            item_serializers.append(serializer)
+
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        updated = [serializer.assign() for serializer in item_serializers]
+        changed_fields = set()
+        now = timezone.now()
+        for habit in updated:
+            # bulk_update не вызывает save(), поэтому изменения и время изменения фиксируем сами
+            habit.saved_changes = habit.get_changed_fields()
+            changed_fields |= habit.saved_changes
+            if habit.saved_changes:
+                habit.updated_at = now
+
+        with schedule_registry.atomic():
+            if changed_fields:
+                Habit.objects.bulk_update(updated, {*changed_fields, 'updated_at'})
+            update_tasks(get_rescheduled_habits(updated))
+            if any(habit.affects_public_feed(habit.saved_changes) for habit in updated):
+                bump_public_version_on_commit()
+
+        return Response([serializer.data for serializer in item_serializers])
+
+
+class HabitBulkDestroyAPIView(GenericAPIView):
+    """
+    Пакетное удаление привычек
+
+    Принимает список id привычек. Удаление выполняется, только если все привычки найдены.
+    Удалять может только создатель
+    """
+
+    queryset = Habit.objects.all()
+    serializer_class = HabitIdsSerializer
+
+    def delete(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        ids = set(serializer.validated_data['ids'])
+        habits = list(self.get_queryset().deletable_by(request.user).filter(id__in=ids))
+        if missing := ids - {habit.id for habit in habits}:
+            return Response(
+                {'detail': 'Привычки не найдены', 'ids': sorted(missing)},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        with transaction.atomic():
+            delete_tasks(habits)
+            self.get_queryset().filter(id__in=ids).delete()
+            if any(habit.is_public for habit in habits):
+                bump_public_version_on_commit()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
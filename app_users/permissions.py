@@ -5,15 +5,3 @@ class IsModerator(BasePermission):
 
     def has_permission(self, request, view):
         return request.user.is_staff
-
-
-class IsOwner(BasePermission):
-
-    def has_object_permission(self, request, view, obj):
-        return request.user == obj.owner
-
-
-class IsPublic(BasePermission):
-
-    def has_object_permission(self, request, view, obj):
-        return obj.is_public
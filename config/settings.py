@@ -12,12 +12,20 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from datetime import timedelta
 from pathlib import Path
 import environ
+from celery.schedules import crontab
 
 # Set casting, default value in environment
 env = environ.Env(
     DEBUG=(bool, False),
     DATABASE_USER=(str, 'postgres'),
     DATABASE_PASSORD=(str, ''),
+    HABITS_REMINDER_BACKEND=(str, 'periodic_task'),
+    HABITS_DELIVERY_BACKEND=(str, 'celery'),
+    HABITS_SCHEDULE_OUTBOX=(bool, False),
+    HABITS_REMINDER_PREENQUEUE_MINUTES=(int, 0),
+    HABITS_REMINDER_SMOOTHING_SECONDS=(int, 0),
+    CELERY_BEAT_SCHEDULER=(str, 'django_celery_beat.schedulers:DatabaseScheduler'),
+    HABITS_BEAT_CHANGE_LOG=(bool, False),
 )
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +54,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'django_filters',
@@ -163,15 +172,122 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=356),
 }
 
+# Cache settings
+# При заданном CACHE_REDIS_URL используется Redis, иначе кэш в памяти процесса
+CACHE_REDIS_URL = env('CACHE_REDIS_URL', default=None)
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Celery settings
 CELERY_BROKER_URL = 'redis://redis:6379/0'  # URL-адрес брокера сообщений
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'  # URL-адрес брокера результатов, также Redis
 CELERY_TIMEZONE = "Asia/Vladivostok"  # Часовой пояс для работы Celery
 CELERY_TASK_TRACK_STARTED = True  # Флаг отслеживания выполнения задач
 CELERY_TASK_TIME_LIMIT = 30 * 60  # Максимальное время на выполнение задачи
+CELERY_BEAT_SCHEDULE = {}  # Задачи celery beat, дополняется ниже в зависимости от настроек привычек
+
+# Habits reminders settings
+# Способ планирования напоминаний о полезных привычках:
+# - periodic_task: для каждой привычки создается отдельная PeriodicTask
+# - dispatcher: единая задача celery beat раз в минуту выбирает
+#   наступившие напоминания по полю Habit.next_fire_at
+HABITS_REMINDER_BACKEND = env('HABITS_REMINDER_BACKEND')
+HABITS_REMINDER_BATCH_SIZE = 500  # Количество напоминаний, обрабатываемых за одну выборку
+HABITS_REMINDER_DISPATCH_INTERVAL = timedelta(minutes=1)  # Период запуска диспетчера (CELERY_BEAT_SCHEDULE)
+# Заблаговременная постановка напоминаний в очередь (для dispatcher): напоминания, наступающие
+# в ближайшие HABITS_REMINDER_PREENQUEUE_MINUTES минут, ставятся задачами celery с ETA
+# и отправляются точно в свое время. 0 - напоминания ставятся в очередь по наступлении.
+# Окно должно быть меньше visibility_timeout брокера Redis (по умолчанию 1 час)
+HABITS_REMINDER_PREENQUEUE_WINDOW = timedelta(minutes=env('HABITS_REMINDER_PREENQUEUE_MINUTES'))
+# Сглаживание нагрузки (для dispatcher): напоминание отправляется раньше назначенного времени на постоянный
+# для привычки сдвиг от 0 до HABITS_REMINDER_SMOOTHING_SECONDS секунд, и напоминания популярных минут (07:00, 08:00)
+# расходятся по окну. Позже назначенного времени (за 5 минут до начала действия) напоминание не отправляется.
+# 0 - без сглаживания
+HABITS_REMINDER_SMOOTHING_WINDOW = timedelta(seconds=env('HABITS_REMINDER_SMOOTHING_SECONDS'))
+# Границы интервалов гистограммы опозданий напоминаний, поставленных с ETA (секунд)
+HABITS_REMINDER_LATENESS_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60)
+
+if HABITS_REMINDER_BACKEND == 'dispatcher':
+    CELERY_BEAT_SCHEDULE['dispatch-reminders'] = {
+        'task': 'app_habits.tasks.dispatch_reminders',
+        'schedule': crontab(),  # Каждую минуту
+    }
+
+# Изменение периодических задач напоминаний (HABITS_REMINDER_BACKEND='periodic_task'):
+# - False: в запросе, изменившем привычку
+# - True: запрос в той же транзакции создает запись ScheduleOutbox, а периодические
+#   задачи изменяются пачками задачей relay_schedule_outbox
+HABITS_SCHEDULE_OUTBOX = env('HABITS_SCHEDULE_OUTBOX')
+HABITS_SCHEDULE_OUTBOX_INTERVAL = 5  # Период запуска relay_schedule_outbox, секунд
+HABITS_SCHEDULE_OUTBOX_BATCH_SIZE = 500  # Количество записей ScheduleOutbox, обрабатываемых за одну выборку
+
+if HABITS_SCHEDULE_OUTBOX and HABITS_REMINDER_BACKEND != 'dispatcher':
+    CELERY_BEAT_SCHEDULE['relay-schedule-outbox'] = {
+        'task': 'app_habits.tasks.relay_schedule_outbox',
+        'schedule': HABITS_SCHEDULE_OUTBOX_INTERVAL,
+    }
+
+# Планировщик celery beat: по умолчанию стандартный DatabaseScheduler,
+# app_habits.beat:HabitScheduler (включается явно) перечитывает только измененные задачи
+CELERY_BEAT_SCHEDULER = env('CELERY_BEAT_SCHEDULER')
+# Журнал изменений периодических задач для HabitScheduler (без него HabitScheduler не запускается).
+# С журналом изменения задач привычек не обновляют отметку PeriodicTasks, поэтому DatabaseScheduler
+# их не увидит: включается только вместе с HabitScheduler
+HABITS_BEAT_CHANGE_LOG = env('HABITS_BEAT_CHANGE_LOG')
+# Период проверки журнала изменений планировщиком HabitScheduler, секунд
+HABITS_BEAT_CHANGES_INTERVAL = 5
+
+HABITS_BULK_MAX_ITEMS = 100  # Максимальное количество привычек в одном пакетном запросе
+HABITS_EXPORT_CHUNK_SIZE = 2000  # Количество строк, читаемых из базы данных за раз при выгрузке
+HABITS_IMPORT_BATCH_SIZE = 500  # Количество привычек, создаваемых одним запросом при импорте
+HABITS_AUTOCOMPLETE_LIMIT = 10  # Количество подсказок при выборе связанной привычки
+HABITS_SYNC_PAGE_SIZE = 500  # Максимальное количество привычек в одном ответе синхронизации
+# Запас времени курсора синхронизации на транзакции, зафиксированные позже времени изменения привычки
+HABITS_SYNC_OVERLAP = timedelta(seconds=30)
+# Срок хранения отметок об удалении привычек. Курсор старше этого срока не принимается,
+# и клиент синхронизируется заново без курсора. Устаревшие отметки удаляет задача prune_deleted_habits
+HABITS_SYNC_HORIZON = timedelta(days=90)
+CELERY_BEAT_SCHEDULE['prune-deleted-habits'] = {
+    'task': 'app_habits.tasks.prune_deleted_habits',
+    'schedule': crontab(minute=0, hour=4),  # Раз в сутки
+}
+
+# Способ доставки напоминаний:
+# - celery: каждое напоминание отправляется отдельной задачей send_message_tg
+# - async: подготовленные напоминания складываются в очередь Redis
+#   и отправляются сервисом доставки (python manage.py run_delivery)
+HABITS_DELIVERY_BACKEND = env('HABITS_DELIVERY_BACKEND')
+HABITS_DELIVERY_REDIS_URL = 'redis://redis:6379/0'
+HABITS_DELIVERY_QUEUE = 'habits:reminders'
+HABITS_DELIVERY_BATCH_SIZE = 500  # Количество напоминаний, забираемых из очереди за раз
+HABITS_DELIVERY_CONCURRENCY = 200  # Количество одновременных запросов к Telegram
+
+# Кэш публичной ленты привычек. Версия ленты хранится в кэше, и смена версии должна быть видна
+# всем процессам, поэтому страницы кэшируются только в общем кэше (Redis, CACHE_REDIS_URL)
+HABITS_PUBLIC_CACHE = bool(CACHE_REDIS_URL)
+HABITS_PUBLIC_CACHE_TIMEOUT = 5 * 60  # Время хранения страницы (секунд)
+HABITS_PUBLIC_CACHE_LOCK_TIMEOUT = 10  # Максимальное время построения страницы одним запросом (секунд)
 
 # Telegram settings
 TELEGRAM_BOT_TOKEN = env('TELEGRAM_BOT_TOKEN')
+TELEGRAM_API_URL = env('TELEGRAM_API_URL', default='https://api.telegram.org/bot')
+TELEGRAM_RATE_LIMIT = 30  # Сообщений в секунду (общий лимит Telegram - 30 в секунду)
+# Redis для общего лимита всех воркеров celery. Без Redis лимит действует на процесс,
+# и при N процессах TELEGRAM_RATE_LIMIT нужно уменьшить до 30 / N
+TELEGRAM_RATE_LIMIT_REDIS_URL = CACHE_REDIS_URL
+TELEGRAM_CHAT_RATE_LIMIT = 1  # Сообщений в секунду в один чат
+TELEGRAM_TIMEOUT = (3.05, 10)  # Время на подключение и на ожидание ответа (секунд)
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
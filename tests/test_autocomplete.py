@@ -0,0 +1,69 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import Habit
+from app_users.models import User
+
+
+class HabitAutocompleteTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.other_user = User.objects.create(
+            email="user2@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.moderator = User.objects.create(
+            email="moderator@test.com",
+            is_staff=True,
+            is_active=True,
+        )
+
+        for task, owner, is_nice, is_public in (
+            ("Съесть яблоко", self.user, True, False),
+            ("съесть грушу", self.other_user, True, True),
+            ("Съесть торт", self.other_user, True, False),
+            ("Съездить на дачу", self.user, False, False),
+            ("Сон", self.user, True, False),
+            ("Выпить чай", self.user, True, False),
+        ):
+            Habit.objects.create(task=task, location="Test location", owner=owner, is_nice=is_nice, is_public=is_public)
+
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, **params):
+        response = self.client.get(reverse("app_habits:habit_autocomplete"), params)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_prefix(self):
+        """ Свои и публичные приятные привычки по началу действия без учета регистра """
+
+        with self.assertNumQueries(1):
+            habits = self.get(prefix="съе")
+
+        self.assertEquals([habit['task'] for habit in habits], ["съесть грушу", "Съесть яблоко"])
+        self.assertEquals(set(habits[0]), {'id', 'task'})
+
+    def test_special_characters(self):
+        """ Символы шаблона LIKE в префиксе ищутся как обычные символы """
+
+        self.assertEquals(self.get(prefix="%"), [])
+
+    @override_settings(HABITS_AUTOCOMPLETE_LIMIT=2)
+    def test_limit(self):
+        self.assertEquals([habit['task'] for habit in self.get()], ["Выпить чай", "Сон"])
+
+    def test_moderator(self):
+        self.client.force_authenticate(user=self.moderator)
+
+        response = self.client.get(reverse("app_habits:habit_autocomplete"), {'prefix': "съе"})
+
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,75 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import Habit
+from app_users.models import User
+
+
+class HabitBatchRetrieveTest(APITestCase):
+
+    def setUp(self):
+        self.user_1 = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.user_2 = User.objects.create(
+            email="user2@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.moderator = User.objects.create(
+            email="moderator@test.com",
+            is_staff=True,
+            is_active=True,
+        )
+
+        self.own_habit = Habit.objects.create(
+            task="Test own habit",
+            location="Test location",
+            owner=self.user_1
+        )
+        self.public_habit = Habit.objects.create(
+            task="Test public habit",
+            location="Test location",
+            is_public=True,
+            owner=self.user_2
+        )
+        self.private_habit = Habit.objects.create(
+            task="Test private habit",
+            location="Test location",
+            owner=self.user_2
+        )
+
+    def post(self, user, ids):
+        self.client.force_authenticate(user=user)
+        return self.client.post(reverse("app_habits:habit_batch"), {"ids": ids}, format='json')
+
+    def test_batch(self):
+        """ Привычки выбираются одним запросом, недоступные и ненайденные id возвращаются отдельно """
+
+        missing_id = self.private_habit.id + 100
+        ids = [self.public_habit.id, self.private_habit.id, missing_id, self.own_habit.id, self.public_habit.id]
+
+        with self.assertNumQueries(1):
+            response = self.post(self.user_1, ids)
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [habit['task'] for habit in response.json()['habits']],
+            ["Test public habit", "Test own habit"]
+        )
+        self.assertEquals(response.json()['forbidden'], [self.private_habit.id])
+        self.assertEquals(response.json()['not_found'], [missing_id])
+
+    def test_moderator(self):
+        response = self.post(self.moderator, [self.own_habit.id, self.private_habit.id])
+
+        self.assertEquals(len(response.json()['habits']), 2)
+        self.assertEquals(response.json()['forbidden'], [])
+
+    def test_invalid(self):
+        response = self.post(self.user_1, [])
+
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
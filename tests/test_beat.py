@@ -0,0 +1,180 @@
+from datetime import time, timedelta
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_celery_beat.models import IntervalSchedule, PeriodicTask, PeriodicTasks
+
+from app_habits.beat import HabitScheduler
+from app_habits.models import Habit, PeriodicTaskChange
+from app_habits.services import add_task, delete_task, update_task
+from app_users.models import User
+from config.celery import app
+
+
+class RecordingScheduler(HabitScheduler):
+    """ Планировщик, запоминающий запущенные задачи вместо отправки брокеру """
+
+    producer = None
+
+    def __init__(self, *args, **kwargs):
+        self.sent = []
+        super().__init__(*args, **kwargs)
+
+    def apply_entry(self, entry, producer=None):
+        self.sent.append(entry.name)
+
+
+@override_settings(HABITS_BEAT_CHANGES_INTERVAL=0, HABITS_BEAT_CHANGE_LOG=True)
+@mock.patch('app_habits.beat.close_old_connections')
+@mock.patch('django_celery_beat.schedulers.close_old_connections')
+class HabitSchedulerTest(TestCase):
+
+    def setUp(self):
+        self.interval = IntervalSchedule.objects.create(every=1, period=IntervalSchedule.DAYS)
+        for i in range(3):
+            self.create_task(f'Test task {i}')
+        self.tasks = PeriodicTask.objects.filter(name__startswith='Test task')
+
+    def create_task(self, name, last_run_at=None):
+        return PeriodicTask.objects.create(
+            name=name,
+            task='app_habits.tasks.print_task',
+            interval=self.interval,
+            last_run_at=last_run_at,
+        )
+
+    def create_habit(self, task):
+        habit = Habit.objects.create(
+            task=task,
+            location='Test location',
+            start_time=time(12, 10),
+            owner=self.user,
+        )
+        add_task(habit)
+        return habit
+
+    def test_load(self, *mocks):
+        PeriodicTaskChange.objects.create(periodic_task_id=self.tasks[0].id)
+
+        scheduler = RecordingScheduler(app=app)
+
+        self.assertTrue({'Test task 0', 'Test task 1', 'Test task 2'} <= set(scheduler.schedule))
+        # Загруженные изменения удалены из журнала
+        self.assertFalse(PeriodicTaskChange.objects.exists())
+
+    def test_changes(self, *mocks):
+        """ Изменения задач привычек перечитываются по журналу, без загрузки всех задач """
+
+        self.user = User.objects.create(email='user1@test.com', telegram_id='123456789', is_active=True)
+        changed_habit, deleted_habit = self.create_habit('Test habit 0'), self.create_habit('Test habit 1')
+        scheduler = RecordingScheduler(app=app)
+        scheduler.tick()
+        unchanged = scheduler.schedule['Test task 1']
+        deleted_name = deleted_habit.periodic_task.name
+
+        changed_habit.task = 'Renamed habit'
+        update_task(changed_habit)
+        new_habit = self.create_habit('New habit')
+        delete_task(deleted_habit)
+
+        # Отметка изменений, журнал, задачи с периодами (2 запроса) и очистка журнала
+        with self.assertNumQueries(5):
+            scheduler.tick()
+
+        changed_habit.periodic_task.refresh_from_db()
+        new_habit.periodic_task.refresh_from_db()
+        self.assertEquals(scheduler.schedule[changed_habit.periodic_task.name].kwargs['task'], 'Renamed habit')
+        self.assertIn(new_habit.periodic_task.name, scheduler.schedule)
+        self.assertNotIn(deleted_name, scheduler.schedule)
+        self.assertIs(scheduler.schedule['Test task 1'], unchanged)
+        self.assertFalse(PeriodicTaskChange.objects.exists())
+
+        # Без изменений читаются только отметка и журнал
+        with self.assertNumQueries(2):
+            scheduler.tick()
+
+    def test_late_commit(self, *mocks):
+        """ Запись журнала с меньшим id, зафиксированная позже прочитанных записей, не пропускается """
+
+        scheduler = RecordingScheduler(app=app)
+        scheduler.tick()
+
+        first, second = self.tasks.order_by('id')[:2]
+        PeriodicTaskChange.objects.create(id=1000, periodic_task_id=first.id)
+        scheduler.tick()
+
+        # Транзакция с записью журнала id=999 зафиксирована после чтения записи id=1000
+        second.no_changes = True
+        second.name = 'Renamed task'
+        second.save()
+        PeriodicTaskChange.objects.create(id=999, periodic_task_id=second.id)
+        scheduler.tick()
+
+        self.assertIn('Renamed task', scheduler.schedule)
+        self.assertFalse(PeriodicTaskChange.objects.exists())
+
+    def test_changes_without_log(self, *mocks):
+        """ Изменение отметки без записи журнала (админка, другой код) приводит к загрузке всех задач """
+
+        scheduler = RecordingScheduler(app=app)
+        scheduler.tick()
+
+        # Так выключают задачи действия админки django_celery_beat
+        self.tasks.filter(name='Test task 0').update(enabled=False)
+        PeriodicTasks.update_changed()
+        scheduler.tick()
+
+        self.assertNotIn('Test task 0', scheduler.schedule)
+        self.assertIn('Test task 1', scheduler.schedule)
+
+        # Изменение задачи не через привычку обновляет отметку, журнал не нужен
+        task = PeriodicTask.objects.get(name='Test task 1')
+        task.name = 'Renamed task'
+        task.save()
+        scheduler.tick()
+
+        self.assertIn('Renamed task', scheduler.schedule)
+        self.assertNotIn('Test task 1', scheduler.schedule)
+
+    @override_settings(HABITS_BEAT_CHANGE_LOG=False)
+    def test_log_disabled(self, *mocks):
+        """ Без журнала изменения привычек обновляют отметку для DatabaseScheduler, а HabitScheduler не запускается """
+
+        self.user = User.objects.create(email='user1@test.com', telegram_id='123456789', is_active=True)
+        last_update = PeriodicTasks.last_change()
+
+        habit = self.create_habit('Test habit')
+
+        self.assertFalse(PeriodicTaskChange.objects.filter(periodic_task_id=habit.periodic_task_id).exists())
+        self.assertNotEquals(PeriodicTasks.last_change(), last_update)
+        with self.assertRaises(ImproperlyConfigured):
+            RecordingScheduler(app=app)
+
+    def test_due(self, *mocks):
+        """ Наступившая задача запускается один раз, ее новое время запуска не считается изменением """
+
+        task = self.create_task('Due task', last_run_at=timezone.now() - timedelta(days=2))
+        scheduler = RecordingScheduler(app=app)
+
+        scheduler.tick()
+        scheduler.tick()
+        scheduler.sync()
+
+        self.assertEquals(scheduler.sent, ['Due task'])
+        task.refresh_from_db()
+        self.assertEquals(task.total_run_count, 1)
+        self.assertFalse(PeriodicTaskChange.objects.filter(periodic_task_id=task.id).exists())
+
+    def test_deleted_due(self, *mocks):
+        """ Удаленная задача не запускается, хотя осталась в очереди """
+
+        task = self.create_task('Due task', last_run_at=timezone.now() - timedelta(days=2))
+        scheduler = RecordingScheduler(app=app)
+        scheduler.populate_heap()
+
+        task.delete()
+        scheduler.tick()
+
+        self.assertEquals(scheduler.sent, [])
@@ -0,0 +1,259 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django_celery_beat.models import PeriodicTask
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import Habit
+from app_users.models import User
+
+
+class HabitBulkTest(APITestCase):
+
+    def setUp(self):
+        # Users
+        self.user_1 = User.objects.create(
+            email="user1@test.com",
+            telegram_id="123456789",
+            is_staff=False,
+            is_active=True,
+        )
+        self.user_1.set_password('test')
+        self.user_1.save()
+
+        self.user_2 = User.objects.create(
+            email="user2@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.user_2.set_password('test')
+        self.user_2.save()
+
+        # Nice Habits
+        self.nice_habit_1 = Habit.objects.create(
+            task="Test nice habit 1",
+            location="Test location",
+            is_nice=True,
+            owner=self.user_1
+        )
+        self.nice_habit_2 = Habit.objects.create(
+            task="Test nice habit 2",
+            location="Test location",
+            is_nice=True,
+            owner=self.user_1
+        )
+
+    def create_good_habits(self, count=10):
+        return self.client.post(
+            reverse("app_habits:habit_bulk_good_create"),
+            data=[
+                {
+                    "task": f"Test task good {i}",
+                    "location": "Test location",
+                    "start_time": "12:10",
+                    "periodicity": str(i % 7 + 1),
+                    "related_habit": (self.nice_habit_1.id, self.nice_habit_2.id)[i % 2],
+                }
+                for i in range(count)
+            ],
+            format='json'
+        )
+
+    def test_bulk_create(self):
+        """ Тестирование пакетного создания полезных привычек с напоминаниями """
+
+        # Аутентифицируем обычного пользователя
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.create_good_habits()
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_201_CREATED
+        )
+        self.assertEquals(len(response.json()), 10)
+
+        habit = Habit.objects.get(pk=response.json()[1]['id'])
+
+        self.assertEquals(habit.owner, self.user_1)
+        self.assertFalse(habit.is_nice)
+        self.assertEquals(
+            json.loads(habit.periodic_task.kwargs),
+            {
+                'telegram_id': "123456789",
+                'start_time': '12:10',
+                'task': 'Test task good 1',
+                'location': 'Test location',
+                'time_to_complete': 60,
+                'reward': None,
+                'related_habit': {
+                    'task': 'Test nice habit 2',
+                    'location': 'Test location',
+                    'time_to_complete': 60
+                }
+            }
+        )
+        self.assertEquals(habit.periodic_task.interval.every, 2)
+
+    def test_bulk_create_queries(self):
+        """ Количество запросов к базе данных не зависит от количества привычек """
+
+        # Аутентифицируем обычного пользователя
+        self.client.force_authenticate(user=self.user_1)
+
+        # Периоды уже созданы
+        self.create_good_habits(7)
+
+        with CaptureQueriesContext(connection) as queries_7:
+            self.create_good_habits(7)
+        with CaptureQueriesContext(connection) as queries_70:
+            response = self.create_good_habits(70)
+
+        self.assertEquals(len(response.json()), 70)
+        self.assertEquals(len(queries_7), len(queries_70))
+
+    def test_bulk_create_validation(self):
+        """ При ошибке в одной привычке не создается ни одной """
+
+        # Аутентифицируем обычного пользователя
+        self.client.force_authenticate(user=self.user_1)
+
+        good_habit = Habit.objects.create(
+            task="Test good habit",
+            location="Test location",
+            owner=self.user_1
+        )
+        count = Habit.objects.count()
+
+        response = self.client.post(
+            reverse("app_habits:habit_bulk_good_create"),
+            data=[
+                {
+                    "task": "Test task good",
+                    "location": "Test location",
+                    "start_time": "12:10",
+                    "related_habit": self.nice_habit_1.id,
+                },
+                {
+                    "task": "Test task good",
+                    "location": "Test location",
+                    "start_time": "12:10",
+                    "related_habit": good_habit.id,
+                },
+                {
+                    "task": "Test task good",
+                    "location": "Test location",
+                    "start_time": "12:10",
+                    "related_habit": 100500,
+                },
+            ],
+            format='json'
+        )
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEquals(response.json()[0], {})
+        self.assertEquals(
+            response.json()[1],
+            {'non_field_errors': ['В поле "related_habit" должна быть указана полезная привычка']}
+        )
+        self.assertIn('related_habit', response.json()[2])
+        self.assertEquals(Habit.objects.count(), count)
+
+    def test_bulk_update(self):
+        """ Тестирование пакетного изменения привычек """
+
+        # Аутентифицируем обычного пользователя
+        self.client.force_authenticate(user=self.user_1)
+
+        ids = [habit['id'] for habit in self.create_good_habits().json()]
+
+        response = self.client.patch(
+            reverse("app_habits:habit_bulk_update"),
+            data=[
+                {"id": ids[0], "reward": "Test reward"},
+                {"id": ids[1], "is_public": True},
+                {"id": self.nice_habit_1.id, "location": "Test location changed"},
+            ],
+            format='json'
+        )
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+
+        habit = Habit.objects.get(pk=ids[0])
+
+        self.assertEquals(habit.reward, "Test reward")
+        self.assertIsNone(habit.related_habit)
+        self.assertEquals(json.loads(habit.periodic_task.kwargs)['reward'], "Test reward")
+        self.assertTrue(Habit.objects.get(pk=ids[1]).is_public)
+
+        # Напоминание связанной с приятной привычкой полезной привычки обновлено
+        self.assertEquals(
+            json.loads(Habit.objects.get(pk=ids[2]).periodic_task.kwargs)['related_habit']['location'],
+            "Test location changed"
+        )
+
+    def test_bulk_update_other_user(self):
+        """ Чужие привычки не изменяются """
+
+        # Аутентифицируем обычного пользователя отличного от создателя привычки
+        self.client.force_authenticate(user=self.user_2)
+
+        response = self.client.patch(
+            reverse("app_habits:habit_bulk_update"),
+            data=[{"id": self.nice_habit_1.id, "location": "Test location changed"}],
+            format='json'
+        )
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEquals(response.json(), [{'id': ['Привычка не найдена']}])
+
+    def test_bulk_destroy(self):
+        """ Тестирование пакетного удаления привычек вместе с задачами """
+
+        # Аутентифицируем обычного пользователя
+        self.client.force_authenticate(user=self.user_1)
+
+        ids = [habit['id'] for habit in self.create_good_habits().json()]
+
+        response = self.client.delete(
+            reverse("app_habits:habit_bulk_destroy"),
+            data={"ids": ids},
+            format='json'
+        )
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_204_NO_CONTENT
+        )
+        self.assertFalse(Habit.objects.filter(id__in=ids).exists())
+        self.assertFalse(PeriodicTask.objects.filter(habit__isnull=True).exists())
+
+    def test_bulk_destroy_other_user(self):
+        """ Чужие привычки не удаляются """
+
+        # Аутентифицируем обычного пользователя отличного от создателя привычки
+        self.client.force_authenticate(user=self.user_2)
+
+        response = self.client.delete(
+            reverse("app_habits:habit_bulk_destroy"),
+            data={"ids": [self.nice_habit_1.id]},
+            format='json'
+        )
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+        self.assertTrue(Habit.objects.filter(pk=self.nice_habit_1.id).exists())
@@ -0,0 +1,185 @@
+import asyncio
+import json
+from collections import defaultdict
+from unittest import mock
+
+import aiohttp
+from django.test import SimpleTestCase, override_settings
+
+from app_habits.delivery import DeliveryService, MemoryQueue, RedisQueue, push_reminders, render_reminder
+from app_habits.management.fake_bot_api import FakeBotAPIServer
+from app_habits.tasks import send_message_tg
+
+
+class FakeRedis:
+    """ Списки Redis в памяти: команды, которые использует RedisQueue """
+
+    def __init__(self):
+        self.lists = defaultdict(list)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def lmove(self, first_list, second_list, src='LEFT', dest='RIGHT'):
+        if not self.lists[first_list]:
+            return None
+        item = self.lists[first_list].pop(0 if src == 'LEFT' else -1)
+        self.lists[second_list].insert(0 if dest == 'LEFT' else len(self.lists[second_list]), item)
+        return item
+
+    async def blmove(self, first_list, second_list, timeout, src='LEFT', dest='RIGHT'):
+        return await self.lmove(first_list, second_list, src, dest)
+
+    async def lrem(self, name, count, value):
+        self.lists[name].remove(value)
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def lmove(self, *args):
+        self.commands.append(args)
+
+    async def execute(self):
+        return [await self.client.lmove(*args) for args in self.commands]
+
+
+class DeliveryServiceTest(SimpleTestCase):
+
+    def setUp(self):
+        self.kwargs = {
+            'telegram_id': "123456789",
+            'start_time': '12:10',
+            'task': 'Test task good',
+            'location': 'Test location',
+            'time_to_complete': 60,
+            'reward': 'Test reward',
+            'related_habit': None
+        }
+
+    def test_render_reminder(self):
+        """ Текст напоминания формируется так же, как при отправке задачей celery """
+
+        self.assertEqual(
+            render_reminder(**self.kwargs),
+            {
+                'chat_id': "123456789",
+                'text': 'Я буду Test task good в 12:10 Test location в течении 60 секунд.\n'
+                        'За это, я Test reward.'
+            }
+        )
+
+    def test_delivery(self):
+        """ Все напоминания из очереди доставлены """
+
+        reminders = [render_reminder(**dict(self.kwargs, telegram_id=str(i))) for i in range(50)]
+
+        with FakeBotAPIServer(latency=0.01) as server:
+            service = DeliveryService(
+                queue=MemoryQueue(reminders),
+                base_url=server.url,
+                token='token',
+                concurrency=20,
+                batch_size=15,
+                rate_limit=1000,
+            )
+            asyncio.run(service.run(stop_when_empty=True))
+
+            self.assertEqual(server.requests, 50)
+            self.assertEqual(service.sent, 50)
+            self.assertEqual(service.failed, 0)
+
+    def test_errors(self):
+        """ Ответ 429 (даже не JSON) повторяется, ответ 5xx - нет: сообщение могло быть уже отправлено """
+
+        reminders = [render_reminder(**dict(self.kwargs, telegram_id=str(i))) for i in range(2)]
+
+        with FakeBotAPIServer(errors=[429, 503]) as server:
+            service = DeliveryService(
+                queue=MemoryQueue(reminders),
+                base_url=server.url,
+                token='token',
+                concurrency=1,
+                rate_limit=1000,
+            )
+            asyncio.run(service.run(stop_when_empty=True))
+
+            self.assertEqual(server.requests, 3)
+            self.assertEqual(service.sent, 1)
+            self.assertEqual(service.failed, 1)
+
+    def test_connect_timeout_retried(self):
+        """ Превышение времени подключения повторяется: запрос до Telegram не дошел """
+
+        post = aiohttp.ClientSession.post
+        calls = []
+
+        def flaky_post(session, *args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise aiohttp.ConnectionTimeoutError
+            return post(session, *args, **kwargs)
+
+        with FakeBotAPIServer() as server, mock.patch.object(aiohttp.ClientSession, 'post', flaky_post):
+            service = DeliveryService(
+                queue=MemoryQueue([render_reminder(**self.kwargs)]),
+                base_url=server.url,
+                token='token',
+                rate_limit=1000,
+            )
+            asyncio.run(service.run(stop_when_empty=True))
+
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(server.requests, 1)
+            self.assertEqual(service.sent, 1)
+
+    def test_redis_queue_ack(self):
+        """ Напоминание остается в списке обрабатываемых до отправки и возвращается в очередь после сбоя """
+
+        queue = RedisQueue('redis://localhost:6379/0', 'reminders')
+        queue.client = FakeRedis()
+        queue.client.lists['reminders'] = [json.dumps({'chat_id': str(i)}).encode() for i in range(3)]
+
+        async def crash_after_first():
+            batch = await queue.pop_batch(10)
+            await queue.ack(batch[0][0])
+            return batch
+
+        batch = asyncio.run(crash_after_first())
+
+        self.assertEqual([reminder['chat_id'] for item, reminder in batch], ['0', '1', '2'])
+        self.assertEqual(queue.client.lists['reminders'], [])
+        self.assertEqual(len(queue.client.lists['reminders:processing']), 2)
+
+        self.assertEqual(asyncio.run(queue.restore()), 2)
+        self.assertEqual([json.loads(item)['chat_id'] for item in queue.client.lists['reminders']], ['1', '2'])
+        self.assertEqual(queue.client.lists['reminders:processing'], [])
+
+    @override_settings(HABITS_DELIVERY_BACKEND='async')
+    @mock.patch('app_habits.tasks.push_reminders')
+    def test_task_push_to_queue(self, push_reminders):
+        """ При асинхронной доставке задача только кладет напоминание в очередь """
+
+        send_message_tg(**self.kwargs)
+
+        push_reminders.assert_called_once_with([render_reminder(**self.kwargs)])
+
+    @mock.patch('app_habits.delivery._client', None)
+    @mock.patch('redis.Redis.from_url')
+    def test_push_reuses_client(self, from_url):
+        """ Клиент Redis создается один раз на процесс и используется для всех добавлений в очередь """
+
+        push_reminders([render_reminder(**self.kwargs)])
+        push_reminders([render_reminder(**self.kwargs)])
+
+        from_url.assert_called_once()
+        self.assertEqual(from_url.return_value.rpush.call_count, 2)
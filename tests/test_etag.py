@@ -0,0 +1,151 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import Habit
+from app_users.models import User
+
+
+class HabitETagTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        self.user = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.moderator = User.objects.create(
+            email="moderator@test.com",
+            is_staff=True,
+            is_active=True,
+        )
+
+        self.habit = Habit.objects.create(
+            task="Test habit",
+            location="Test location",
+            is_public=True,
+            owner=self.user
+        )
+        Habit.objects.create(
+            task="Test other habit",
+            location="Test location",
+            owner=self.user
+        )
+
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, url, params=None, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, params, **headers)
+
+    def test_retrieve(self):
+        """ Неизмененная привычка возвращается кодом 304 без тела """
+
+        url = reverse("app_habits:habit_retrieve", args=[self.habit.id])
+
+        response = self.get(url)
+        etag = response['ETag']
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()['task'], "Test habit")
+
+        with self.assertNumQueries(1):
+            response = self.get(url, etag=etag)
+
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEquals(response.content, b'')
+        self.assertEquals(response['ETag'], etag)
+
+        self.habit.task = "Test habit changed"
+        self.habit.save()
+
+        response = self.get(url, etag=etag)
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertNotEquals(response['ETag'], etag)
+
+    def test_list(self):
+        """ ETag списка по выдаваемой странице: один запрос страницы, без подсчета всех привычек """
+
+        url = reverse("app_habits:habit_list")
+
+        etag = self.get(url)['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(url, etag=etag)
+
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEquals(len(context.captured_queries), 1)
+        self.assertNotIn('COUNT(', context.captured_queries[0]['sql'])
+
+        # Другие параметры - другой ETag
+        self.assertEquals(self.get(url, {'ordering': 'task'}, etag=etag).status_code, status.HTTP_200_OK)
+
+        # Поле, которое не выводится в списке, ETag не меняет
+        self.habit.reward = "Test reward"
+        self.habit.save()
+
+        self.assertEquals(self.get(url, etag=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.habit.task = "Test habit changed"
+        self.habit.save()
+
+        self.assertEquals(self.get(url, etag=etag).status_code, status.HTTP_200_OK)
+        etag = self.get(url)['ETag']
+
+        Habit.objects.get(task="Test other habit").delete()
+
+        self.assertEquals(self.get(url, etag=etag).status_code, status.HTTP_200_OK)
+
+    def test_list_users(self):
+        """ У разных пользователей разные ETag одного адреса """
+
+        url = reverse("app_habits:habit_list")
+        etag = self.get(url)['ETag']
+
+        self.client.force_authenticate(user=self.moderator)
+
+        self.assertEquals(self.get(url, etag=etag).status_code, status.HTTP_200_OK)
+
+    def test_list_owner_email(self):
+        """ Изменение email создателя меняет ETag списка модератора, в котором выводится owner_email """
+
+        url = reverse("app_habits:habit_list")
+        self.client.force_authenticate(user=self.moderator)
+        etag = self.get(url)['ETag']
+
+        self.user.email = "user1-changed@test.com"
+        self.user.save()
+
+        response = self.get(url, etag=etag)
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertIn("user1-changed@test.com", [habit['owner_email'] for habit in response.json()['results']])
+
+    def test_public_list(self):
+        """ ETag публичной ленты без общего кэша по выдаваемой странице, без подсчета всех привычек """
+
+        url = reverse("app_habits:habit_public_list")
+
+        etag = self.get(url)['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(url, etag=etag)
+
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEquals(len(context.captured_queries), 1)
+        self.assertNotIn('COUNT(', context.captured_queries[0]['sql'])
+
+        # Изменение в базе данных видно без сброса версии ленты в кэше (например, другим процессом)
+        self.habit.task = "Test habit changed"
+        self.habit.save()
+
+        response = self.get(url, etag=etag)
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()['results'][0]['task'], "Test habit changed")
@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import Habit
+from app_users.models import User
+
+
+class HabitExportTest(APITestCase):
+
+    def setUp(self):
+        self.user_1 = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.user_2 = User.objects.create(
+            email="user2@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.moderator = User.objects.create(
+            email="moderator@test.com",
+            is_staff=True,
+            is_active=True,
+        )
+
+        for i in range(12):
+            Habit.objects.create(
+                task=f"Test habit {i}",
+                location="Test location",
+                start_time="08:30" if i % 2 else None,
+                is_nice=not i % 2,
+                owner=(self.user_1, self.user_2)[i % 2]
+            )
+
+    @staticmethod
+    def read(response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """ Пользователь выгружает только свои привычки, строки совпадают со списком привычек """
+
+        self.client.force_authenticate(user=self.user_2)
+
+        # Строки читаются из базы данных по мере отправки ответа
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("app_habits:habit_export"))
+            content = self.read(response)
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+
+        rows = [json.loads(line) for line in content.splitlines()]
+
+        self.assertEquals(len(rows), 6)
+        self.assertEquals(
+            rows[0],
+            {
+                'id': Habit.objects.filter(owner=self.user_2).order_by('id').first().id,
+                'task': 'Test habit 1',
+                'start_time': '08:30',
+                'location': 'Test location',
+                'periodicity': '1',
+                'is_nice': False
+            }
+        )
+
+    def test_export_csv(self):
+        """ Модератор выгружает все привычки с указанием создателя, с учетом фильтрации и сортировки """
+
+        self.client.force_authenticate(user=self.moderator)
+
+        response = self.client.get(
+            reverse("app_habits:habit_export"),
+            {'type': 'csv', 'is_nice': 'true', 'ordering': '-id'}
+        )
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+        rows = list(csv.DictReader(io.StringIO(self.read(response))))
+
+        self.assertEquals(len(rows), 6)
+        self.assertEquals(rows[0]['task'], 'Test habit 10')
+        self.assertEquals(rows[0]['owner_email'], 'user1@test.com')
+        self.assertEquals(rows[0]['start_time'], '')
+
+    def test_export_unknown_type(self):
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(reverse("app_habits:habit_export"), {'type': 'xml'})
+
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_permission_anonim_export(self):
+        response = self.client.get(reverse("app_habits:habit_export"))
+
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,130 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import Habit
+from app_habits.views.habit import HabitListAPIView, HabitPublicListAPIView
+from app_users.models import User
+
+
+class HabitFieldsTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        self.user = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.moderator = User.objects.create(
+            email="moderator@test.com",
+            is_staff=True,
+            is_active=True,
+        )
+
+        for i in range(7):
+            Habit.objects.create(
+                task=f"Test habit {i}",
+                location=f"Test location {i % 2}",
+                start_time="08:30",
+                is_public=True,
+                owner=self.user
+            )
+        self.habit = Habit.objects.first()
+
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        # Запрос выборки привычек (не ETag)
+        queries = [query['sql'] for query in context.captured_queries if '"app_habits_habit"."id"' in query['sql']]
+        return response, queries[-1] if queries else ''
+
+    def test_retrieve(self):
+        """ Из базы данных выбираются только запрошенные поля и поля проверки доступа """
+
+        response, sql = self.get(reverse("app_habits:habit_retrieve", args=[self.habit.id]), fields='task,start_time')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json(), {'task': self.habit.task, 'start_time': '08:30'})
+        self.assertNotIn('"app_habits_habit"."location"', sql)
+
+    def test_retrieve_etag(self):
+        """ Разные поля - разные ETag """
+
+        url = reverse("app_habits:habit_retrieve", args=[self.habit.id])
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, {'fields': 'task'}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+    def test_list(self):
+        response, sql = self.get(reverse("app_habits:habit_list"), fields='id,task')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()['results'][0], {'id': self.habit.id, 'task': self.habit.task})
+        self.assertNotIn('"app_habits_habit"."location"', sql)
+
+    def test_list_cursor(self):
+        """ Поле сортировки выбирается для курсора, но не выводится """
+
+        url = reverse("app_habits:habit_public_list")
+
+        response = self.client.get(url, {'fields': 'task', 'ordering': '-location'})
+        results = response.json()['results']
+        next_results = self.client.get(response.json()['next']).json()['results']
+
+        self.assertEquals(results[0], {'task': 'Test habit 5'})
+        self.assertEquals(len(results + next_results), 7)
+
+        self.client.force_authenticate(user=self.moderator)
+        response = self.client.get(reverse("app_habits:habit_list"), {'fields': 'owner_email'})
+
+        self.assertEquals(response.json()['results'][0], {'owner_email': self.user.email})
+
+    def test_list_ordering(self):
+        """ Выбранные поля сочетаются с любой допустимой сортировкой, курсор проходит все страницы """
+
+        for url_name, user, view_class in (
+            ("app_habits:habit_list", self.user, HabitListAPIView),
+            ("app_habits:habit_list", self.moderator, HabitListAPIView),
+            ("app_habits:habit_public_list", self.user, HabitPublicListAPIView),
+        ):
+            self.client.force_authenticate(user=user)
+            ordering_fields = view_class.ordering_fields or (
+                'id', 'task', 'start_time', 'location', 'periodicity', 'is_nice',
+                *(('owner_email', ) if user.is_staff else ())
+            )
+            for field in ordering_fields:
+                for ordering in (field, f'-{field}'):
+                    with self.subTest(url_name=url_name, user=user.email, ordering=ordering):
+                        response = self.client.get(reverse(url_name), {'fields': 'id', 'ordering': ordering})
+                        self.assertEquals(response.status_code, status.HTTP_200_OK, response.content)
+                        ids = [item['id'] for item in response.json()['results']]
+                        self.assertEquals(response.json()['results'][0].keys(), {'id'})
+
+                        while next_url := response.json()['next']:
+                            response = self.client.get(next_url)
+                            ids += [item['id'] for item in response.json()['results']]
+                        self.assertEquals(sorted(ids), sorted(Habit.objects.values_list('id', flat=True)))
+
+    def test_export(self):
+        response = self.client.get(reverse("app_habits:habit_export"), {'type': 'csv', 'fields': 'task,id'})
+
+        self.assertEquals(b''.join(response.streaming_content).decode().splitlines()[:2], [
+            'id,task', f'{self.habit.id},{self.habit.task}'
+        ])
+
+    def test_unknown_fields(self):
+        for url in (reverse("app_habits:habit_list"), reverse("app_habits:habit_retrieve", args=[self.habit.id])):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'fields': 'task,owner_email'})
+
+                self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('fields', response.json())
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -9,6 +10,9 @@ from app_users.models import User
 class HabitTest(APITestCase):
 
     def setUp(self):
+        # Страницы публичной ленты не должны переходить из теста в тест
+        cache.clear()
+
         # User_1
         self.user_1 = User.objects.create(
             email="user1@test.com",
@@ -95,7 +99,6 @@ class HabitTest(APITestCase):
         self.assertEquals(
             response.json(),
             {
-                'count': 3,
                 'next': None,
                 'previous': None,
                 'results': [
@@ -135,11 +138,11 @@ class HabitTest(APITestCase):
             reverse("app_habits:habit_list")
         )
 
+        self.assertTrue(response.json()['next'].startswith('http://testserver/habit/list/?cursor='))
         self.assertEquals(
             response.json(),
             {
-                'count': 6,
-                'next': 'http://testserver/habit/list/?page=2',
+                'next': response.json()['next'],
                 'previous': None,
                 'results': [
                     {
@@ -217,7 +220,6 @@ class HabitTest(APITestCase):
         self.assertEquals(
             response.json(),
             {
-                'count': 2,
                 'next': None,
                 'previous': None,
                 'results': [
@@ -0,0 +1,123 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.importer import import_habits
+from app_habits.models import Habit
+from app_users.models import User
+
+
+class HabitImportTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(
+            email="user1@test.com",
+            telegram_id="123456789",
+            is_staff=False,
+            is_active=True,
+        )
+
+        self.nice_habit = Habit.objects.create(
+            task="Test nice habit",
+            location="Test location",
+            is_nice=True,
+            owner=self.user
+        )
+        self.good_habit = Habit.objects.create(
+            task="Test good habit",
+            location="Test location",
+            owner=self.user
+        )
+
+    def ndjson(self):
+        lines = [
+            {"task": "Test nice habit", "location": "Test location", "is_nice": True},
+            {"task": "Test good habit", "location": "Test location", "start_time": "08:00",
+             "related_habit": self.nice_habit.id},
+            # Связанная привычка не приятная
+            {"task": "Test good habit", "location": "Test location", "start_time": "08:00",
+             "related_habit": self.good_habit.id},
+            {"task": "Test good habit", "location": "Test location", "start_time": "08:00", "reward": "Test reward"},
+        ]
+        rows = [json.dumps(line) for line in lines]
+        # Неверный JSON, пустая строка и превышение времени выполнения
+        rows += ['{"task": ', '', json.dumps({"task": "Test", "location": "Test", "start_time": "08:00",
+                                              "time_to_complete": 121})]
+        return '\n'.join(rows) + '\n'
+
+    def test_import(self):
+        """ Корректные строки импортируются, ошибки возвращаются по номерам строк """
+
+        self.client.force_authenticate(user=self.user)
+        count = Habit.objects.count()
+
+        response = self.client.post(
+            reverse("app_habits:habit_import"),
+            data=self.ndjson(),
+            content_type='application/x-ndjson'
+        )
+
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(response.json()['created'], 3)
+        self.assertEquals(
+            response.json()['errors'],
+            [
+                {
+                    'line': 3,
+                    'errors': {'non_field_errors': ['В поле "related_habit" должна быть указана полезная привычка']}
+                },
+                {'line': 5, 'errors': {'non_field_errors': ['Неверный JSON']}},
+                {
+                    'line': 7,
+                    'errors': {'non_field_errors': ['Время выполнения задания не должно превышать 120 секунд']}
+                },
+            ]
+        )
+        self.assertEquals(Habit.objects.count(), count + 3)
+
+        habit = Habit.objects.get(task="Test good habit", related_habit=self.nice_habit)
+
+        self.assertEquals(habit.owner, self.user)
+        self.assertIsNotNone(habit.periodic_task)
+        self.assertTrue(Habit.objects.filter(task="Test nice habit", is_nice=True).exclude(pk=self.nice_habit.pk))
+
+    def test_import_batches(self):
+        """ Привычки создаются пачками, количество запросов зависит от количества пачек """
+
+        lines = [
+            json.dumps({"task": f"Test nice habit {i}", "location": "Test location", "is_nice": True})
+            for i in range(25)
+        ]
+
+        with self.assertNumQueries(3 * 5):
+            report = import_habits(lines, self.user, batch_size=5)
+
+        self.assertEquals(report, {'created': 25, 'errors': []})
+
+    def test_permission_moderator_import(self):
+        moderator = User.objects.create(email="moderator@test.com", is_staff=True)
+        self.client.force_authenticate(user=moderator)
+
+        response = self.client.post(
+            reverse("app_habits:habit_import"),
+            data=self.ndjson(),
+            content_type='application/x-ndjson'
+        )
+
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as file:
+            file.write(self.ndjson())
+            file.flush()
+
+            stdout, stderr = StringIO(), StringIO()
+            call_command('import_habits', file.name, email=self.user.email, stdout=stdout, stderr=stderr)
+
+        self.assertIn('Создано привычек: 3, ошибок: 3', stdout.getvalue())
+        self.assertIn('Строка 5', stderr.getvalue())
@@ -0,0 +1,64 @@
+from datetime import time
+
+from django.test import TestCase
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from app_habits.models import Habit
+from app_habits.serializers.habit import HabitListAllSerializer, HabitListSerializer
+from app_users.models import User
+
+
+class HabitValuesListSerializerTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+
+        for i in range(20):
+            Habit.objects.create(
+                task=f"Test habit {i}",
+                location="Test location",
+                start_time=time(i % 24, i, i) if i % 3 else None,
+                periodicity=str(i % 7 + 1),
+                is_nice=bool(i % 2),
+                # Привычка без создателя
+                owner=self.user if i % 5 else None
+            )
+
+    @staticmethod
+    def render_models(serializer_class, queryset):
+        """ Представление списка прежним способом: объекты модели и поля сериализатора """
+
+        return JSONRenderer().render(serializers.ListSerializer(queryset, child=serializer_class()).data)
+
+    @staticmethod
+    def render_values(serializer_class, queryset):
+        return JSONRenderer().render(
+            serializer_class(queryset.values(*serializer_class.Meta.fields), many=True).data
+        )
+
+    def test_identical_output(self):
+        """ JSON списка из values() совпадает побайтово с представлением объектов модели """
+
+        for serializer_class in (HabitListSerializer, HabitListAllSerializer):
+            with self.subTest(serializer=serializer_class.__name__):
+                queryset = Habit.objects.with_owner_email().order_by('id')
+
+                self.assertEquals(
+                    self.render_values(serializer_class, queryset),
+                    self.render_models(serializer_class, queryset)
+                )
+
+    def test_model_instances(self):
+        """ Объекты модели по-прежнему представляются полями сериализатора """
+
+        queryset = Habit.objects.order_by('id')
+
+        self.assertEquals(
+            JSONRenderer().render(HabitListSerializer(queryset, many=True).data),
+            self.render_models(HabitListSerializer, queryset)
+        )
@@ -0,0 +1,121 @@
+import base64
+import json
+from datetime import time
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import Habit
+from app_users.models import User
+
+
+class HabitCursorPaginationTest(APITestCase):
+
+    def setUp(self):
+        # Страницы публичной ленты не должны переходить из теста в тест
+        cache.clear()
+
+        self.user = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.user.set_password('test')
+        self.user.save()
+
+        # Повторяющиеся значения и пустое время для проверки однозначности порядка
+        for i in range(23):
+            Habit.objects.create(
+                task=f"Test habit {i % 4}",
+                location=f"Test location {i % 3}",
+                start_time=time(8 + i % 5) if i % 6 else None,
+                periodicity=str(i % 7 + 1),
+                is_nice=bool(i % 2),
+                is_public=bool(i % 3),
+                owner=self.user
+            )
+
+        self.client.force_authenticate(user=self.user)
+
+    def walk(self, url, params=None):
+        """ Проход по всем страницам вперед, затем назад """
+
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            pages.append([habit['id'] for habit in response.json()['results']])
+            if not response.json()['next']:
+                break
+            response = self.client.get(response.json()['next'])
+
+        backward = [pages[-1]]
+        while response.json()['previous']:
+            response = self.client.get(response.json()['previous'])
+            backward.append([habit['id'] for habit in response.json()['results']])
+
+        self.assertEquals(backward[::-1], pages)
+        return [habit_id for page in pages for habit_id in page]
+
+    def test_ordering(self):
+        """ Проход по страницам совпадает с полной сортировкой при любом поле сортировки """
+
+        url = reverse("app_habits:habit_list")
+        for ordering in ('id', '-id', 'task', '-task', 'start_time', '-start_time', 'location,-start_time',
+                         'periodicity', '-is_nice,task', ):
+            with self.subTest(ordering=ordering):
+                expected = self.client.get(url, {'ordering': ordering, 'page_size': 100}).json()
+                self.assertIsNone(expected['next'])
+                expected = [habit['id'] for habit in expected['results']]
+
+                self.assertEquals(len(expected), 23)
+                self.assertEquals(self.walk(url, {'ordering': ordering, 'page_size': 4}), expected)
+
+    def test_public_list(self):
+        """ Постраничный вывод публичных привычек с фильтрацией """
+
+        expected = list(
+            Habit.objects.filter(is_public=True, is_nice=True).order_by('-task', '-id').values_list('id', flat=True)
+        )
+
+        self.assertEquals(
+            self.walk(reverse("app_habits:habit_public_list"), {'ordering': '-task', 'is_nice': 'true'}),
+            expected
+        )
+
+    def test_page_size(self):
+        """ Размер страницы задается клиентом, но не больше максимального """
+
+        url = reverse("app_habits:habit_list")
+
+        self.assertEquals(len(self.client.get(url).json()['results']), 5)
+        self.assertEquals(len(self.client.get(url, {'page_size': 7}).json()['results']), 7)
+
+        Habit.objects.bulk_create(
+            [Habit(task="Test habit", location="Test location", owner=self.user) for _ in range(100)]
+        )
+
+        self.assertEquals(len(self.client.get(url, {'page_size': 1000}).json()['results']), 100)
+
+    def test_invalid_cursor(self):
+        """ Неверный курсор или курсор другой сортировки """
+
+        url = reverse("app_habits:habit_list")
+
+        response = self.client.get(url, {'cursor': 'invalid'})
+
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        next_url = self.client.get(url, {'ordering': 'task'}).json()['next']
+        response = self.client.get(next_url.replace('ordering=task', 'ordering=location'))
+
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Значения не подходят по типу полям сортировки
+        for ordering, values in ((['id'], ['abc']), (['start_time', 'id'], ['25:99', 1]), (['id'], [{'a': 1}])):
+            cursor = base64.urlsafe_b64encode(json.dumps({'o': ordering, 'v': values, 'r': False}).encode()).decode()
+            params = {'cursor': cursor, 'ordering': ','.join(ordering)}
+            with self.subTest(values=values):
+                self.assertEquals(self.client.get(url, params).status_code, status.HTTP_404_NOT_FOUND)
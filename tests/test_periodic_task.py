@@ -1,7 +1,8 @@
 import json
+from unittest import mock
 
 from django.urls import reverse
-from django_celery_beat.models import PeriodicTask
+from django_celery_beat.models import PeriodicTask, PeriodicTasks
 from rest_framework.test import APITestCase
 
 from app_habits.models import Habit
@@ -308,3 +309,140 @@ class PeriodicTaskTest(APITestCase):
         )
 
         count2 = PeriodicTask.objects.filter(name=f'{response_habit.json().get("id")}: {data["task"]}').count()
+
+    def test_periodic_task_rename(self):
+        """
+        Тестирование изменения и удаления задачи
+        после изменения действия привычки
+        """
+
+        # Аутентифицируем обычного пользователя
+        self.client.force_authenticate(user=self.user_1)
+
+        # Создаем полезную привычку
+        response_habit = self.client.post(
+            reverse("app_habits:habit_good_create"),
+            data={
+                "task": "Test task good",
+                "location": "Test location",
+                "start_time": "12:10",
+            }
+        )
+        habit = Habit.objects.get(pk=response_habit.json().get('id'))
+
+        # Изменяем действие привычки
+        self.client.patch(
+            reverse("app_habits:habit_update", kwargs={'pk': habit.id}),
+            data={
+                "task": "Test task renamed",
+            }
+        )
+
+        task = PeriodicTask.objects.get(habit=habit)
+
+        self.assertEquals(task.name, f'{habit.id}: Test task renamed')
+        self.assertEquals(json.loads(task.kwargs)['task'], 'Test task renamed')
+
+        # Удаляем привычку
+        self.client.delete(
+            reverse("app_habits:habit_destroy", kwargs={'pk': habit.id})
+        )
+
+        self.assertFalse(PeriodicTask.objects.filter(pk=task.pk).exists())
+
+    def test_periodic_task_not_changed(self):
+        """
+        Тестирование отсутствия изменений расписания
+        при изменении полей, не влияющих на напоминание
+        """
+
+        # Аутентифицируем обычного пользователя
+        self.client.force_authenticate(user=self.user_1)
+
+        # Создаем полезную привычку
+        response_habit = self.client.post(
+            reverse("app_habits:habit_good_create"),
+            data={
+                "task": "Test task good",
+                "location": "Test location",
+                "start_time": "12:10",
+            }
+        )
+        last_update = PeriodicTasks.last_change()
+
+        with mock.patch('app_habits.views.habit.update_task') as update_task:
+            # Изменяем признак публичности
+            self.client.patch(
+                reverse("app_habits:habit_update", kwargs={'pk': response_habit.json().get('id')}),
+                data={
+                    "is_public": True,
+                }
+            )
+            # Передаем то же самое время
+            self.client.patch(
+                reverse("app_habits:habit_update", kwargs={'pk': response_habit.json().get('id')}),
+                data={
+                    "start_time": "12:10",
+                }
+            )
+
+        # Проверяем что расписание не изменялось
+        update_task.assert_not_called()
+        self.assertEquals(PeriodicTasks.last_change(), last_update)
+
+    def test_periodic_task_related_habit_changed(self):
+        """
+        Тестирование изменения задачи
+        при изменении связанной приятной привычки
+        """
+
+        # Аутентифицируем обычного пользователя
+        self.client.force_authenticate(user=self.user_1)
+
+        # Создаем полезную привычку
+        response_habit = self.client.post(
+            reverse("app_habits:habit_good_create"),
+            data={
+                "task": "Test task good",
+                "location": "Test location",
+                "start_time": "12:10",
+                "related_habit": self.nice_habit.id
+            }
+        )
+
+        # Изменяем приятную привычку
+        self.client.patch(
+            reverse("app_habits:habit_update", kwargs={'pk': self.nice_habit.id}),
+            data={
+                "task": "Test nice habit renamed",
+            }
+        )
+
+        task = PeriodicTask.objects.get(habit=response_habit.json().get('id'))
+
+        self.assertEquals(
+            json.loads(task.kwargs)['related_habit'],
+            {
+                'task': 'Test nice habit renamed',
+                'location': 'Test location',
+                'time_to_complete': 60
+            }
+        )
+
+    def test_changed_fields(self):
+        """ Тестирование отслеживания измененных полей привычки """
+
+        habit = Habit.objects.get(pk=self.nice_habit.pk)
+
+        self.assertEquals(habit.get_changed_fields(), set())
+
+        habit.is_public = True
+        habit.location = "Test location"
+
+        self.assertEquals(habit.get_changed_fields(), {'is_public'})
+
+        habit.save()
+
+        self.assertEquals(habit.saved_changes, {'is_public'})
+        self.assertFalse(habit.schedule_changed)
+        self.assertEquals(habit.get_changed_fields(), set())
@@ -0,0 +1,154 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from app_habits.cache import PUBLIC_PAGE_KEY, get_public_page, get_public_version, get_request_digest
+from app_habits.models import Habit
+from app_users.models import User
+
+
+@override_settings(HABITS_PUBLIC_CACHE=True)
+class PublicHabitCacheTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        self.user = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.user.set_password('test')
+        self.user.save()
+
+        self.public_habit = Habit.objects.create(
+            task="Test public habit",
+            location="Test location",
+            is_public=True,
+            owner=self.user
+        )
+        self.private_habit = Habit.objects.create(
+            task="Test private habit",
+            location="Test location",
+            owner=self.user
+        )
+
+        self.client.force_authenticate(user=self.user)
+
+    def get_tasks(self, **params):
+        response = self.client.get(reverse("app_habits:habit_public_list"), params)
+        return [habit['task'] for habit in response.json()['results']]
+
+    def test_cached(self):
+        """ Повторный запрос страницы не обращается к базе данных: ETag строится по версии ленты """
+
+        self.assertEquals(self.get_tasks(), ["Test public habit"])
+
+        with self.assertNumQueries(0):
+            self.assertEquals(self.get_tasks(), ["Test public habit"])
+
+        # Другие параметры - другая страница
+        self.assertEquals(self.get_tasks(is_nice='true'), [])
+
+    def test_invalidation(self):
+        """ Изменение публичной привычки сбрасывает кэш после фиксации транзакции """
+
+        self.get_tasks()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.public_habit.task = "Test public habit changed"
+            self.public_habit.save()
+
+        self.assertEquals(self.get_tasks(), ["Test public habit changed"])
+
+        # Привычка перестала быть публичной
+        with self.captureOnCommitCallbacks(execute=True):
+            self.public_habit.is_public = False
+            self.public_habit.save()
+
+        self.assertEquals(self.get_tasks(), [])
+
+    def test_private_habit_not_invalidate(self):
+        """ Изменение непубличной привычки и сохранение без изменений не меняют версию ленты """
+
+        version = get_public_version()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.private_habit.task = "Test private habit changed"
+            self.private_habit.save()
+            Habit.objects.get(pk=self.public_habit.id).save()
+
+        self.assertEquals(callbacks, [])
+        self.assertEquals(get_public_version(), version)
+
+    def test_delete_invalidation(self):
+        """ Удаление публичной привычки сбрасывает кэш """
+
+        self.get_tasks()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.public_habit.delete()
+
+        self.assertEquals(self.get_tasks(), [])
+
+    def test_owner_email_invalidation(self):
+        """ Изменение email создателя публичной привычки сбрасывает кэш и ETag ленты """
+
+        url = reverse("app_habits:habit_public_list")
+        etag = self.client.get(url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.email = "user1-changed@test.com"
+            self.user.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['results'][0]['owner_email'], "user1-changed@test.com")
+
+    def test_owner_last_login_not_invalidate(self):
+        """ Сохранение пользователя без изменения email не меняет версию ленты """
+
+        version = get_public_version()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.save(update_fields=['last_login'])
+            self.user.save()
+
+        self.assertEquals(callbacks, [])
+        self.assertEquals(get_public_version(), version)
+
+    def test_concurrent_miss(self):
+        """ Пока страницу строит другой запрос, страница не строится повторно, а ожидается в кэше """
+
+        request = RequestFactory().get(reverse("app_habits:habit_public_list"))
+        key = PUBLIC_PAGE_KEY.format(version=get_public_version(), digest=get_request_digest(request))
+        cache.add(f'{key}:lock', 1)
+
+        build = mock.Mock(return_value={'results': []})
+        with mock.patch('app_habits.cache.time.sleep', side_effect=lambda _: cache.set(key, {'results': ['page']})):
+            self.assertEquals(get_public_page(request, build), {'results': ['page']})
+
+        build.assert_not_called()
+
+    def test_parameters_order(self):
+        """ Порядок параметров запроса не влияет на ключ страницы """
+
+        factory = RequestFactory()
+
+        self.assertEquals(
+            get_request_digest(factory.get('/habit/public_list/?is_nice=true&ordering=task')),
+            get_request_digest(factory.get('/habit/public_list/?ordering=task&is_nice=true'))
+        )
+
+    @override_settings(HABITS_PUBLIC_CACHE=False)
+    def test_without_shared_cache(self):
+        """ Без общего кэша страница строится при каждом запросе """
+
+        self.get_tasks()
+        Habit.objects.filter(pk=self.public_habit.pk).update(task="Edited public habit")
+
+        self.assertEquals(self.get_tasks(), ["Edited public habit"])
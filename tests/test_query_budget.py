@@ -0,0 +1,200 @@
+from datetime import time, timedelta
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django_celery_beat.models import IntervalSchedule
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import DeletedHabit, Habit
+from app_habits.services import add_task
+from app_habits.sync import encode_cursor
+from app_users.models import User
+
+
+@override_settings(HABITS_BEAT_CHANGE_LOG=True)
+class HabitQueryBudgetTest(APITestCase):
+    """
+    Количество запросов к базе данных для каждого представления привычек.
+    Для списков и пакетных операций проверяется, что количество запросов
+    не зависит от количества привычек.
+    Учитывается запись журнала изменений периодических задач (планировщик HabitScheduler)
+    """
+
+    def setUp(self):
+        cache.clear()
+
+        self.user = User.objects.create(
+            email="user1@test.com",
+            telegram_id="123456789",
+            is_staff=False,
+            is_active=True,
+        )
+        self.moderator = User.objects.create(
+            email="moderator@test.com",
+            is_staff=True,
+            is_active=True,
+        )
+
+        # Периоды уже созданы
+        for every in range(1, 8):
+            IntervalSchedule.objects.create(every=every, period=IntervalSchedule.DAYS)
+
+        self.nice_habit = Habit.objects.create(
+            task="Test nice habit",
+            location="Test location",
+            is_nice=True,
+            is_public=True,
+            owner=self.user
+        )
+        self.good_habit = self.create_good_habit()
+
+    def create_good_habit(self, owner=None):
+        habit = Habit.objects.create(
+            task="Test good habit",
+            location="Test location",
+            start_time=time(12, 10),
+            related_habit=self.nice_habit,
+            is_public=True,
+            owner=owner or self.user
+        )
+        add_task(habit)
+        return habit
+
+    def add_habits(self, count):
+        for _ in range(count):
+            self.create_good_habit(self.moderator)
+
+    def request(self, method, url, data=None, user=None):
+        self.client.force_authenticate(user=user or self.user)
+        response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+        return response
+
+    def assertQueries(self, budget, method, url, data=None, user=None):
+        with self.assertNumQueries(budget):
+            return self.request(method, url, data, user)
+
+    def test_create(self):
+        self.assertQueries(
+            2, 'post', reverse("app_habits:habit_nice_create"),
+            {"task": "Test nice habit", "location": "Test location"}
+        )
+        self.assertQueries(
+            10, 'post', reverse("app_habits:habit_good_create"),
+            {
+                "task": "Test good habit",
+                "location": "Test location",
+                "start_time": "12:10",
+                "related_habit": self.nice_habit.id
+            }
+        )
+
+    def test_list(self):
+        url = reverse("app_habits:habit_list")
+
+        # Только страница, ETag по ее содержимому
+        self.assertQueries(1, 'get', url)
+        self.assertQueries(1, 'get', url, {'ordering': 'task'}, user=self.moderator)
+
+        self.add_habits(10)
+
+        self.assertQueries(1, 'get', url, {'ordering': '-owner_email'}, user=self.moderator)
+
+    @override_settings(HABITS_PUBLIC_CACHE=True)
+    def test_public_list(self):
+        url = reverse("app_habits:habit_public_list")
+
+        self.add_habits(10)
+
+        # ETag по версии ленты в кэше, запрос только за страницей
+        self.assertQueries(1, 'get', url, {'ordering': 'owner_email'})
+        # Страница из кэша, запросов нет
+        self.assertQueries(0, 'get', url, {'ordering': 'owner_email'})
+
+    def test_retrieve(self):
+        self.assertQueries(1, 'get', reverse("app_habits:habit_retrieve", args=[self.good_habit.id]))
+
+    def test_forbidden(self):
+        """ Право доступа проверяется в запросе выборки привычки """
+
+        other_user = User.objects.create(email="user2@test.com", is_active=True)
+        self.client.force_authenticate(user=other_user)
+        self.nice_habit.is_public = False
+        self.nice_habit.save()
+
+        for method, url_name, habit_id, status_code in (
+            ('get', "app_habits:habit_retrieve", self.nice_habit.id, status.HTTP_403_FORBIDDEN),
+            ('patch', "app_habits:habit_update", self.good_habit.id, status.HTTP_403_FORBIDDEN),
+            ('delete', "app_habits:habit_destroy", self.good_habit.id, status.HTTP_403_FORBIDDEN),
+            ('get', "app_habits:habit_retrieve", self.good_habit.id + 100, status.HTTP_404_NOT_FOUND),
+        ):
+            with self.subTest(url_name=url_name, habit_id=habit_id), self.assertNumQueries(1):
+                response = getattr(self.client, method)(reverse(url_name, args=[habit_id]), {}, format='json')
+                self.assertEquals(response.status_code, status_code)
+
+    def test_update(self):
+        url = reverse("app_habits:habit_update", args=[self.good_habit.id])
+
+        # Привычка вместе с создателем загружается одним запросом
+        self.assertQueries(9, 'patch', url, {"reward": "Test reward"})
+        # Поля напоминания не изменились (в тесте транзакция изменения - две команды точки сохранения)
+        self.assertQueries(4, 'patch', url, {"is_public": False})
+
+    def test_destroy(self):
+        self.assertQueries(10, 'delete', reverse("app_habits:habit_destroy", args=[self.good_habit.id]))
+
+    def test_bulk(self):
+        create_url = reverse("app_habits:habit_bulk_good_create")
+
+        def items(count):
+            return [
+                {
+                    "task": f"Test good habit {i}",
+                    "location": "Test location",
+                    "start_time": "12:10",
+                    "periodicity": str(i % 7 + 1),
+                    "related_habit": self.nice_habit.id,
+                }
+                for i in range(count)
+            ]
+
+        # Все периоды пачки загружаются одним запросом
+        self.assertQueries(8, 'post', create_url, items(7))
+        ids = [habit['id'] for habit in self.assertQueries(8, 'post', create_url, items(70)).json()]
+
+        self.assertQueries(
+            8, 'patch', reverse("app_habits:habit_bulk_update"),
+            [{"id": habit_id, "reward": "Test reward"} for habit_id in ids]
+        )
+        self.assertQueries(12, 'delete', reverse("app_habits:habit_bulk_destroy"), {"ids": ids})
+
+    def test_bulk_nice(self):
+        url = reverse("app_habits:habit_bulk_nice_create")
+
+        def items(count):
+            return [{"task": f"Test nice habit {i}", "location": "Test location"} for i in range(count)]
+
+        self.assertQueries(3, 'post', url, items(7))
+        self.assertQueries(3, 'post', url, items(70))
+
+    def test_sync(self):
+        url = reverse("app_habits:habit_sync")
+        cursor = encode_cursor(timezone.now() - timedelta(microseconds=1))
+
+        # Без курсора: привычки пользователя
+        self.assertQueries(1, 'get', url)
+
+        # Измененные привычки и отметки об удалении после курсора
+        for count in (2, 20):
+            Habit.objects.bulk_create(
+                [Habit(task=f"Test habit {i}", location="Test location", owner=self.user) for i in range(count)]
+            )
+            DeletedHabit.objects.bulk_create(
+                [DeletedHabit(habit_id=1000 + i, owner=self.user) for i in range(count)]
+            )
+            with self.subTest(count=count):
+                response = self.assertQueries(2, 'get', url, {'cursor': cursor})
+                self.assertEquals(len(response.json()['deleted']), DeletedHabit.objects.count())
@@ -0,0 +1,283 @@
+from datetime import datetime, time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask
+from rest_framework.test import APITestCase
+
+from app_habits.lateness import get_lateness_histogram
+from app_habits.models import Habit
+from app_habits.services import REMINDER_LEAD_TIME, get_following_fire_at
+from app_habits.tasks import dispatch_reminders, send_message_tg
+from app_users.models import User
+
+
+@override_settings(HABITS_REMINDER_BACKEND='dispatcher', HABITS_REMINDER_BATCH_SIZE=2)
+class ReminderDispatcherTest(APITestCase):
+
+    def setUp(self):
+        # Users
+        self.user_1 = User.objects.create(
+            email="user1@test.com",
+            telegram_id="123456789",
+            is_staff=False,
+            is_active=True,
+        )
+        self.user_1.set_password('test')
+        self.user_1.save()
+
+        self.now = timezone.now()
+
+        cache.clear()
+
+    def create_habit(self, next_fire_at, periodicity='1'):
+        return Habit.objects.create(
+            task="Test good habit",
+            location="Test location",
+            start_time=time(12, 10),
+            periodicity=periodicity,
+            owner=self.user_1,
+            next_fire_at=next_fire_at,
+        )
+
+    def test_create_without_periodic_task(self):
+        """ При работе диспетчера PeriodicTask не создается, заполняется next_fire_at """
+
+        # Аутентифицируем обычного пользователя
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.post(
+            reverse("app_habits:habit_good_create"),
+            data={
+                "task": "Test task good",
+                "location": "Test location",
+                "start_time": "12:10",
+            }
+        )
+
+        habit = Habit.objects.get(pk=response.json().get("id"))
+
+        self.assertFalse(PeriodicTask.objects.filter(name__startswith=f'{habit.id}:').exists())
+        self.assertEqual(timezone.localtime(habit.next_fire_at).time(), time(12, 5))
+        self.assertTrue(habit.next_fire_at > timezone.now())
+
+    @mock.patch('app_habits.tasks.send_message_tg.apply_async')
+    def test_dispatch_due(self, apply_async):
+        """ Отправляются только наступившие напоминания, время сдвигается на период """
+
+        due_1 = self.create_habit(self.now - timedelta(minutes=1))
+        due_2 = self.create_habit(self.now - timedelta(seconds=10), periodicity='3')
+        due_3 = self.create_habit(self.now)
+        not_due = self.create_habit(self.now + timedelta(minutes=10))
+
+        self.assertEqual(dispatch_reminders(), 3)
+        self.assertEqual(apply_async.call_count, 3)
+        self.assertEqual(
+            apply_async.call_args_list[0].kwargs['kwargs'],
+            {
+                'telegram_id': "123456789",
+                'start_time': '12:10',
+                'task': 'Test good habit',
+                'location': 'Test location',
+                'time_to_complete': 60,
+                'reward': None,
+                'related_habit': None
+            }
+        )
+
+        due_1.refresh_from_db()
+        due_2.refresh_from_db()
+        due_3.refresh_from_db()
+        not_due.refresh_from_db()
+
+        self.assertEqual(due_1.next_fire_at, self.now - timedelta(minutes=1) + timedelta(days=1))
+        self.assertEqual(due_2.next_fire_at, self.now - timedelta(seconds=10) + timedelta(days=3))
+        self.assertTrue(due_3.next_fire_at > self.now)
+        self.assertEqual(not_due.next_fire_at, self.now + timedelta(minutes=10))
+
+        # Повторный запуск ничего не отправляет
+        self.assertEqual(dispatch_reminders(), 0)
+
+    @override_settings(HABITS_REMINDER_PREENQUEUE_WINDOW=timedelta(minutes=10))
+    @mock.patch('app_habits.tasks.send_message_tg.apply_async')
+    def test_preenqueue(self, apply_async):
+        """ Напоминания ближайших 10 минут ставятся в очередь заранее, с ETA на время напоминания """
+
+        soon = self.create_habit(self.now + timedelta(minutes=5))
+        later = self.create_habit(self.now + timedelta(minutes=20))
+
+        self.assertEqual(dispatch_reminders(), 1)
+        self.assertEqual(apply_async.call_args.kwargs['eta'], self.now + timedelta(minutes=5))
+
+        soon.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(soon.next_fire_at, self.now + timedelta(minutes=5) + timedelta(days=1))
+        self.assertEqual(later.next_fire_at, self.now + timedelta(minutes=20))
+
+    @override_settings(HABITS_REMINDER_PREENQUEUE_WINDOW=timedelta(minutes=10))
+    @mock.patch('app_habits.tasks.send_message_to_telegram')
+    def test_preenqueued_changes(self, send_message_to_telegram):
+        """ Заранее поставленное напоминание перечитывает привычку при отправке и не дублируется """
+
+        fire_at = (self.now + timedelta(minutes=5)).replace(second=0, microsecond=0)
+        habit = Habit.objects.create(
+            task="Test good habit",
+            location="Test location",
+            start_time=(timezone.localtime(fire_at) + REMINDER_LEAD_TIME).time(),
+            owner=self.user_1,
+            next_fire_at=fire_at,
+        )
+        with mock.patch('app_habits.tasks.send_message_tg.apply_async') as apply_async:
+            dispatch_reminders()
+        kwargs = apply_async.call_args.kwargs['kwargs']
+        self.assertEqual(kwargs, {'habit_id': habit.id, 'fire_at': fire_at.isoformat()})
+
+        # Изменение текста до отправки не планирует напоминание повторно
+        self.client.force_authenticate(user=self.user_1)
+        self.client.patch(reverse("app_habits:habit_update", args=[habit.id]), data={"task": "Edited task"})
+        with mock.patch('app_habits.tasks.send_message_tg.apply_async') as apply_async:
+            self.assertEqual(dispatch_reminders(), 0)
+
+        send_message_tg(**kwargs)
+        send_message_to_telegram.assert_called_once()
+        self.assertEqual(send_message_to_telegram.call_args.kwargs['task'], "Edited task")
+
+        # После изменения времени напоминание ставится в очередь заново, старое не отправляется
+        self.client.patch(
+            reverse("app_habits:habit_update", args=[habit.id]),
+            data={"start_time": (timezone.localtime(fire_at) + REMINDER_LEAD_TIME * 2).strftime('%H:%M')}
+        )
+        with mock.patch('app_habits.tasks.send_message_tg.apply_async') as apply_async:
+            self.assertEqual(dispatch_reminders(), 1)
+        send_message_tg(**kwargs)
+        self.assertEqual(send_message_to_telegram.call_count, 1)
+
+        # Напоминание удаленной привычки не отправляется
+        kwargs = apply_async.call_args.kwargs['kwargs']
+        habit.delete()
+        send_message_tg(**kwargs)
+        self.assertEqual(send_message_to_telegram.call_count, 1)
+
+    @override_settings(HABITS_REMINDER_PREENQUEUE_WINDOW=timedelta(minutes=10))
+    def test_publish_after_advance(self):
+        """ Напоминание ставится в очередь, когда следующее время напоминания уже сохранено """
+
+        habit = self.create_habit(self.now - timedelta(minutes=1))
+        saved = []
+        with mock.patch(
+            'app_habits.tasks.send_message_tg.apply_async',
+            side_effect=lambda **kwargs: saved.append(Habit.objects.get(pk=habit.pk).next_fire_at),
+        ):
+            dispatch_reminders()
+
+        self.assertEqual(saved, [self.now - timedelta(minutes=1) + timedelta(days=1)])
+
+    @mock.patch('app_habits.tasks.send_message_to_telegram')
+    def test_lateness(self, send_message_to_telegram):
+        """ Опоздание отправки напоминаний с ETA учитывается в гистограмме """
+
+        for lateness in (timedelta(seconds=3), timedelta(minutes=5)):
+            send_message_tg.push_request(eta=(timezone.now() - lateness).isoformat())
+            try:
+                send_message_tg.run(telegram_id="123456789", task="Test task")
+            finally:
+                send_message_tg.pop_request()
+        # Напоминание без ETA не учитывается
+        send_message_tg(telegram_id="123456789", task="Test task")
+
+        histogram = get_lateness_histogram()
+        self.assertEqual(send_message_to_telegram.call_count, 3)
+        self.assertEqual(histogram['<=5'], 1)
+        self.assertEqual(histogram['>60'], 1)
+        self.assertEqual(sum(histogram.values()), 2)
+
+    def test_lateness_before_send(self):
+        """ Опоздание учитывается до отправки, время отправки в него не входит """
+
+        recorded = []
+        send_message_tg.push_request(eta=(timezone.now() - timedelta(seconds=3)).isoformat())
+        try:
+            with mock.patch(
+                'app_habits.tasks.send_message_to_telegram',
+                side_effect=lambda **kwargs: recorded.append(sum(get_lateness_histogram().values())),
+            ):
+                send_message_tg.run(telegram_id="123456789", task="Test task")
+        finally:
+            send_message_tg.pop_request()
+
+        self.assertEqual(recorded, [1])
+
+    @override_settings(HABITS_REMINDER_SMOOTHING_WINDOW=timedelta(minutes=10))
+    @mock.patch('app_habits.tasks.send_message_tg.apply_async')
+    def test_smoothing(self, apply_async):
+        """ Напоминания одной минуты расходятся по окну сглаживания и отправляются не позже назначенного времени """
+
+        # Напоминания на конец окна выбираются с запасом до следующего запуска диспетчера
+        fire_at = self.now + timedelta(minutes=10, seconds=30)
+        for _ in range(20):
+            self.create_habit(fire_at)
+        self.create_habit(self.now + timedelta(minutes=20))
+
+        self.assertEqual(dispatch_reminders(), 20)
+
+        # Время отправки еще не прошло
+        etas = [call.kwargs['eta'] for call in apply_async.call_args_list]
+        self.assertTrue(all(self.now <= eta <= fire_at for eta in etas))
+        self.assertTrue(all(fire_at - timedelta(minutes=10) < eta for eta in etas))
+        self.assertGreater(len({eta.replace(second=0, microsecond=0) for eta in etas}), 5)
+
+    def test_load_report(self):
+        """ Отчет о количестве напоминаний в минуту (за 5 минут до начала действия) """
+
+        for _ in range(3):
+            self.create_habit(None)
+        Habit.objects.create(task="Test", location="Test", start_time=time(7, 0), owner=self.user_1)
+
+        out = StringIO()
+        call_command('reminder_load', smoothing=0, stdout=out)
+        lines = out.getvalue().splitlines()
+
+        self.assertIn('Напоминаний: 4, минут с напоминаниями: 2', lines)
+        self.assertEqual(lines[4].split()[:2], ['12:05', '3'])
+        self.assertEqual(lines[5].split()[:2], ['06:55', '1'])
+
+    def test_switch_backend(self):
+        """ Смена способа планирования переводит напоминания существующих привычек """
+
+        with override_settings(HABITS_REMINDER_BACKEND='periodic_task'):
+            habit = self.create_habit(None)
+            call_command('sync_reminders', stdout=StringIO())
+            habit.refresh_from_db()
+            self.assertIsNotNone(habit.periodic_task)
+
+        call_command('sync_reminders', stdout=StringIO())
+        habit.refresh_from_db()
+        self.assertIsNone(habit.periodic_task)
+        self.assertFalse(PeriodicTask.objects.filter(name__startswith=f'{habit.id}:').exists())
+        self.assertEqual(timezone.localtime(habit.next_fire_at).time(), time(12, 5))
+
+        # Повторный запуск ничего не меняет
+        out = StringIO()
+        call_command('sync_reminders', stdout=out)
+        self.assertIn('обновлено напоминаний привычек: 0', out.getvalue())
+
+        call_command('sync_reminders', backend='periodic_task', stdout=StringIO())
+        habit.refresh_from_db()
+        self.assertIsNone(habit.next_fire_at)
+        self.assertTrue(PeriodicTask.objects.filter(pk=habit.periodic_task_id).exists())
+
+    def test_following_fire_at_skips_missed(self):
+        """ Пропущенные напоминания не повторяются """
+
+        fire_at = timezone.make_aware(datetime(2023, 12, 1, 12, 5))
+        now = timezone.make_aware(datetime(2023, 12, 10, 13, 0))
+
+        self.assertEqual(
+            get_following_fire_at(fire_at, '2', now),
+            timezone.make_aware(datetime(2023, 12, 11, 12, 5))
+        )
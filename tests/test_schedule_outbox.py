@@ -0,0 +1,154 @@
+import json
+from datetime import time
+from unittest import mock
+
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import Habit, ScheduleOutbox
+from app_habits.tasks import relay_schedule_outbox
+from app_users.models import User
+
+
+@override_settings(HABITS_SCHEDULE_OUTBOX=True, HABITS_SCHEDULE_OUTBOX_BATCH_SIZE=2)
+class ScheduleOutboxTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(
+            email="user1@test.com",
+            telegram_id="123456789",
+            is_staff=False,
+            is_active=True,
+        )
+        self.nice_habit = Habit.objects.create(
+            task="Test nice habit",
+            location="Test location",
+            is_nice=True,
+            owner=self.user
+        )
+
+        for every in range(1, 8):
+            IntervalSchedule.objects.create(every=every, period=IntervalSchedule.DAYS)
+
+        self.client.force_authenticate(user=self.user)
+
+    def create_habit(self, **data):
+        response = self.client.post(reverse("app_habits:habit_good_create"), data={
+            "task": "Test task good",
+            "location": "Test location",
+            "start_time": "12:10",
+            **data
+        })
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        return Habit.objects.get(pk=response.json()['id'])
+
+    def test_create(self):
+        """ Запрос создает запись ScheduleOutbox, задачу создает relay_schedule_outbox """
+
+        habit = self.create_habit()
+
+        self.assertIsNone(habit.periodic_task)
+        self.assertEquals(list(ScheduleOutbox.objects.values_list('habit_id', flat=True)), [habit.id])
+
+        self.assertEquals(relay_schedule_outbox(), 1)
+
+        habit.refresh_from_db()
+        self.assertEquals(habit.periodic_task.name, f'{habit.id}: Test task good')
+        self.assertEquals(habit.periodic_task.interval.every, 1)
+        self.assertFalse(ScheduleOutbox.objects.exists())
+
+    def test_update(self):
+        habit = self.create_habit()
+        relay_schedule_outbox()
+        habit.refresh_from_db()
+
+        self.client.patch(
+            reverse("app_habits:habit_update", kwargs={'pk': habit.id}),
+            data={"reward": "Test reward", "periodicity": "3"}
+        )
+        task = PeriodicTask.objects.get(pk=habit.periodic_task_id)
+        self.assertIsNone(json.loads(task.kwargs)['reward'])
+
+        relay_schedule_outbox()
+
+        task.refresh_from_db()
+        self.assertEquals(json.loads(task.kwargs)['reward'], "Test reward")
+        self.assertEquals(task.interval.every, 3)
+
+    def test_destroy(self):
+        habit = self.create_habit()
+        relay_schedule_outbox()
+        habit.refresh_from_db()
+
+        self.client.delete(reverse("app_habits:habit_destroy", kwargs={'pk': habit.id}))
+
+        self.assertTrue(PeriodicTask.objects.filter(pk=habit.periodic_task_id).exists())
+
+        relay_schedule_outbox()
+
+        self.assertFalse(PeriodicTask.objects.filter(pk=habit.periodic_task_id).exists())
+
+    def test_destroy_before_relay(self):
+        """ Привычка удалена до обработки записи о создании - задача не создается """
+
+        habit = self.create_habit()
+        self.client.delete(reverse("app_habits:habit_destroy", kwargs={'pk': habit.id}))
+
+        relay_schedule_outbox()
+
+        self.assertFalse(PeriodicTask.objects.filter(name__startswith=f'{habit.id}:').exists())
+        self.assertFalse(ScheduleOutbox.objects.exists())
+
+    def test_repeated_records(self):
+        """ Повторная обработка записей не создает лишних задач """
+
+        habit = self.create_habit()
+        ScheduleOutbox.objects.create(habit_id=habit.id)
+        relay_schedule_outbox()
+        ScheduleOutbox.objects.create(habit_id=habit.id)
+        relay_schedule_outbox()
+
+        self.assertEquals(PeriodicTask.objects.filter(name__startswith=f'{habit.id}:').count(), 1)
+
+    def test_batches(self):
+        """ Записи обрабатываются пачками по HABITS_SCHEDULE_OUTBOX_BATCH_SIZE """
+
+        response = self.client.post(reverse("app_habits:habit_bulk_good_create"), data=[
+            {"task": f"Test task {i}", "location": "Test location", "start_time": "12:10"} for i in range(5)
+        ], format='json')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEquals(relay_schedule_outbox(), 5)
+        self.assertEquals(Habit.objects.filter(is_nice=False, periodic_task__isnull=False).count(), 5)
+
+    @mock.patch('app_habits.services.ScheduleOutbox.objects.bulk_create', side_effect=DatabaseError)
+    def test_rollback(self, bulk_create):
+        """ Привычка не сохраняется без записи ScheduleOutbox """
+
+        with self.assertRaises(DatabaseError):
+            self.create_habit()
+
+        self.assertFalse(Habit.objects.filter(is_nice=False).exists())
+
+    def test_request_queries(self):
+        """ Запрос не обращается к таблицам celery beat """
+
+        habit = Habit.objects.create(
+            task="Test good habit",
+            location="Test location",
+            start_time=time(12, 10),
+            related_habit=self.nice_habit,
+            owner=self.user
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.patch(reverse("app_habits:habit_update", kwargs={'pk': habit.id}), data={"task": "New task"})
+            self.client.delete(reverse("app_habits:habit_destroy", kwargs={'pk': habit.id}))
+
+        self.assertEquals(ScheduleOutbox.objects.count(), 2)
+        self.assertFalse([query for query in context.captured_queries if 'django_celery_beat' in query['sql']])
@@ -0,0 +1,91 @@
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+from app_habits.schedules import schedule_registry
+
+
+class ScheduleRegistryTest(TestCase):
+
+    def setUp(self):
+        schedule_registry.clear()
+
+        for every in range(1, 4):
+            IntervalSchedule.objects.create(every=every, period=IntervalSchedule.DAYS)
+
+    def tearDown(self):
+        # Периоды теста удаляются вместе с транзакцией теста
+        schedule_registry.clear()
+
+    def test_memory(self):
+        """ После фиксации транзакции периоды берутся из памяти без запросов """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                schedule = schedule_registry.get(2)
+
+        with self.assertNumQueries(0):
+            schedules = schedule_registry.get_many([2, 3])
+
+        self.assertEquals(schedules[2], schedule)
+        self.assertEquals(schedules[3].every, 3)
+
+    def test_not_committed(self):
+        """ До фиксации транзакции периоды не запоминаются """
+
+        schedule_registry.get(1)
+
+        with self.assertNumQueries(1):
+            schedule_registry.get(1)
+
+    def test_create(self):
+        """ Отсутствующий период создается, все значения загружаются одним запросом """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedules = schedule_registry.get_many([1, 2, 5])
+
+        self.assertEquals({every: schedule.every for every, schedule in schedules.items()}, {1: 1, 2: 2, 5: 5})
+        self.assertEquals(IntervalSchedule.objects.count(), 4)
+
+        with self.assertNumQueries(0):
+            schedule_registry.get(5)
+
+    def test_duplicates(self):
+        """ При повторяющихся периодах (гонка при создании) все используют период с наименьшим id """
+
+        first = IntervalSchedule.objects.get(every=1, period=IntervalSchedule.DAYS)
+        IntervalSchedule.objects.create(every=1, period=IntervalSchedule.DAYS)
+
+        self.assertEquals(schedule_registry.get(1), first)
+
+    def test_invalidation(self):
+        """ Изменение периода сбрасывает реестр """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule = schedule_registry.get(3)
+            schedule.every = 4
+            schedule.save()
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEquals(schedule_registry.get(3).every, 3)
+
+        self.assertTrue(context.captured_queries)
+
+    def test_deleted_by_other_process(self):
+        """ Ссылка на период, удаленный другим процессом, нарушает внешний ключ и сбрасывает реестр """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule = schedule_registry.get(2)
+        # Удаление другим процессом: сигналы этого процесса не срабатывают
+        IntervalSchedule.objects.filter(pk=schedule.pk)._raw_delete(IntervalSchedule.objects.db)
+
+        with self.assertRaises(IntegrityError):
+            with schedule_registry.atomic():
+                PeriodicTask.objects.create(name='test', task='test', interval=schedule_registry.get(2))
+                # Проверка отложенных внешних ключей, как при фиксации транзакции
+                with connection.cursor() as cursor:
+                    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        self.assertNotEqual(schedule_registry.get(2).pk, schedule.pk)
+        self.assertTrue(IntervalSchedule.objects.filter(pk=schedule_registry.get(2).pk).exists())
@@ -0,0 +1,107 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.filters.habit import HabitSearchFilter
+from app_habits.models import Habit
+from app_users.models import User
+
+
+class HabitSearchTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        self.user = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.other_user = User.objects.create(
+            email="user2@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+
+        for task, location, owner, is_public in (
+            ("Утренняя пробежка", "Парк", self.user, False),
+            ("Пробежка вечером", "Стадион", self.other_user, True),
+            ("Чтение книги", "Дом", self.other_user, True),
+            ("Медитация", "Парк у дома", self.other_user, True),
+            ("Пробежка", "Стадион", self.other_user, False),
+        ):
+            Habit.objects.create(task=task, location=location, owner=owner, is_public=is_public)
+
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return [(habit['task'], habit['location']) for habit in response.json()['results']]
+
+    def test_public_search(self):
+        """ Поиск по действию без учета окончаний и регистра, только среди публичных привычек """
+
+        self.assertEquals(
+            self.search("app_habits:habit_public_list", search="пробежки"),
+            [("Пробежка вечером", "Стадион")]
+        )
+
+    def test_search_location(self):
+        """ Поиск по месту выполнения """
+
+        self.assertEquals(
+            self.search("app_habits:habit_public_list", search="парк"),
+            [("Медитация", "Парк у дома")]
+        )
+
+    def test_own_search(self):
+        """ В списке своих привычек ищутся только свои привычки """
+
+        self.assertEquals(self.search("app_habits:habit_list", search="пробежка"), [("Утренняя пробежка", "Парк")])
+        self.assertEquals(self.search("app_habits:habit_list", search="медитация"), [])
+
+    def test_rank(self):
+        """ Без сортировки результаты упорядочены по сходству, с сортировкой - по полю """
+
+        Habit.objects.create(task="Пробежка", location="Дом", owner=self.other_user, is_public=True)
+
+        # Точные совпадения места выше, при равном сходстве новые привычки выше
+        self.assertEquals(
+            self.search("app_habits:habit_public_list", search="дом"),
+            [("Пробежка", "Дом"), ("Чтение книги", "Дом"), ("Медитация", "Парк у дома")]
+        )
+        self.assertEquals(
+            self.search("app_habits:habit_public_list", search="дом", ordering="task"),
+            [("Медитация", "Парк у дома"), ("Пробежка", "Дом"), ("Чтение книги", "Дом")]
+        )
+
+    def test_pages(self):
+        """ Следующая страница результатов поиска продолжает порядок по сходству """
+
+        for i in range(6):
+            Habit.objects.create(task=f"Пробежка {i}", location="Стадион", owner=self.user, is_public=True)
+
+        response = self.client.get(reverse("app_habits:habit_public_list"), {'search': 'стадион', 'page_size': 4})
+        first_page = [habit['id'] for habit in response.json()['results']]
+        response = self.client.get(response.json()['next'])
+        second_page = [habit['id'] for habit in response.json()['results']]
+
+        self.assertEquals(len(first_page), 4)
+        self.assertEquals(len(second_page), 3)
+        self.assertFalse(set(first_page) & set(second_page))
+
+    @mock.patch.object(HabitSearchFilter, 'search_max_results', 2)
+    def test_max_results(self):
+        """ Сортируются только search_max_results найденных привычек, в том числе при сортировке по полю """
+
+        Habit.objects.create(task="Пробежка", location="Дом", owner=self.other_user, is_public=True)
+        found = {("Пробежка", "Дом"), ("Чтение книги", "Дом"), ("Медитация", "Парк у дома")}
+
+        results = self.search("app_habits:habit_public_list", search="дом", ordering="task")
+        self.assertEquals(len(results), 2)
+        self.assertTrue(set(results) <= found)
+        self.assertEquals(results, sorted(results))
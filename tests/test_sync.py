@@ -0,0 +1,187 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from app_habits.models import DeletedHabit, Habit
+from app_habits.sync import encode_cursor
+from app_habits.tasks import prune_deleted_habits
+from app_users.models import User
+
+
+class HabitSyncTest(APITestCase):
+
+    def setUp(self):
+        self.user_1 = User.objects.create(
+            email="user1@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.user_2 = User.objects.create(
+            email="user2@test.com",
+            is_staff=False,
+            is_active=True,
+        )
+        self.moderator = User.objects.create(
+            email="moderator@test.com",
+            is_staff=True,
+            is_active=True,
+        )
+
+        self.nice_habit = Habit.objects.create(
+            task="Test nice habit",
+            location="Test location",
+            is_nice=True,
+            owner=self.user_1
+        )
+        self.good_habit = Habit.objects.create(
+            task="Test good habit",
+            location="Test location",
+            related_habit=self.nice_habit,
+            owner=self.user_1
+        )
+        self.other_habit = Habit.objects.create(
+            task="Test other habit",
+            location="Test location",
+            owner=self.user_2
+        )
+
+    def sync(self, user, cursor=None):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse("app_habits:habit_sync"), {'cursor': cursor} if cursor else {})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()
+
+    @staticmethod
+    def past_cursor():
+        """ Курсор, полученный клиентом до изменений в тесте """
+
+        return encode_cursor(timezone.now() - timedelta(microseconds=1))
+
+    def test_initial_sync(self):
+        """ Без курсора пользователь получает все свои привычки """
+
+        data = self.sync(self.user_1)
+
+        self.assertEquals([habit['id'] for habit in data['habits']], [self.nice_habit.id, self.good_habit.id])
+        self.assertEquals(data['deleted'], [])
+        self.assertFalse(data['has_more'])
+        self.assertNotIn('updated_at', data['habits'][0])
+
+        data = self.sync(self.moderator)
+
+        self.assertEquals(len(data['habits']), 3)
+
+    def test_changed(self):
+        """ После курсора возвращаются только созданные и измененные привычки """
+
+        cursor = self.past_cursor()
+        Habit.objects.filter(pk=self.nice_habit.pk).update(updated_at=timezone.now() - timedelta(days=1))
+
+        self.good_habit.reward = "Test reward"
+        self.good_habit.save()
+        new_habit = Habit.objects.create(task="Test new habit", location="Test location", owner=self.user_1)
+
+        data = self.sync(self.user_1, cursor)
+
+        self.assertEquals([habit['id'] for habit in data['habits']], [self.good_habit.id, new_habit.id])
+        self.assertEquals(data['habits'][0]['reward'], "Test reward")
+
+    def test_bulk_update(self):
+        """ Пакетное изменение обновляет время изменения только измененных привычек """
+
+        cursor = self.past_cursor()
+        self.client.force_authenticate(user=self.user_1)
+        self.client.patch(
+            reverse("app_habits:habit_bulk_update"),
+            [{"id": self.nice_habit.id}, {"id": self.good_habit.id, "reward": "Test reward"}],
+            format='json'
+        )
+
+        data = self.sync(self.user_1, cursor)
+
+        self.assertEquals([habit['id'] for habit in data['habits']], [self.good_habit.id])
+
+    def test_deleted(self):
+        """ Удаленные привычки возвращаются отметками, привязанные привычки - как измененные """
+
+        cursor = self.past_cursor()
+        nice_habit_id, other_habit_id = self.nice_habit.id, self.other_habit.id
+        self.nice_habit.delete()
+        self.other_habit.delete()
+
+        data = self.sync(self.user_1, cursor)
+
+        self.assertEquals(data['deleted'], [nice_habit_id])
+        self.assertEquals([habit['id'] for habit in data['habits']], [self.good_habit.id])
+        self.assertIsNone(data['habits'][0]['related_habit'])
+
+        self.assertEquals(self.sync(self.moderator, cursor)['deleted'], [nice_habit_id, other_habit_id])
+
+    def test_bulk_deleted(self):
+        cursor = self.past_cursor()
+        ids = [self.nice_habit.id, self.good_habit.id]
+
+        self.client.force_authenticate(user=self.user_1)
+        self.client.delete(reverse("app_habits:habit_bulk_destroy"), {"ids": ids}, format='json')
+
+        data = self.sync(self.user_1, cursor)
+
+        self.assertEquals(sorted(data['deleted']), ids)
+        self.assertEquals(data['habits'], [])
+        self.assertEquals(DeletedHabit.objects.count(), 2)
+
+    @override_settings(HABITS_SYNC_PAGE_SIZE=2)
+    def test_pages(self):
+        """ Изменения выдаются частями, привычки с одинаковым временем изменения не теряются """
+
+        Habit.objects.bulk_create(
+            [Habit(task=f"Test habit {i}", location="Test location", owner=self.user_2) for i in range(4)]
+        )
+        Habit.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+
+        cursor, ids = None, []
+        while True:
+            data = self.sync(self.user_2, cursor)
+            ids += [habit['id'] for habit in data['habits']]
+            cursor = data['cursor']
+            if not data['has_more']:
+                break
+
+        habits = Habit.objects.filter(owner=self.user_2).order_by('id')
+        self.assertEquals(ids, list(habits.values_list('id', flat=True)))
+
+        # Новых изменений нет, повторно возвращаются только изменения в пределах HABITS_SYNC_OVERLAP
+        self.assertEquals(self.sync(self.user_2, cursor)['habits'], [])
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(reverse("app_habits:habit_sync"), {'cursor': 'invalid'})
+
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(response.json(), {'cursor': ['Неверный курсор']})
+
+    def test_outdated_cursor(self):
+        """ Курсор старше срока хранения отметок об удалении не принимается, старые отметки удаляются """
+
+        self.client.force_authenticate(user=self.user_1)
+        DeletedHabit.objects.create(habit_id=1, owner=self.user_1)
+        DeletedHabit.objects.filter(habit_id=1).update(deleted_at=timezone.now() - timedelta(days=91))
+        DeletedHabit.objects.create(habit_id=2, owner=self.user_1)
+
+        response = self.client.get(
+            reverse("app_habits:habit_sync"), {'cursor': encode_cursor(timezone.now() - timedelta(days=91))}
+        )
+
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(prune_deleted_habits(), 1)
+        self.assertEquals(list(DeletedHabit.objects.values_list('habit_id', flat=True)), [2])
+
+    def test_unauthorized(self):
+        response = self.client.get(reverse("app_habits:habit_sync"))
+
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
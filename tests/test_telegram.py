@@ -0,0 +1,84 @@
+import time
+from unittest import mock
+
+import redis
+from django.test import SimpleTestCase
+
+from app_habits.management.fake_bot_api import FakeBotAPIServer
+from app_habits.telegram import RedisTokenBucket, TelegramTransport, TokenBucket
+
+
+class TelegramTransportTest(SimpleTestCase):
+
+    def test_keep_alive(self):
+        """ Сообщения отправляются через одно keep-alive соединение """
+
+        with FakeBotAPIServer() as server:
+            transport = TelegramTransport(server.url, 'token', rate_limit=1000, chat_rate_limit=1000)
+
+            for i in range(5):
+                response = transport.send_message(str(i), 'Test message')
+
+                self.assertEqual(response.json().get('ok'), True)
+
+            self.assertEqual(server.requests, 5)
+            self.assertEqual(server.connections, 1)
+
+    def test_chat_rate_limit(self):
+        """ В один чат сообщения отправляются не чаще лимита """
+
+        with FakeBotAPIServer() as server:
+            transport = TelegramTransport(server.url, 'token', rate_limit=1000, chat_rate_limit=20)
+            # Расходуем начальный запас токенов чата
+            transport.get_chat_bucket('1').tokens = 0
+
+            started = time.monotonic()
+            for _ in range(4):
+                transport.send_message('1', 'Test message')
+
+            self.assertTrue(time.monotonic() - started >= 0.15)
+
+    def test_server_error_not_retried(self):
+        """ Ответ 5xx не повторяется: сообщение могло быть уже отправлено """
+
+        with FakeBotAPIServer(errors=[503]) as server:
+            transport = TelegramTransport(server.url, 'token', rate_limit=1000, chat_rate_limit=1000)
+
+            response = transport.send_message('1', 'Test message')
+
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(server.requests, 1)
+
+    def test_too_many_requests(self):
+        """ Ответ 429 повторяется, в том числе если тело ответа не JSON """
+
+        with FakeBotAPIServer(errors=[429]) as server:
+            transport = TelegramTransport(server.url, 'token', rate_limit=1000, chat_rate_limit=1000)
+
+            response = transport.send_message('1', 'Test message')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(server.requests, 2)
+
+    def test_token_bucket(self):
+        """ Ожидание появляется только после исчерпания запаса токенов """
+
+        bucket = TokenBucket(rate=10, capacity=2)
+
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+
+    def test_redis_token_bucket(self):
+        """ Общая корзина резервирует токен скриптом Redis, при недоступности Redis - корзиной процесса """
+
+        client = mock.Mock()
+        client.register_script.return_value.return_value = b'0.25'
+        bucket = RedisTokenBucket(client, 'telegram:rate', rate=10, capacity=2)
+
+        self.assertEqual(bucket.reserve(), 0.25)
+        client.register_script.return_value.assert_called_once_with(keys=['telegram:rate'], args=[0.1, 2])
+
+        client.register_script.return_value.side_effect = redis.ConnectionError
+        with self.assertLogs('app_habits.telegram', 'WARNING'):
+            self.assertEqual(bucket.reserve(), 0)